@@ -0,0 +1,477 @@
+"""
+Acquisition in a separate process, handing data to the GUI through shared memory.
+
+In this mode the audio stream, the serial port and the live DSP run in a worker process
+with its own interpreter and GIL, so figure redraws or exports in the Tk process cannot
+delay the capture callbacks. Data flows through two multiprocessing.shared_memory rings,
+each with one writer (the worker):
+
+    spectrum   latest live spectrum (dB SPL per rfft bin of the last LIVE_SECONDS)
+    telemetry  every air speed / PWM sample as (monotonic time, kind, value)
+
+Each ring slot carries a sequence number that is cleared before the slot is written
+and set afterwards, so readers never block the writer and detect (and skip) a slot
+that was overwritten while they copied it. The GUI only reads the latest spectrum; it
+drains the telemetry ring so no sample is lost.
+
+A multiprocessing.connection pipe carries the small control messages: fan speed, PWM
+and record commands to the worker, and console lines, errors and finished takes back.
+A take is recorded from the already-running stream, copied into a shared memory block
+of its own and announced by name.
+
+WorkerComProxy stands in for ComPortHandler in the GUI, so the serial handling code runs
+unchanged: telemetry ring records are turned back into "AD"/"PWM" lines with their
+worker-side timestamps (time.monotonic() is system-wide, see timeline.py).
+
+The worker is started as a separate program (python acquisition_process.py, or the
+frozen executable with --acquisition-worker) rather than by multiprocessing spawn,
+so the GUI script is never re-imported in the child.
+"""
+import argparse
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Listener, Client
+import numpy as np
+
+WORKER_FLAG = "--acquisition-worker"
+LIVE_SECONDS = 0.5        # Audio averaged into each live spectrum
+SPECTRUM_SLOTS = 8
+TELEMETRY_SLOTS = 4096    # ~80 s of telemetry at 50 lines/s before the GUI must have read it
+START_TIMEOUT_S = 15
+TELEMETRY_POLL_S = 0.02   # GUI-side telemetry ring polling interval
+
+TELEMETRY_DTYPE = np.dtype([("t", "<f8"), ("kind", "<i4"), ("value", "<f8")])
+KIND_AIR_SPEED = 1
+KIND_PWM = 2
+KIND_NAMES = {KIND_AIR_SPEED: "AD", KIND_PWM: "PWM"}
+HEADER_BYTES = 64
+
+
+def _untrack(shm):
+    """Stops this process's resource tracker from unlinking a block it did not create (POSIX)."""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+class SharedRing:
+    def __init__(self, record_dtype, slots, name=None):
+        """
+        Single-writer ring of fixed-size records in shared memory.
+
+        :param record_dtype: numpy dtype of one record (may have a shape, e.g. ("<f4", 2049))
+        :param slots: Records held
+        :param name: Attach to an existing ring instead of creating one
+        """
+        self.slot_dtype = np.dtype([("seq", "<i8"), ("data", record_dtype)])
+        size = HEADER_BYTES + slots * self.slot_dtype.itemsize
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        if not self.owner:
+            _untrack(self.shm)
+        self.header = np.ndarray((1,), dtype="<i8", buffer=self.shm.buf)
+        self.slots = np.ndarray((slots,), dtype=self.slot_dtype, buffer=self.shm.buf, offset=HEADER_BYTES)
+        self.n_slots = slots
+        if self.owner:
+            self.header[0] = 0
+            self.slots["seq"] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def write(self, record):
+        seq = int(self.header[0]) + 1
+        slot = seq % self.n_slots
+        self.slots["seq"][slot] = -1
+        self.slots["data"][slot] = record
+        self.slots["seq"][slot] = seq
+        self.header[0] = seq
+
+    def read_latest(self):
+        """(seq, copy of the newest record), or (0, None) if nothing was written yet."""
+        for _ in range(3):
+            seq = int(self.header[0])
+            if seq == 0:
+                return 0, None
+            slot = seq % self.n_slots
+            data = self.slots["data"][slot].copy()
+            if self.slots["seq"][slot] == seq:
+                return seq, data
+        return 0, None
+
+    def read_since(self, last_seq):
+        """
+        Records written after last_seq, oldest first.
+
+        :return: (newest seq, records); records overwritten before they were read are skipped
+        """
+        seq = int(self.header[0])
+        first = max(last_seq + 1, seq - self.n_slots + 1)
+        if seq < first:
+            return last_seq, self.slots["data"][:0].copy()
+        wanted = np.arange(first, seq + 1)
+        idx = wanted % self.n_slots
+        data = self.slots["data"][idx]  # Fancy indexing copies
+        valid = self.slots["seq"][idx] == wanted
+        return seq, data[valid]
+
+    def close(self):
+        del self.header, self.slots
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def worker_command(args):
+    """Command line that starts the worker program."""
+    if getattr(sys, "frozen", False):
+        return [sys.executable, WORKER_FLAG] + args
+    return [sys.executable, os.path.abspath(__file__)] + args
+
+
+# ------------------------------
+# Worker process
+# ------------------------------
+class AcquisitionWorker:
+    def __init__(self, conn, spectrum_ring, telemetry_ring, settings, channels, n_window, port, baudrate):
+        from capture import CaptureSettings
+        self.conn = conn
+        self.spectrum_ring = spectrum_ring
+        self.telemetry_ring = telemetry_ring
+        self.settings = CaptureSettings(*settings)
+        self.channels = channels
+        self.n_window = n_window
+        self.port = port
+        self.baudrate = baudrate
+        self.send_lock = threading.Lock()
+        live_frames = max(int(LIVE_SECONDS * self.settings.sample_rate), 2 * n_window)
+        self.live = np.zeros((live_frames, channels), dtype=self.settings.sample_dtype)
+        self.blocks = queue.Queue()
+        self.take = None  # (request id, frames wanted, collected blocks, ADC time of the first sample)
+        self.running = True
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def on_block(self, block, adc):
+        self.blocks.put((block, adc))
+
+    def on_line(self, line):
+        t = self.com.last_line_time or time.monotonic()
+        try:
+            if line.startswith("AD"):
+                self.telemetry_ring.write((t, KIND_AIR_SPEED, float(line[2:])))
+                return
+            if line.startswith("PWM"):
+                self.telemetry_ring.write((t, KIND_PWM, int(line[3:])))
+                return
+        except ValueError:
+            pass
+        self.send(("line", t, line))
+
+    def dsp_loop(self):
+        """Keeps the live buffer, publishes the live spectrum and collects takes."""
+        from live_spectrogram import compute_fft
+        while self.running:
+            try:
+                block, adc = self.blocks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            n = min(len(block), len(self.live))
+            self.live = np.roll(self.live, -n, axis=0)
+            self.live[-n:] = block[-n:]
+            if self.take is not None:
+                self._collect(block, adc)
+            # Only the newest block matters for the live view; skip ahead if the DSP fell behind
+            if self.blocks.qsize() == 0:
+                _, spl = compute_fft(self.live[:, 0], self.n_window, 0.5, "float32", fs=self.settings.sample_rate)
+                self.spectrum_ring.write(spl)
+
+    def _collect(self, block, adc):
+        request_id, wanted, blocks, t0 = self.take
+        blocks.append(block)
+        t0 = adc if t0 is None else t0
+        self.take = (request_id, wanted, blocks, t0)
+        if sum(len(b) for b in blocks) < wanted:
+            return
+        self.take = None
+        audio = np.concatenate(blocks)[:wanted]
+        shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+        np.ndarray(audio.shape, dtype=audio.dtype, buffer=shm.buf)[:] = audio
+        _untrack(shm)  # The GUI copies and unlinks it
+        self.send(("take", request_id, shm.name, audio.shape, audio.dtype.str, t0))
+        shm.close()
+
+    def run(self):
+        from com_port import ComPortHandler
+        self.com = ComPortHandler(port=self.port, baudrate=self.baudrate, timeout=1, callback=self.on_line)
+        self.com.open()
+        threading.Thread(target=self.dsp_loop, daemon=True).start()
+
+        fs = self.settings.sample_rate
+        stream = None
+        try:
+            stream = self.settings.open_stream(self.channels, callback=self.on_block, with_time=True)
+            stream.start()
+        except Exception as e:
+            self.send(("error", f"Could not open the audio stream: {e}"))
+
+        while self.running:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            command = message[0]
+            if command == "fan_speed":
+                self.com.send_fan_speed(message[1])
+            elif command == "pwm":
+                self.com.send_pwm(message[1])
+            elif command == "record":
+                _, request_id, duration, channels = message
+                if stream is None or channels > self.channels:
+                    self.send(("take", request_id, None, None, None, None))
+                else:
+                    self.take = (request_id, int(duration * fs), [], None)
+            elif command == "stop":
+                break
+        self.running = False
+        if stream is not None:
+            stream.close()
+        self.com.close()
+
+
+def worker_main(argv=None):
+    parser = argparse.ArgumentParser(description="Acquisition worker process")
+    parser.add_argument("--address", required=True, help="host:port of the GUI's control listener")
+    parser.add_argument("--spectrum", required=True, help="Shared memory name of the spectrum ring")
+    parser.add_argument("--telemetry", required=True, help="Shared memory name of the telemetry ring")
+    parser.add_argument("--sample-rate", type=int, default=96000)
+    parser.add_argument("--bit-depth", type=int, default=24)
+    parser.add_argument("--block-size", type=int, default=4096)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--n-window", type=int, default=4096)
+    parser.add_argument("--port", default="COM3")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    args = parser.parse_args(argv)
+
+    authkey = bytes.fromhex(sys.stdin.readline().strip())
+    host, port = args.address.rsplit(":", 1)
+    conn = Client((host, int(port)), authkey=authkey)
+    n_bins = args.n_window // 2 + 1
+    spectrum_ring = SharedRing(("<f4", n_bins), SPECTRUM_SLOTS, name=args.spectrum)
+    telemetry_ring = SharedRing(TELEMETRY_DTYPE, TELEMETRY_SLOTS, name=args.telemetry)
+    worker = AcquisitionWorker(conn, spectrum_ring, telemetry_ring,
+                               (args.sample_rate, args.bit_depth, args.block_size),
+                               args.channels, args.n_window, args.port, args.baudrate)
+    try:
+        worker.run()
+    finally:
+        spectrum_ring.close()
+        telemetry_ring.close()
+        conn.close()
+    return 0
+
+
+# ------------------------------
+# GUI side
+# ------------------------------
+class AcquisitionClient:
+    def __init__(self, settings, n_window=4096, channels=1, port="COM3", baudrate=115200):
+        """
+        :param settings: capture.CaptureSettings for the worker's stream
+        :param n_window: FFT length of the live spectrum
+        :param channels: Input channels of the worker's stream (takes can use up to this many)
+        :param port: Serial port the worker opens
+        """
+        self.settings = settings
+        self.n_window = n_window
+        self.channels = channels
+        self.port = port
+        self.baudrate = baudrate
+        self.freqs = settings.freqs(n_window)
+        self.process = None
+        self.conn = None
+        self.on_line = None      # Called with (t, line) for every serial line (telemetry included)
+        self.on_error = None     # Called with error messages from the worker
+        self.spectrum_ring = None
+        self.telemetry_ring = None
+        self._telemetry_seq = 0
+        self._requests = {}      # request id -> [Event, result]
+        self._next_request = 0
+        self._running = False
+        self._reader = None
+        self._send_lock = threading.Lock()
+
+    def start(self):
+        """Starts the worker and waits until it has connected."""
+        self.spectrum_ring = SharedRing(("<f4", len(self.freqs)), SPECTRUM_SLOTS)
+        self.telemetry_ring = SharedRing(TELEMETRY_DTYPE, TELEMETRY_SLOTS)
+        authkey = secrets.token_bytes(16)
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        host, port = listener.address
+        args = ["--address", f"{host}:{port}", "--spectrum", self.spectrum_ring.name,
+                "--telemetry", self.telemetry_ring.name,
+                "--sample-rate", str(self.settings.sample_rate), "--bit-depth", str(self.settings.bit_depth),
+                "--block-size", str(self.settings.block_size), "--channels", str(self.channels),
+                "--n-window", str(self.n_window), "--port", self.port, "--baudrate", str(self.baudrate)]
+        self.process = subprocess.Popen(worker_command(args), stdin=subprocess.PIPE)
+        self.process.stdin.write((authkey.hex() + "\n").encode())
+        self.process.stdin.close()
+
+        accepted = []
+        accept_thread = threading.Thread(target=lambda: accepted.append(listener.accept()), daemon=True)
+        accept_thread.start()
+        accept_thread.join(START_TIMEOUT_S)
+        listener.close()
+        if not accepted:
+            self.process.kill()
+            self._close_rings()
+            raise RuntimeError("The acquisition process did not start.")
+        self.conn = accepted[0]
+        self._running = True
+        self._reader = threading.Thread(target=self._receive_loop, daemon=True)
+        self._reader.start()
+
+    def send(self, *message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def _receive_loop(self):
+        """
+        Handles worker messages and drains the telemetry ring on one thread, so every
+        serial line (and its time stamp) reaches on_line in order.
+        """
+        while self._running:
+            try:
+                message = self.conn.recv() if self.conn.poll(TELEMETRY_POLL_S) else None
+            except (EOFError, OSError):
+                break
+            self._drain_telemetry()
+            if message is None:
+                continue
+            if message[0] == "line":
+                if self.on_line is not None:
+                    self.on_line(message[1], message[2])
+            elif message[0] == "take":
+                request = self._requests.get(message[1])
+                if request is not None:
+                    request[1] = message[2:]
+                    request[0].set()
+            elif message[0] == "error":
+                print("Acquisition process:", message[1])
+                if self.on_error is not None:
+                    self.on_error(message[1])
+
+    def _drain_telemetry(self):
+        """Replays new telemetry ring records as serial lines (values as the firmware sent them)."""
+        self._telemetry_seq, records = self.telemetry_ring.read_since(self._telemetry_seq)
+        if self.on_line is not None:
+            for t, kind, value in records:
+                line = KIND_NAMES[kind] + (str(float(value)) if kind == KIND_AIR_SPEED else f"{int(value)}")
+                self.on_line(float(t), line)
+
+    def latest_spectrum(self):
+        """(seq, freqs, dB SPL) of the newest live spectrum, or None before the first one."""
+        seq, spl = self.spectrum_ring.read_latest()
+        return None if spl is None else (seq, self.freqs, spl)
+
+    def record(self, duration=5, channels=1):
+        """
+        Records a take from the worker's running stream (blocks the calling thread).
+
+        :return: (audio, ADC time of the first sample), or (None, None) if the worker could not record it
+        """
+        with self._send_lock:
+            request_id = self._next_request
+            self._next_request += 1
+        request = self._requests[request_id] = [threading.Event(), None]
+        self.send("record", request_id, duration, channels)
+        if not request[0].wait(duration + START_TIMEOUT_S):
+            self._requests.pop(request_id, None)
+            raise RuntimeError("The acquisition process did not return the take.")
+        self._requests.pop(request_id, None)
+        name, shape, dtype, t0 = request[1]
+        if name is None:
+            return None, None
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            audio = np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        return (audio[:, 0] if channels == 1 else audio), t0
+
+    def stop(self):
+        self._running = False
+        try:
+            self.send("stop")
+        except Exception:
+            pass
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self._reader is not None:
+            self._reader.join(timeout=1.0)  # Leaves the rings within one poll interval
+            self._reader = None
+        if self.conn is not None:
+            self.conn.close()
+        self._close_rings()
+
+    def _close_rings(self):
+        for ring in (self.spectrum_ring, self.telemetry_ring):
+            if ring is not None:
+                ring.close()
+        self.spectrum_ring = self.telemetry_ring = None
+
+
+class WorkerComProxy:
+    def __init__(self, client, callback=None):
+        """
+        Drop-in for ComPortHandler that forwards commands to the acquisition process.
+
+        :param client: Started AcquisitionClient
+        :param callback: Function called with each serial line (as for ComPortHandler)
+        """
+        self.client = client
+        self.port = client.port
+        self.callback = callback
+        self.last_line_time = None
+        self.running = True
+        client.on_line = self._on_line
+
+    def _on_line(self, t, line):
+        if not self.running:
+            return
+        self.last_line_time = t
+        if self.callback:
+            self.callback(line)
+
+    def open(self):
+        pass
+
+    def close(self):
+        self.running = False
+
+    def send_fan_speed(self, speed):
+        self.client.send("fan_speed", speed)
+        print(f"Sent fan speed: CS{speed:.2f}")
+
+    def send_pwm(self, pwm):
+        self.client.send("pwm", int(pwm))
+        print(f"Sent PWM signal: MP{int(pwm)}")
+
+
+if __name__ == "__main__":
+    sys.exit(worker_main())
@@ -0,0 +1,255 @@
+"""
+Lossless compressed archive of recorded takes.
+
+Takes are split into chunks of CHUNK_SECONDS that are encoded independently, so any
+time slice can be decoded by reading only the chunks it overlaps. Integer takes are
+delta-coded along time (the first sample of each chunk is kept as is), narrowed to the
+smallest integer type that holds the chunk's deltas, byte-shuffled and deflated with
+zlib. Float takes are byte-shuffled and deflated without delta coding. Both round-trip
+bit-exactly.
+
+File layout (little-endian):
+    b"WTAKE1\\0\\0", uint64 header length, UTF-8 JSON header, chunk payloads
+
+The header holds dtype, shape, chunk length, per-chunk (offset, size, delta dtype) and
+the take's metadata sidecar, which is also kept next to the archive as <name>.json.
+
+Usage:
+    python archive.py compress <takes folder or .npy files> [--workers N] [--delete]
+    python archive.py extract <archive> [--start S] [--end S] [-o out.npy]
+    python archive.py info <archive>
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from export_worker import atomic_write
+
+MAGIC = b"WTAKE1\0\0"
+ARCHIVE_EXT = ".wtz"
+CHUNK_SECONDS = 1.0
+ZLIB_LEVEL = 6
+DEFAULT_SAMPLE_RATE = 96000
+
+
+def _shuffle(array):
+    """Groups the bytes of each element by significance (all low bytes, then the next, ...)."""
+    itemsize = array.dtype.itemsize
+    return np.ascontiguousarray(array.reshape(-1).view(np.uint8).reshape(-1, itemsize).T).tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    itemsize = np.dtype(dtype).itemsize
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, count).T.copy().view(dtype).reshape(-1)
+
+
+def encode_chunk(chunk):
+    """
+    Encodes one (frames, channels) chunk.
+
+    :return: (payload bytes, dtype string of the stored values)
+    """
+    if chunk.dtype.kind in "iu":
+        deltas = np.diff(chunk.astype(np.int64), axis=0, prepend=0)
+        low, high = int(deltas.min(initial=0)), int(deltas.max(initial=0))
+        stored = next(np.dtype(t) for t in ("<i1", "<i2", "<i4", "<i8")
+                      if np.iinfo(t).min <= low and high <= np.iinfo(t).max)
+        values = deltas.astype(stored)
+    else:
+        values = chunk.astype(chunk.dtype.newbyteorder("<"))
+        stored = values.dtype
+    return zlib.compress(_shuffle(values), ZLIB_LEVEL), stored.str
+
+
+def decode_chunk(payload, stored, dtype, shape):
+    values = _unshuffle(zlib.decompress(payload), stored, shape[0] * shape[1]).reshape(shape)
+    dtype = np.dtype(dtype)
+    if dtype.kind in "iu":
+        return np.cumsum(values, axis=0, dtype=np.int64).astype(dtype)
+    return values.astype(dtype)
+
+
+def _encode_chunk_args(args):
+    return encode_chunk(args)
+
+
+def write_archive(path, audio, metadata=None, sample_rate=None, chunk_seconds=CHUNK_SECONDS, executor=None):
+    """
+    Writes a take as a compressed archive (atomically).
+
+    :param audio: (samples,) or (samples, channels) array; an empty take gives an archive with no chunks
+    :param metadata: Sidecar dict, stored in the header
+    :param sample_rate: Sets the chunk length (defaults to metadata["sample_rate"] or 96 kHz)
+    :param executor: Optional concurrent.futures executor to encode the chunks in parallel
+    """
+    audio = np.asarray(audio)
+    metadata = dict(metadata or {})
+    sample_rate = sample_rate or metadata.get("sample_rate") or DEFAULT_SAMPLE_RATE
+    # Explicit channel count: reshape(0, -1) is ambiguous for an empty take
+    frames = audio.reshape(len(audio), int(np.prod(audio.shape[1:])))
+    chunk_frames = max(int(chunk_seconds * sample_rate), 1)
+    chunks = [frames[i:i + chunk_frames] for i in range(0, len(frames), chunk_frames)]
+    mapper = executor.map if executor is not None else map
+    encoded = list(mapper(_encode_chunk_args, chunks))
+
+    offset = 0
+    index = []
+    for payload, stored in encoded:
+        index.append([offset, len(payload), stored])
+        offset += len(payload)
+    header = json.dumps({
+        "dtype": audio.dtype.str,
+        "shape": list(audio.shape),
+        "chunk_frames": chunk_frames,
+        "sample_rate": sample_rate,
+        "chunks": index,
+        "metadata": metadata,
+    }).encode("utf-8")
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+            for payload, _ in encoded:
+                f.write(payload)
+    atomic_write(path, write)
+    return offset + len(header) + len(MAGIC) + 8
+
+
+class TakeArchive:
+    def __init__(self, path):
+        """Opens an archive for random access; only the header is read here."""
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a take archive.")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(header_len).decode("utf-8"))
+        self.data_offset = len(MAGIC) + 8 + header_len
+        self.dtype = np.dtype(self.header["dtype"])
+        self.shape = tuple(self.header["shape"])
+        self.chunk_frames = self.header["chunk_frames"]
+        self.sample_rate = self.header["sample_rate"]
+        self.metadata = self.header["metadata"]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def read(self, start=0, stop=None):
+        """Decodes samples [start, stop), reading only the chunks they fall in."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(start, 0)
+        channels = int(np.prod(self.shape[1:])) if len(self.shape) > 1 else 1
+        if stop <= start:
+            return np.zeros((0,) + self.shape[1:], dtype=self.dtype)
+        first, last = start // self.chunk_frames, (stop - 1) // self.chunk_frames
+        parts = []
+        with open(self.path, "rb") as f:
+            for k in range(first, last + 1):
+                offset, size, stored = self.header["chunks"][k]
+                f.seek(self.data_offset + offset)
+                frames = min(self.chunk_frames, len(self) - k * self.chunk_frames)
+                parts.append(decode_chunk(f.read(size), stored, self.dtype, (frames, channels)))
+        data = np.concatenate(parts)[start - first * self.chunk_frames: stop - first * self.chunk_frames]
+        return data.reshape((-1,) + self.shape[1:])
+
+    def read_seconds(self, start_s=0.0, end_s=None):
+        stop = None if end_s is None else int(round(end_s * self.sample_rate))
+        return self.read(int(round(start_s * self.sample_rate)), stop)
+
+
+def archive_take(npy_path, delete=False, executor=None):
+    """
+    Compresses takes/<name>.npy (and its .json sidecar) to <name>.wtz.
+
+    The archive is verified against the original before the .npy is deleted.
+    :return: Archive size (bytes)
+    """
+    stem = npy_path[:-4]
+    audio = np.load(npy_path, mmap_mode="r")
+    metadata = {}
+    if os.path.isfile(stem + ".json"):
+        with open(stem + ".json") as f:
+            metadata = json.load(f)
+    size = write_archive(stem + ARCHIVE_EXT, audio, metadata, executor=executor)
+    if delete:
+        if not np.array_equal(TakeArchive(stem + ARCHIVE_EXT).read(), audio):
+            raise ValueError(f"Archive of {npy_path} did not verify; original kept.")
+        del audio
+        os.remove(npy_path)
+    return size
+
+
+def _find_takes(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, "**", "*.npy"), recursive=True)))
+        else:
+            found.append(path)
+    # Only raw takes (result arrays under results/ are small and kept as .npy)
+    return [p for p in found if os.path.basename(os.path.dirname(p)) != "results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lossless archive of recorded takes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_compress = sub.add_parser("compress", help="Compress .npy takes to .wtz archives")
+    p_compress.add_argument("paths", nargs="+", help="Take files or folders (searched recursively)")
+    p_compress.add_argument("--workers", type=int, default=None, help="Encoder processes (default: CPU count)")
+    p_compress.add_argument("--delete", action="store_true", help="Delete each .npy after its archive verifies")
+    p_extract = sub.add_parser("extract", help="Decode an archive (or a time slice of it) to .npy")
+    p_extract.add_argument("archive")
+    p_extract.add_argument("--start", type=float, default=0.0, help="Start time (s)")
+    p_extract.add_argument("--end", type=float, default=None, help="End time (s)")
+    p_extract.add_argument("-o", "--output", default=None)
+    p_info = sub.add_parser("info", help="Show an archive's header")
+    p_info.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.command == "compress":
+        takes = _find_takes(args.paths)
+        total_in = total_out = 0
+        failed = []
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for path in takes:
+                try:
+                    original = os.path.getsize(path)
+                    size = archive_take(path, args.delete, executor)
+                except (OSError, ValueError) as e:
+                    print(f"{path}: failed: {e}")
+                    failed.append(path)
+                    continue
+                total_in += original
+                total_out += size
+                print(f"{path}: {original / 1e6:.1f} MB -> {size / 1e6:.1f} MB ({size / original:.0%})")
+        done = len(takes) - len(failed)
+        if done:
+            print(f"{done} takes: {total_in / 1e6:.1f} MB -> {total_out / 1e6:.1f} MB ({total_out / total_in:.0%})")
+        if failed:
+            print(f"{len(failed)} takes failed and were left as they are.")
+            sys.exit(1)
+    elif args.command == "extract":
+        archive = TakeArchive(args.archive)
+        audio = archive.read_seconds(args.start, args.end)
+        output = args.output or args.archive[:-len(ARCHIVE_EXT)] + ".npy"
+        np.save(output, audio)
+        json_path = args.archive[:-len(ARCHIVE_EXT)] + ".json"
+        if os.path.isfile(json_path) and not os.path.isfile(output[:-4] + ".json"):
+            shutil.copy(json_path, output[:-4] + ".json")
+        print(f"Wrote {len(audio)} samples to {output}")
+    elif args.command == "info":
+        archive = TakeArchive(args.archive)
+        header = dict(archive.header)
+        header["chunks"] = len(header["chunks"])
+        print(json.dumps(header, indent=2))
+
+
+if __name__ == "__main__":
+    main()
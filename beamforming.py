@@ -0,0 +1,227 @@
+"""
+Conventional (delay-and-sum) frequency-domain beamforming over a 2-D scan grid.
+
+A multi-channel take from a microphone array is turned into a cross-spectral matrix
+(CSM) C(f) = E[p(f) p(f)^H] with one batched Welch pass: every segment of every channel
+goes through one rfft, and the per-bin M x M products over the segments are one stacked
+matrix product. The bins of each fractional-octave band are summed into one band CSM.
+
+For each scan point g the steering vector models a monopole at g:
+
+    e_gm = (r_g0 / r_gm) * exp(-2j*pi*f*(r_gm - r_g0) / c),   w_g = e_g / |e_g|^2
+
+where r_gm is the distance from g to mic m and r_g0 the distance to the array centre.
+The map value w_g^H C w_g is then the power a source at g would produce at the array
+centre (dB SPL, same scale as compute_fft). Band maps use the steering vectors at the
+band centre frequency. With diagonal removal, the auto-spectra (which hold each mic's
+own self-noise, e.g. flow noise at the mic) are dropped from C and the result is
+renormalised so a single source keeps its level.
+
+Usage:
+    python beamforming.py <take .npy/.wtz> <geometry.txt> --distance 1.0 --extent 0.5
+        [--points 64] [--fraction 3] [--remove-diagonal] [-o maps.npz] [--plot maps.png]
+
+The geometry file has one "x y z" line per channel (m, array plane z = 0); lines
+starting with "#" are ignored. Scan grids lie in the plane z = --distance.
+"""
+import argparse
+import numpy as np
+
+from live_spectrogram import FS, PRECISION, _fft_scaling, _segment_frames, band_center_frequencies, full_scale
+
+SPEED_OF_SOUND = 343.0  # m/s
+DEFAULT_POINTS = 64
+
+
+def load_geometry(path):
+    """Mic positions (channels, 3) in metres from a text file of "x y z" lines (z optional)."""
+    mics = np.atleast_2d(np.loadtxt(path, comments="#", dtype=np.float64))
+    if mics.shape[1] == 2:
+        mics = np.column_stack((mics, np.zeros(len(mics))))
+    if mics.shape[1] != 3:
+        raise ValueError(f"{path}: expected x y [z] per line.")
+    return mics
+
+
+def scan_grid(extent, distance, points=DEFAULT_POINTS, center=(0.0, 0.0)):
+    """
+    Square scan grid parallel to the array plane.
+
+    :param extent: Half-width of the grid (m)
+    :param distance: Distance from the array plane (m)
+    :return: x, y axes and (points * points, 3) scan positions (row-major in y, then x)
+    """
+    x = center[0] + np.linspace(-extent, extent, points)
+    y = center[1] + np.linspace(-extent, extent, points)
+    gx, gy = np.meshgrid(x, y)
+    return x, y, np.column_stack((gx.ravel(), gy.ravel(), np.full(gx.size, float(distance))))
+
+
+def band_cross_spectra(audio_data, n_window=4096, overlap=0.5, fraction=3, precision=None, chunk_segments=64, fs=None):
+    """
+    Band-summed cross-spectral matrices of a multi-channel take in one Welch pass.
+
+    Each band CSM is the sum of the per-bin CSMs in the band divided by the window's
+    noise bandwidth (1.5 bins for Hann), so a tone reads as in compute_fft.
+
+    :param audio_data: (samples, channels) take (float or integer samples)
+    :return: band centre frequencies, (bands, channels, channels) complex CSMs, segments
+    """
+    audio_data = np.asarray(audio_data)
+    if audio_data.ndim != 2 or audio_data.shape[1] < 2:
+        raise ValueError("Beamforming needs a multi-channel (samples, channels) recording.")
+    real_dtype = np.dtype(precision or PRECISION)
+    complex_dtype = np.result_type(real_dtype, np.complex64)
+    fs = fs or FS
+
+    freqs = np.fft.rfftfreq(n_window, 1 / fs)
+    centers = band_center_frequencies(fraction)
+    half_band = 2 ** (1 / (2 * fraction))
+    lo = np.searchsorted(freqs, centers / half_band, side="left")
+    hi = np.searchsorted(freqs, centers * half_band, side="right")
+    valid = hi > lo
+    centers, lo, hi = centers[valid], lo[valid], hi[valid]
+    if not len(centers):
+        raise ValueError("No bands fall within the FFT bins.")
+    first, last = lo[0], hi[-1]  # Only the bins the bands cover are accumulated
+
+    frames, _ = _segment_frames(audio_data, n_window, overlap, real_dtype)  # (segments, channels, n_window)
+    scaled_window, _, _ = _fft_scaling(n_window, real_dtype, full_scale(frames.dtype))
+    channels = audio_data.shape[1]
+    csm = np.zeros((last - first, channels, channels), dtype=complex_dtype)
+    for start in range(0, len(frames), chunk_segments):
+        chunk = np.multiply(frames[start:start + chunk_segments], scaled_window, dtype=real_dtype)
+        spec = np.fft.rfft(chunk, axis=-1)[..., first:last]  # (segments, channels, bins)
+        x = np.ascontiguousarray(spec.transpose(2, 1, 0))     # (bins, channels, segments)
+        csm += x @ np.conj(x.transpose(0, 2, 1))
+    csm /= len(frames)
+
+    window = np.hanning(n_window)
+    enbw = n_window * np.sum(window**2) / np.sum(window) ** 2
+    cumulative = np.concatenate((np.zeros((1, channels, channels), dtype=csm.dtype), np.cumsum(csm, axis=0)))
+    bands = (cumulative[hi - first] - cumulative[lo - first]) / enbw
+    return centers, bands, len(frames)
+
+
+class Beamformer:
+    def __init__(self, mics, grid, c=SPEED_OF_SOUND, precision=None):
+        """
+        Delay-and-sum beamformer for a fixed array and scan grid.
+
+        Distances and amplitude terms of the steering vectors are computed once here;
+        only the phase depends on frequency.
+
+        :param mics: (channels, 3) mic positions (m)
+        :param grid: (points, 3) scan positions (m), e.g. from scan_grid
+        :param c: Speed of sound (m/s)
+        """
+        self.mics = np.asarray(mics, dtype=np.float64)
+        self.grid = np.asarray(grid, dtype=np.float64)
+        self.c = c
+        real_dtype = np.dtype(precision or PRECISION)
+        self.complex_dtype = np.result_type(real_dtype, np.complex64)
+        distances = np.linalg.norm(self.grid[:, None, :] - self.mics[None, :, :], axis=-1)  # (points, channels)
+        reference = np.linalg.norm(self.grid - self.mics.mean(axis=0), axis=-1)              # (points,)
+        self.path_difference = distances - reference[:, None]
+        amplitude = reference[:, None] / distances
+        self.amplitude = (amplitude / np.sum(amplitude**2, axis=1, keepdims=True)).astype(real_dtype)
+        # Share of a source's map value held by the CSM diagonal (|w_m|^2 |e_m|^2 summed)
+        self.diagonal_share = np.sum((self.amplitude * amplitude) ** 2, axis=1)
+
+    def steering_vectors(self, freq):
+        """Normalised steering vectors w (points, channels) at one frequency."""
+        phase = np.exp(-2j * np.pi * freq / self.c * self.path_difference)
+        return (self.amplitude * phase).astype(self.complex_dtype)
+
+    def map(self, freq, csm, remove_diagonal=False):
+        """
+        Beamforming power map w_g^H C w_g at one frequency (linear power, compute_fft scale).
+
+        :param csm: (channels, channels) cross-spectral matrix
+        """
+        csm = np.asarray(csm, dtype=self.complex_dtype)
+        if remove_diagonal:
+            csm = csm.copy()
+            np.fill_diagonal(csm, 0)
+        w = self.steering_vectors(freq)
+        power = np.einsum("gm,gm->g", np.conj(w), w @ csm.T).real
+        if remove_diagonal:
+            power /= 1 - self.diagonal_share
+        return power
+
+    def maps(self, freqs, csms, remove_diagonal=False):
+        """(bands, points) power maps for band CSMs (see band_cross_spectra)."""
+        return np.stack([self.map(f, csm, remove_diagonal) for f, csm in zip(freqs, csms)])
+
+
+def beamform(audio_data, mics, grid, n_window=4096, overlap=0.5, fraction=3, remove_diagonal=False,
+             c=SPEED_OF_SOUND, precision=None, fs=None):
+    """
+    Fractional-octave beamforming maps of a multi-channel take.
+
+    :param mics: (channels, 3) mic positions, in the take's channel order
+    :param grid: (points, 3) scan positions
+    :return: band centre frequencies and (bands, points) maps in dB SPL
+    """
+    if len(mics) != np.shape(audio_data)[1]:
+        raise ValueError(f"Geometry has {len(mics)} mics but the take has {np.shape(audio_data)[1]} channels.")
+    freqs, csms, _ = band_cross_spectra(audio_data, n_window, overlap, fraction, precision, fs=fs)
+    power = Beamformer(mics, grid, c, precision).maps(freqs, csms, remove_diagonal)
+    _, db_offset, power_floor = _fft_scaling(n_window, np.dtype(np.float64))
+    return freqs, 10 * np.log10(np.maximum(power, power_floor)) + db_offset
+
+
+def main():
+    from result_store import load_take
+
+    parser = argparse.ArgumentParser(description="Delay-and-sum beamforming maps of a microphone array take")
+    parser.add_argument("take", help="Multi-channel take (.npy or .wtz)")
+    parser.add_argument("geometry", help="Text file of mic positions, one 'x y z' line per channel (m)")
+    parser.add_argument("--distance", type=float, required=True, help="Scan plane distance from the array (m)")
+    parser.add_argument("--extent", type=float, required=True, help="Half-width of the scan grid (m)")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS, help="Grid points per side")
+    parser.add_argument("--fraction", type=int, default=3, help="Bands per octave")
+    parser.add_argument("--n-window", type=int, default=4096)
+    parser.add_argument("--remove-diagonal", action="store_true", help="Drop the CSM auto-spectra (mic self-noise)")
+    parser.add_argument("--speed-of-sound", type=float, default=SPEED_OF_SOUND)
+    parser.add_argument("-o", "--output", default="beamforming_maps.npz")
+    parser.add_argument("--plot", default=None, help="Also save the band maps as an image grid (.png)")
+    args = parser.parse_args()
+
+    audio, metadata = load_take(args.take)
+    fs = (metadata or {}).get("sample_rate") or FS
+    mics = load_geometry(args.geometry)
+    x, y, grid = scan_grid(args.extent, args.distance, args.points)
+    freqs, maps = beamform(np.asarray(audio), mics, grid, args.n_window, fraction=args.fraction,
+                           remove_diagonal=args.remove_diagonal, c=args.speed_of_sound, fs=fs)
+    maps = maps.reshape(len(freqs), len(y), len(x))
+    np.savez(args.output, freqs=freqs, maps=maps, x=x, y=y, mics=mics)
+    print(f"Saved {len(freqs)} band maps ({args.points}x{args.points}) to {args.output}")
+    for f, band_map in zip(freqs, maps):
+        row, col = np.unravel_index(np.argmax(band_map), band_map.shape)
+        print(f"  {f:8.1f} Hz: peak {band_map[row, col]:.1f} dB at x={x[col]:+.3f} m, y={y[row]:+.3f} m")
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        cols = int(np.ceil(np.sqrt(len(freqs))))
+        rows = -(-len(freqs) // cols)
+        fig, axes = plt.subplots(rows, cols, figsize=(3 * cols, 3 * rows), squeeze=False)
+        for ax in axes.ravel()[len(freqs):]:
+            ax.axis("off")
+        for ax, f, band_map in zip(axes.ravel(), freqs, maps):
+            peak = band_map.max()
+            ax.imshow(band_map, origin="lower", extent=(x[0], x[-1], y[0], y[-1]), cmap="inferno",
+                      vmin=peak - 15, vmax=peak)
+            ax.plot(mics[:, 0], mics[:, 1], "w.", markersize=3)
+            ax.set_title(f"{f:g} Hz ({peak:.1f} dB)", fontsize=8)
+            ax.tick_params(labelsize=6)
+        fig.tight_layout()
+        fig.savefig(args.plot, dpi=120)
+        print(f"Saved plot to {args.plot}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Throughput and memory benchmarks for the analysis code.
+
+Run with:  python benchmarks.py
+Nothing here touches the audio device or the COM port; inputs are synthetic.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from live_spectrogram import FS, compute_fft, compute_stft
+from tone_tracker import ToneTracker
+from display_reducer import LogDisplayReducer
+from live_spectrogram import save_fft_data
+from result_store import save_results, load_results
+from sound_level_meter import SoundLevelMeter
+from beamforming import Beamformer, band_cross_spectra, scan_grid
+
+
+def _synthetic_take(seconds, channels, seed=0):
+    """Noise plus a couple of tones, float32 like the capture stream."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * FS)) / FS
+    tones = 0.05 * np.sin(2 * np.pi * 440 * t) + 0.02 * np.sin(2 * np.pi * 3150 * t)
+    audio = 0.01 * rng.standard_normal((t.size, channels)) + tones[:, None]
+    return audio.astype(np.float32)
+
+
+def _measure(func, *args, **kwargs):
+    """Returns (result, seconds, peak traced bytes) for one call."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def benchmark_fft_precision(seconds=60, channels=4, n_window=4096):
+    """Compares the float64 and float32 compute_fft paths on a long multi-channel take."""
+    audio = _synthetic_take(seconds, channels)
+    print(f"compute_fft: {seconds} s x {channels} ch @ {FS} Hz, n_window={n_window}")
+
+    results = {}
+    for precision in ("float64", "float32"):
+        compute_fft(audio[: n_window * 4], n_window=n_window, precision=precision)  # warm-up
+        (freqs, spl), elapsed, peak = _measure(compute_fft, audio, n_window=n_window, precision=precision)
+        results[precision] = spl
+        print(f"  {precision}: {elapsed * 1000:8.1f} ms, "
+              f"{seconds / elapsed:6.0f}x real time, peak {peak / 1e6:7.1f} MB")
+
+    err = np.abs(results["float32"].astype(np.float64) - results["float64"])
+    print(f"  float32 vs float64: max |error| {err.max():.2e} dB, mean {err.mean():.2e} dB")
+
+
+def benchmark_integer_capture(seconds=60, fs=192000, n_window=8192):
+    """
+    compute_fft on an int32 (24-bit) take directly vs converting it to float first.
+
+    The float copy costs 2x the take on top of the batch working set (~92 MB here);
+    the fused path only needs the CHUNK_SAMPLES batch (~27 MB), at about the same speed.
+    """
+    samples = (_synthetic_take(seconds * fs / FS, 1)[:, 0] * 2**23).astype(np.int32) << 8
+    print(f"Integer capture: {seconds} s @ {fs} Hz int32, n_window={n_window}")
+    for label, prepare in (("float copy", lambda a: a.astype(np.float32) / 2**31), ("fused scale", lambda a: a)):
+        (_, spl), elapsed, peak = _measure(lambda: compute_fft(prepare(samples), n_window, precision="float32", fs=fs))
+        print(f"  {label:11s}: {elapsed * 1000:8.1f} ms, peak {peak / 1e6:7.1f} MB")
+
+
+def benchmark_tone_tracker(seconds=30, n_window=4096, overlap=0.5):
+    """Tone tracking rate against the frame rate the STFT produces in real time."""
+    freqs, times, frames_db = compute_stft(_synthetic_take(seconds, 1)[:, 0], n_window, overlap)
+    tracker = ToneTracker()
+    tracker.update(freqs, frames_db[:4], times[:4], pwm=255)  # warm-up
+    tracker.reset()
+
+    t0 = time.perf_counter()
+    tracker.update(freqs, frames_db, times, pwm=255)
+    elapsed = time.perf_counter() - t0
+    live_rate = FS / (n_window * (1 - overlap))
+    rate = len(times) / elapsed
+    print(f"ToneTracker: {rate:8.0f} frames/s vs {live_rate:.1f} frames/s live ({rate / live_rate:.0f}x headroom)")
+
+
+def benchmark_display_reducer(n_window=65536, runs=100, width_px=1000):
+    """Cost of reducing large spectra to pixel-width log bins for drawing."""
+    freqs = np.fft.rfftfreq(n_window, 1 / FS)
+    spectra = np.random.default_rng(0).normal(60, 5, (runs, freqs.size))
+    reducer = LogDisplayReducer()
+    reducer.reduce(freqs, spectra[0], width_px, 20, FS / 2)  # builds the cached index map
+
+    t0 = time.perf_counter()
+    x, y = reducer.reduce(freqs, spectra, width_px, 20, FS / 2)
+    elapsed = time.perf_counter() - t0
+    print(f"LogDisplayReducer: {runs} x {freqs.size} bins -> {runs} x {len(x)} points "
+          f"in {elapsed * 1000:.1f} ms")
+
+
+def benchmark_result_loading(runs=200, n_window=4096):
+    """
+    Loading spectra of many runs from CSV (text parse) against .npy result sets (memmap).
+
+    At small n_window the per-file open cost dominates both, so the gain depends on the
+    file system (1-4x at 4096); the text parse only dominates at large n_window (20-30x at 65536).
+    """
+    freqs = np.fft.rfftfreq(n_window, 1 / FS)
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as root, contextlib.redirect_stdout(io.StringIO()):
+        folders = []
+        for i in range(runs):
+            folder = os.path.join(root, f"run{i}")
+            os.makedirs(folder)
+            spl = rng.normal(60, 5, freqs.size)
+            save_fft_data(os.path.join(folder, "noise_isolated_fft.csv"), freqs, spl)
+            save_results(folder, freqs=freqs, isolated=spl)
+            folders.append(folder)
+
+        t0 = time.perf_counter()
+        csv_stack = np.stack([np.loadtxt(os.path.join(f, "noise_isolated_fft.csv"), delimiter=",", skiprows=1)[:, 1]
+                              for f in folders])
+        csv_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        npy_stack = np.stack([load_results(f, ["isolated"])["isolated"] for f in folders])
+        npy_time = time.perf_counter() - t0
+
+    assert np.allclose(csv_stack, npy_stack, atol=1e-6)
+    print(f"Loading {runs} spectra: CSV {csv_time * 1000:.0f} ms, .npy memmap {npy_time * 1000:.0f} ms "
+          f"({csv_time / npy_time:.0f}x faster)")
+
+
+def benchmark_sound_level_meter(seconds=30, block_size=4096):
+    """Per-block sound level meter cost against the audio callback period."""
+    audio = _synthetic_take(seconds, 1)[:, 0]
+    meter = SoundLevelMeter(FS, block_size)
+    blocks = audio[: len(audio) // block_size * block_size].reshape(-1, block_size)
+
+    t0 = time.perf_counter()
+    for block in blocks:
+        meter.process(block)
+    per_block = (time.perf_counter() - t0) / len(blocks)
+    budget = block_size / FS
+    print(f"SoundLevelMeter: {per_block * 1e6:.0f} us per {block_size}-sample block "
+          f"({per_block / budget * 100:.2f}% of the {budget * 1000:.1f} ms callback period)")
+
+
+def benchmark_beamforming(seconds=5, channels=64, points=64, n_window=4096):
+    """Third-octave delay-and-sum maps of an array take over a points x points grid."""
+    audio = _synthetic_take(seconds, channels)
+    rng = np.random.default_rng(1)
+    mics = np.column_stack((rng.uniform(-0.5, 0.5, (channels, 2)), np.zeros(channels)))
+    _, _, grid = scan_grid(0.5, 1.0, points)
+
+    t0 = time.perf_counter()
+    freqs, csms, _ = band_cross_spectra(audio, n_window)
+    csm_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    Beamformer(mics, grid).maps(freqs, csms)
+    map_time = time.perf_counter() - t0
+    print(f"Beamforming: {channels} mics, {seconds} s, {len(freqs)} bands on a {points}x{points} grid: "
+          f"CSM {csm_time:.2f} s, maps {map_time:.2f} s")
+
+
+if __name__ == "__main__":
+    benchmark_fft_precision()
+    benchmark_integer_capture()
+    benchmark_tone_tracker()
+    benchmark_display_reducer()
+    benchmark_result_loading()
+    benchmark_sound_level_meter()
+    benchmark_beamforming()
@@ -0,0 +1,155 @@
+"""
+Capture settings and the recording path for measurement takes.
+
+One CaptureSettings object describes the active capture: sample rate (up to 192 kHz),
+bit depth and block size. Takes are recorded as native integers: int16, int32, or
+packed 24-bit frames widened to left-justified int32 when they are read from the
+stream. The analysis folds the samples -> Pascals conversion into its window (see
+live_spectrogram.full_scale), so no float copy of the take is made. Frequency axes
+come from the settings instead of a fixed 96 kHz. Named streams stamp every block on the
+common clock (see timeline.py). Streams come from sounddevice unless a replay source
+is installed with set_audio_source (see replay.py). Takes end after a sample count, not
+wall time, so a replay runs at any speed.
+"""
+import queue
+import time
+import numpy as np
+import sounddevice as sd
+
+from live_spectrogram import audio_queue
+from timeline import timeline, adc_time
+
+SAMPLE_RATES = (44100, 48000, 96000, 192000)
+BIT_DEPTHS = (16, 24, 32)
+STREAM_DTYPES = {16: "int16", 24: "int24", 32: "int32"}
+STALL_TIMEOUT_S = 2.0  # A take ends early if no block arrives for this long
+
+_audio_source = sd
+
+
+def set_audio_source(source=None):
+    """
+    Routes every stream opened through CaptureSettings to source, an object with
+    sounddevice-style InputStream/RawInputStream constructors (None restores sounddevice).
+    """
+    global _audio_source
+    _audio_source = source or sd
+
+
+def audio_source():
+    """The module streams are opened from (sounddevice or a replay source)."""
+    return _audio_source
+
+
+def unpack_int24(raw, channels=1):
+    """
+    Widens packed little-endian 24-bit frames to left-justified int32 (full scale 2**31).
+
+    :param raw: Bytes-like buffer of 3-byte samples
+    :return: (samples, channels) int32 array
+    """
+    packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+    widened = np.zeros((len(packed), 4), dtype=np.uint8)
+    widened[:, 1:] = packed
+    return widened.view("<i4").reshape(-1, channels)
+
+
+class CaptureSettings:
+    def __init__(self, sample_rate=96000, bit_depth=24, block_size=4096):
+        """
+        :param sample_rate: Sample rate (Hz), one of SAMPLE_RATES
+        :param bit_depth: 16, 24 (packed) or 32 bit integer samples
+        :param block_size: Frames per stream callback
+        """
+        if sample_rate not in SAMPLE_RATES:
+            raise ValueError(f"Sample rate must be one of {SAMPLE_RATES}.")
+        if bit_depth not in BIT_DEPTHS:
+            raise ValueError(f"Bit depth must be one of {BIT_DEPTHS}.")
+        self.sample_rate = sample_rate
+        self.bit_depth = bit_depth
+        self.block_size = block_size
+
+    @property
+    def stream_dtype(self):
+        """Sample format requested from the audio device."""
+        return STREAM_DTYPES[self.bit_depth]
+
+    @property
+    def sample_dtype(self):
+        """dtype of the recorded arrays (24-bit samples are held in int32)."""
+        return np.dtype(np.int16 if self.bit_depth == 16 else np.int32)
+
+    def freqs(self, n_window):
+        """rfft bin frequencies for an n_window-point transform at the capture sample rate."""
+        return np.fft.rfftfreq(n_window, 1 / self.sample_rate)
+
+    def open_stream(self, channels=1, callback=None, stream_name=None, with_time=False):
+        """
+        Opens an input stream that queues (frames, channels) integer blocks.
+
+        :param callback: Called with each block (defaults to putting it on audio_queue)
+        :param stream_name: Timeline stream to stamp the blocks under (None = not stamped)
+        :param with_time: Call callback(block, ADC time of its first sample on the common clock)
+        """
+        callback = callback or audio_queue.put
+        if stream_name is not None:
+            timeline.start_stream(stream_name, self.sample_rate)
+
+        def stamp(time_info, frames):
+            t = adc_time(time_info, frames, self.sample_rate)
+            if stream_name is not None:
+                timeline.add_audio_block(stream_name, t, frames)
+            return t
+
+        if self.bit_depth == 24:
+            # Packed 24-bit is only available on raw streams
+            def raw_callback(indata, frames, time_info, status):
+                if status:
+                    print("Audio stream status:", status)
+                t = stamp(time_info, frames)
+                block = unpack_int24(bytes(indata), channels)
+                callback(block, t) if with_time else callback(block)
+            return _audio_source.RawInputStream(samplerate=self.sample_rate, channels=channels, dtype="int24",
+                                     blocksize=self.block_size, callback=raw_callback)
+
+        def array_callback(indata, frames, time_info, status):
+            if status:
+                print("Audio stream status:", status)
+            t = stamp(time_info, frames)
+            callback(indata.copy(), t) if with_time else callback(indata.copy())
+        return _audio_source.InputStream(samplerate=self.sample_rate, channels=channels, dtype=self.stream_dtype,
+                              blocksize=self.block_size, callback=array_callback)
+
+    def record(self, duration=5, channels=1):
+        """
+        Records a take of duration * sample_rate samples (its blocks are stamped on the
+        timeline as stream "take"). The take is shorter if the stream stops or stalls.
+
+        :return: (samples,) integer array, or (samples, channels) for multi-channel takes
+        """
+        needed = int(round(duration * self.sample_rate))
+        collected_audio = []
+        frames = 0
+        with self.open_stream(channels, stream_name="take") as stream:
+            last_block = time.monotonic()
+            while frames < needed and getattr(stream, "active", True):
+                try:
+                    block = audio_queue.get(timeout=0.05)
+                except queue.Empty:
+                    if time.monotonic() - last_block > STALL_TIMEOUT_S:
+                        print("Audio stream stalled; take ended early.")
+                        break
+                    continue
+                collected_audio.append(block)
+                frames += len(block)
+                last_block = time.monotonic()
+        # Blocks that arrived after the take was complete
+        while not audio_queue.empty():
+            audio_queue.get()
+        if not collected_audio:
+            return np.zeros((0, channels) if channels > 1 else 0, dtype=self.sample_dtype)
+        audio = np.concatenate(collected_audio)[:needed]
+        return audio[:, 0] if channels == 1 else audio
+
+    def describe(self):
+        return f"{self.sample_rate} Hz, {self.bit_depth}-bit"
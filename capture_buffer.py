@@ -0,0 +1,221 @@
+"""
+Always-on capture with a pre-trigger ring buffer.
+
+One input stream stays open and every block is copied into a preallocated circular
+buffer holding the last buffer_s seconds, so memory is fixed however long it runs.
+When a trigger fires, the capture waits until post_s seconds have arrived and then
+hands over the window [trigger - pre_s, trigger + post_s) without restarting the
+stream. Start-up transients of a fresh stream and whatever happened just before
+the trigger are therefore part of the take. The audio callback only queues the window's
+frame indices; a copy thread owned by the capture copies it out of the ring and calls
+on_capture, so neither the callback nor a busy consumer (e.g. an export queue) delays
+the copy. The ring keeps HANDOFF_S seconds of slack for the copy thread.
+
+Triggers:
+    manual      trigger() from the GUI
+    spl         unweighted block level above spl_threshold (dB)
+    kurtosis    mean spectral kurtosis above kurtosis_threshold. The bin powers of the
+                last KURTOSIS_BLOCKS blocks are kept in a fixed array; per bin,
+                SK = E[P^2] / E[P]^2 - 2 is 0 for stationary noise and jumps for
+                impulsive events such as stalls or flutter onset.
+    telemetry   on_telemetry(value) when telemetry_condition(value) is true
+"""
+import queue
+import threading
+import time
+import numpy as np
+
+from live_spectrogram import ADC_PEAK_VOLTAGE, MIC_SENSITIVITY_V_PER_PA, P_REF, CALIBRATION_OFFSET, full_scale
+
+DEFAULT_PRE_S = 2.0
+DEFAULT_POST_S = 3.0
+DEFAULT_HOLDOFF_S = 1.0   # Minimum time between triggers
+KURTOSIS_BLOCKS = 32      # Memory of the spectral kurtosis moments (blocks)
+HANDOFF_S = 5.0           # Time a completed window stays in the ring for the copy thread
+
+
+class RingBuffer:
+    def __init__(self, capacity, channels=1, dtype=np.int32):
+        """
+        Preallocated circular buffer of frames.
+
+        :param capacity: Frames held
+        """
+        self.data = np.zeros((capacity, channels), dtype=dtype)
+        self.capacity = capacity
+        self.written = 0  # Frames written since start (absolute position of the next frame)
+
+    def write(self, block):
+        block = block.reshape(len(block), -1)
+        n = len(block)
+        if n >= self.capacity:
+            block = block[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = block[:first]
+        self.data[:n - first] = block[first:]
+        self.written += n
+
+    def read(self, start, end):
+        """Copy of absolute frames [start, end); raises ValueError if they are no longer held."""
+        if start < self.written - self.capacity or end > self.written or start > end:
+            raise ValueError("Requested frames are not in the buffer.")
+        n = end - start
+        first = start % self.capacity
+        if first + n <= self.capacity:
+            return self.data[first:first + n].copy()
+        # Wraps around the end of the buffer
+        return np.concatenate((self.data[first:], self.data[:first + n - self.capacity]))
+
+
+class TriggeredCapture:
+    def __init__(self, settings, pre_s=DEFAULT_PRE_S, post_s=DEFAULT_POST_S, channels=1,
+                 spl_threshold=None, kurtosis_threshold=None, holdoff_s=DEFAULT_HOLDOFF_S):
+        """
+        :param settings: capture.CaptureSettings of the stream
+        :param pre_s: Seconds kept before the trigger
+        :param post_s: Seconds recorded after the trigger
+        :param spl_threshold: Block level that triggers a capture (dB SPL), or None
+        :param kurtosis_threshold: Mean spectral kurtosis that triggers a capture, or None
+        :param holdoff_s: Triggers within this time of the previous capture window are ignored
+        """
+        self.settings = settings
+        self.fs = settings.sample_rate
+        self.pre = int(pre_s * self.fs)
+        self.post = int(post_s * self.fs)
+        self.channels = channels
+        self.spl_threshold = spl_threshold
+        self.kurtosis_threshold = kurtosis_threshold
+        self.holdoff = int(holdoff_s * self.fs)
+        self.handoff = int(HANDOFF_S * self.fs)
+        self.ring = RingBuffer(self.pre + self.post + self.handoff + 2 * settings.block_size, channels,
+                               settings.sample_dtype)
+
+        self.on_capture = None           # Called with (audio, info) on the copy thread; should return quickly
+        self.telemetry_condition = None  # Callable(value) -> bool for on_telemetry
+        self.stream = None
+        self.level = None                # Last block level (dB SPL)
+        self.kurtosis = None             # Last mean spectral kurtosis
+        self._lock = threading.Lock()
+        self._pending = None             # (trigger frame, info) waiting for its post-trigger samples
+        self._last_end = -self.holdoff
+        self._powers = None              # (KURTOSIS_BLOCKS, bins) bin powers of recent blocks
+        self._blocks = 0
+        self._window = None
+        self._pascals_per_volt = ADC_PEAK_VOLTAGE / MIC_SENSITIVITY_V_PER_PA
+        self._windows = queue.Queue()    # (start, end, info) of completed windows for the copy thread
+        self._copier = None
+
+    def start(self):
+        self._copier = threading.Thread(target=self._copy_loop, daemon=True)
+        self._copier.start()
+        self.stream = self.settings.open_stream(self.channels, callback=self._on_block, stream_name="capture")
+        self.stream.start()
+
+    def stop(self):
+        """Closes the stream; windows already completed are still copied and handed over."""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self._copier is not None:
+            self._windows.put(None)
+            self._copier.join()
+            self._copier = None
+
+    # ------------------------------
+    # Triggers
+    # ------------------------------
+    def trigger(self, reason="manual", value=None):
+        """Requests a capture around the current position; False if one is pending or held off."""
+        with self._lock:
+            position = self.ring.written
+            if self._pending is not None or position < self._last_end + self.holdoff:
+                return False
+            self._pending = (position, {
+                "reason": reason,
+                "value": value,
+                "trigger_time": time.time(),
+                "sample_rate": self.fs,
+                "bit_depth": self.settings.bit_depth,
+            })
+        print(f"Capture triggered ({reason})")
+        return True
+
+    def on_telemetry(self, value):
+        """Checks a telemetry sample (e.g. air speed) against telemetry_condition."""
+        if self.telemetry_condition is not None and self.telemetry_condition(value):
+            self.trigger("telemetry", value)
+
+    def _block_level(self, mono):
+        ms = float(np.mean(np.square(mono))) * self._pascals_per_volt ** 2
+        return 10 * np.log10(max(ms, 1e-30) / P_REF ** 2) + CALIBRATION_OFFSET
+
+    def _spectral_kurtosis(self, mono):
+        if self._window is None or len(self._window) != len(mono):
+            self._window = np.hanning(len(mono)).astype(np.float32)
+            self._powers = np.zeros((KURTOSIS_BLOCKS, len(mono) // 2 + 1))
+            self._blocks = 0
+        spec = np.fft.rfft(mono * self._window)
+        self._powers[self._blocks % KURTOSIS_BLOCKS] = spec.real ** 2 + spec.imag ** 2
+        self._blocks += 1
+        if self._blocks < KURTOSIS_BLOCKS:
+            return None
+        powers = self._powers[:, 1:]
+        m1 = powers.mean(axis=0)
+        m2 = np.square(powers).mean(axis=0)
+        return float(np.mean(m2 / np.maximum(m1 ** 2, 1e-30)) - 2)
+
+    # ------------------------------
+    # Stream callback
+    # ------------------------------
+    def _on_block(self, block):
+        self.ring.write(block)
+        # Full scale = 1 keeps the fourth-order moments in range
+        mono = block[:, 0].astype(np.float32) * np.float32(1 / full_scale(block.dtype))
+
+        if self.spl_threshold is not None:
+            self.level = self._block_level(mono)
+            if self.level > self.spl_threshold:
+                self.trigger("spl", self.level)
+        if self.kurtosis_threshold is not None:
+            self.kurtosis = self._spectral_kurtosis(mono)
+            if self.kurtosis is not None and self.kurtosis > self.kurtosis_threshold:
+                self.trigger("kurtosis", self.kurtosis)
+
+        with self._lock:
+            if self._pending is None or self.ring.written < self._pending[0] + self.post:
+                return
+            position, info = self._pending
+            self._pending = None
+            end = position + self.post
+            start = max(position - self.pre, self.ring.written - self.ring.capacity, 0)
+            self._last_end = end
+        info["pre_s"] = (position - start) / self.fs
+        info["post_s"] = self.post / self.fs
+        self._windows.put((start, end, info))
+
+    def _copy_loop(self):
+        while True:
+            window = self._windows.get()
+            if window is None:
+                return
+            start, end, info = window
+            try:
+                audio = self.read_window(start, end)
+                if self.on_capture is not None:
+                    self.on_capture(audio, info)
+            except Exception as e:
+                print(f"Capture ({info['reason']}) lost:", e)
+
+    def read_window(self, start, end):
+        """
+        Copies absolute frames [start, end) out of the ring.
+
+        :raises ValueError: if the stream overwrote part of the window before or during the copy
+        """
+        audio = self.ring.read(start, end)
+        if start < self.ring.written - self.ring.capacity:
+            raise ValueError(f"Capture window was overwritten before it was copied (over {HANDOFF_S:g} s late).")
+        return audio[:, 0] if self.channels == 1 else audio
@@ -0,0 +1,327 @@
+"""
+Experiment catalog: a local SQLite index of saved runs.
+
+Every time results are saved the run's settings, 1/3 octave band levels and overall SPL
+are written to the catalog, so runs can be found by speed, PWM or level without opening
+the CSVs. Existing experiment folders can be back-filled with the importer.
+
+The overall SPL is only stored for two-mic (coherent) runs, whose isolated bands are
+sound pressure levels. The isolated bands of single-mic runs are dB differences
+(operation minus background), so their energetic sum is no level and is stored as NULL.
+
+Usage:
+    python catalog.py import <experiments root>
+    python catalog.py query --speed 8 [--tolerance 0.25] [--pwm 120] [--band 1000]
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+
+from export_worker import atomic_write
+
+CATALOG_FILE = "experiments.sqlite"
+METADATA_FILE = "run_metadata.json"
+THIRDOCT_FILE = "noise_isolated_thirdoct.csv"
+
+# How a run's "isolated" spectrum was obtained (run_metadata "isolation"):
+ISOLATION_DIFFERENCE = "difference"  # Single mic: dB-averaged operation minus background spectrum
+ISOLATION_COHERENT = "coherent"      # Two mics: power-averaged coherent output power at the measurement mic
+
+RUN_FIELDS = (
+    "folder", "name", "saved_at", "air_speed", "pwm", "calibration",
+    "n_window", "overlap", "sample_rate", "precision", "bpf", "overall_spl", "isolation",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    folder TEXT UNIQUE NOT NULL,
+    name TEXT,
+    saved_at TEXT,
+    air_speed REAL,
+    pwm REAL,
+    calibration TEXT,
+    n_window INTEGER,
+    overlap REAL,
+    sample_rate INTEGER,
+    precision TEXT,
+    bpf REAL,
+    overall_spl REAL,
+    isolation TEXT
+);
+CREATE TABLE IF NOT EXISTS bands (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    center_freq REAL NOT NULL,
+    spl REAL,
+    PRIMARY KEY (run_id, center_freq)
+);
+CREATE INDEX IF NOT EXISTS runs_air_speed ON runs(air_speed);
+CREATE INDEX IF NOT EXISTS runs_pwm ON runs(pwm);
+CREATE INDEX IF NOT EXISTS runs_overall_spl ON runs(overall_spl);
+CREATE INDEX IF NOT EXISTS bands_freq_spl ON bands(center_freq, spl);
+"""
+
+
+def overall_spl(band_spl):
+    """Energetic sum of band levels (dB), ignoring empty (-inf/nan) bands."""
+    band_spl = np.asarray(band_spl, dtype=np.float64)
+    band_spl = band_spl[np.isfinite(band_spl)]
+    if len(band_spl) == 0:
+        return None
+    return float(10 * np.log10(np.sum(10 ** (band_spl / 10))))
+
+
+def write_run_metadata(folder, metadata):
+    """Writes the run settings next to the results as run_metadata.json."""
+    def write(path):
+        with open(path, "w") as f:
+            json.dump(metadata, f, indent=2)
+    atomic_write(os.path.join(folder, METADATA_FILE), write)
+
+
+def isolation_mode(metadata):
+    """Isolation method of a run; runs saved before it was recorded are single-mic differences."""
+    return (metadata or {}).get("isolation") or ISOLATION_DIFFERENCE
+
+
+def read_run_metadata(folder):
+    """Reads run_metadata.json from a folder, or returns {} if there is none."""
+    try:
+        with open(os.path.join(folder, METADATA_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ExperimentCatalog:
+    def __init__(self, path=CATALOG_FILE):
+        """
+        Opens (or creates) the catalog database.
+
+        :param path: SQLite file path
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        if "isolation" not in columns:  # Catalogs created before the isolation method was recorded
+            self.conn.execute("ALTER TABLE runs ADD COLUMN isolation TEXT")
+            self.conn.execute("UPDATE runs SET isolation = ?", (ISOLATION_DIFFERENCE,))
+            self.conn.commit()
+        # Catalogs written before the overall SPL of single-mic runs was dropped
+        if self.conn.execute("SELECT 1 FROM runs WHERE isolation = ? AND overall_spl IS NOT NULL LIMIT 1",
+                             (ISOLATION_DIFFERENCE,)).fetchone():
+            self.conn.execute("UPDATE runs SET overall_spl = NULL WHERE isolation = ?", (ISOLATION_DIFFERENCE,))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def add_run(self, folder, metadata, center_freqs, band_spl, commit=True):
+        """
+        Adds or replaces the catalog entry for a run folder.
+
+        :param folder: Experiment folder holding the saved results
+        :param metadata: Run settings (keys from RUN_FIELDS; missing keys are stored as NULL)
+        :param center_freqs: 1/3 octave band centre frequencies
+        :param band_spl: Band SPL values (dB), or dB differences for single-mic runs
+        :return: Run id
+        """
+        row = {key: metadata.get(key) for key in RUN_FIELDS}
+        row["folder"] = os.path.abspath(folder)
+        row["name"] = row["name"] or os.path.basename(row["folder"])
+        row["isolation"] = isolation_mode(metadata)
+        # Single-mic isolated bands are dB differences, which do not sum to a level
+        row["overall_spl"] = overall_spl(band_spl) if row["isolation"] == ISOLATION_COHERENT else None
+
+        self.conn.execute("DELETE FROM runs WHERE folder = ?", (row["folder"],))
+        cur = self.conn.execute(
+            f"INSERT INTO runs ({', '.join(RUN_FIELDS)}) VALUES ({', '.join('?' * len(RUN_FIELDS))})",
+            [row[key] for key in RUN_FIELDS],
+        )
+        run_id = cur.lastrowid
+        band_spl = np.asarray(band_spl, dtype=np.float64)
+        self.conn.executemany(
+            "INSERT INTO bands (run_id, center_freq, spl) VALUES (?, ?, ?)",
+            [(run_id, float(fc), float(spl) if np.isfinite(spl) else None)
+             for fc, spl in zip(center_freqs, band_spl)],
+        )
+        if commit:
+            self.conn.commit()
+        return run_id
+
+    def query(self, air_speed=None, speed_tolerance=0.25, pwm=None, pwm_tolerance=0,
+              calibration=None, min_overall_spl=None, max_overall_spl=None, name_like=None, limit=None,
+              isolation=None):
+        """
+        Finds runs matching all of the given conditions.
+
+        :param isolation: Only runs isolated this way (ISOLATION_DIFFERENCE or ISOLATION_COHERENT);
+                          their band levels are not comparable across methods
+
+        :return: List of dicts, one per run, ordered by save time
+        """
+        where, args = [], []
+        if air_speed is not None:
+            where.append("air_speed BETWEEN ? AND ?")
+            args += [air_speed - speed_tolerance, air_speed + speed_tolerance]
+        if pwm is not None:
+            where.append("pwm BETWEEN ? AND ?")
+            args += [pwm - pwm_tolerance, pwm + pwm_tolerance]
+        if calibration is not None:
+            where.append("calibration = ?")
+            args.append(calibration)
+        if min_overall_spl is not None:
+            where.append("overall_spl >= ?")
+            args.append(min_overall_spl)
+        if max_overall_spl is not None:
+            where.append("overall_spl <= ?")
+            args.append(max_overall_spl)
+        if name_like is not None:
+            where.append("name LIKE ?")
+            args.append(f"%{name_like}%")
+        if isolation is not None:
+            where.append("isolation = ?")
+            args.append(isolation)
+
+        sql = "SELECT * FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY saved_at"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return [dict(r) for r in self.conn.execute(sql, args)]
+
+    def band_levels(self, run_ids, center_freq=None):
+        """
+        Returns band levels for the given runs.
+
+        :param center_freq: Only this band, or all bands if None
+        :return: Dict of run id -> (center_freqs, spl) arrays
+        """
+        run_ids = list(run_ids)
+        if not run_ids:
+            return {}
+        sql = f"SELECT run_id, center_freq, spl FROM bands WHERE run_id IN ({', '.join('?' * len(run_ids))})"
+        args = list(run_ids)
+        if center_freq is not None:
+            sql += " AND center_freq = ?"
+            args.append(center_freq)
+        sql += " ORDER BY run_id, center_freq"
+
+        levels = {}
+        for run_id, fc, spl in self.conn.execute(sql, args):
+            levels.setdefault(run_id, ([], []))
+            levels[run_id][0].append(fc)
+            levels[run_id][1].append(np.nan if spl is None else spl)
+        return {k: (np.array(f), np.array(s)) for k, (f, s) in levels.items()}
+
+    def import_folders(self, root):
+        """
+        Back-fills the catalog from existing experiment folders under root.
+
+        Any folder holding a binary result set or noise_isolated_thirdoct.csv is imported.
+        Settings come from run_metadata.json when present; for older folders the air speed
+        is taken as the median of any fan_speed_record_*.csv and the save time from the file.
+
+        :return: Number of runs imported
+        """
+        from result_store import RESULTS_DIR, has_results, load_results
+
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            if os.path.basename(dirpath) == RESULTS_DIR:
+                continue
+            if not has_results(dirpath) and THIRDOCT_FILE not in filenames:
+                continue
+            try:
+                results = load_results(dirpath)
+                band_freqs, band_spl = results["band_freqs"], results["band_spl"]
+            except Exception as e:
+                print(f"Skipping {dirpath}: {e}")
+                continue
+
+            metadata = results["metadata"]
+            if not metadata:
+                # Save time of whichever result file the run has (binary set or legacy CSV)
+                saved = os.path.join(dirpath, RESULTS_DIR) if has_results(dirpath) else os.path.join(dirpath, THIRDOCT_FILE)
+                metadata = {
+                    "saved_at": datetime.datetime.fromtimestamp(os.path.getmtime(saved)).isoformat(timespec="seconds"),
+                    "air_speed": _recorded_air_speed(dirpath),
+                }
+            self.add_run(dirpath, metadata, band_freqs, band_spl, commit=False)
+            count += 1
+        self.conn.commit()
+        return count
+
+
+def _recorded_air_speed(folder):
+    """Median air speed over any fan speed recordings in a folder, or None."""
+    speeds = []
+    for path in glob.glob(os.path.join(folder, "fan_speed_record_*.csv")):
+        try:
+            data = np.loadtxt(path, delimiter=",", skiprows=1, ndmin=2)
+            speeds.append(data[:, 1])
+        except Exception:
+            continue
+    if not speeds or not any(len(s) for s in speeds):
+        return None
+    return float(np.median(np.concatenate(speeds)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query or back-fill the experiment catalog.")
+    parser.add_argument("--db", default=CATALOG_FILE, help="Catalog file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="Back-fill the catalog from experiment folders")
+    imp.add_argument("root", help="Folder containing experiment folders")
+
+    q = sub.add_parser("query", help="List runs matching the given conditions")
+    q.add_argument("--speed", type=float, help="Air speed (m/s)")
+    q.add_argument("--tolerance", type=float, default=0.25, help="Air speed tolerance (m/s)")
+    q.add_argument("--pwm", type=float, help="Fan PWM")
+    q.add_argument("--name", help="Substring of the experiment name")
+    q.add_argument("--min-spl", type=float, help="Minimum overall SPL (dB; two-mic runs only)")
+    q.add_argument("--max-spl", type=float, help="Maximum overall SPL (dB; two-mic runs only)")
+    q.add_argument("--band", type=float, help="Also print the level of this 1/3 octave band (Hz)")
+    q.add_argument("--isolation", choices=(ISOLATION_DIFFERENCE, ISOLATION_COHERENT),
+                   help="Only single-mic (difference) or two-mic (coherent) runs")
+    args = parser.parse_args(argv)
+
+    catalog = ExperimentCatalog(args.db)
+    t0 = time.perf_counter()
+    if args.command == "import":
+        count = catalog.import_folders(args.root)
+        print(f"Imported {count} runs in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    else:
+        runs = catalog.query(air_speed=args.speed, speed_tolerance=args.tolerance, pwm=args.pwm,
+                             min_overall_spl=args.min_spl, max_overall_spl=args.max_spl, name_like=args.name,
+                             isolation=args.isolation)
+        bands = catalog.band_levels([r["id"] for r in runs], args.band) if args.band else {}
+        elapsed = (time.perf_counter() - t0) * 1000
+
+        for r in runs:
+            line = (f"{r['saved_at'] or '':19}  {r['name']:30}  speed={_fmt(r['air_speed'])}  "
+                    f"pwm={_fmt(r['pwm'], '.0f')}  overall={_fmt(r['overall_spl'])} dB  ({r['isolation']})")
+            if r["id"] in bands:
+                line += f"  {args.band:g} Hz={_fmt(bands[r['id']][1][0])} dB"
+            print(line)
+        print(f"{len(runs)} runs ({elapsed:.1f} ms)")
+    catalog.close()
+
+
+def _fmt(value, spec=".2f"):
+    return "-" if value is None or (isinstance(value, float) and np.isnan(value)) else format(value, spec)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import serial
 import threading
 import time
 
+from timeline import now
+
 class ComPortHandler:
     def __init__(self, port='COM3', baudrate=9600, timeout=1, callback=None):
         """
@@ -18,6 +20,7 @@ class ComPortHandler:
         self.callback = callback
         self.ser = None
         self.running = False
+        self.last_line_time = None  # Common-clock time the last line was read (see timeline.py)
 
     def open(self):
         """Open the serial port and start the reading thread."""
@@ -45,6 +48,18 @@ class ComPortHandler:
         else:
             print("Serial port is not open. Cannot send data.")
 
+    def send_pwm(self, pwm):
+        """Sends a direct PWM command (open loop, prefix 'MP')."""
+        if self.ser and self.ser.is_open:
+            try:
+                command = f"MP{int(pwm)}\n"
+                self.ser.write(command.encode('utf-8'))
+                print(f"Sent PWM signal: {command.strip()}")
+            except Exception as e:
+                print("Error sending PWM signal:", e)
+        else:
+            print("Serial port is not open. Cannot send PWM signal.")
+
     def read_loop(self):
         """
         Continuously reads the serial port for data.
@@ -55,6 +70,7 @@ class ComPortHandler:
             try:
                 line = self.ser.readline().decode('utf-8').strip()
                 if line:
+                    self.last_line_time = now()
                     last_received = time.time()
                     if self.callback:
                         self.callback(line)
@@ -0,0 +1,257 @@
+"""
+Multi-run comparison: overlays and energetic differences of saved spectra.
+
+Runs are experiment folders with saved results (see result_store). Their arrays are
+decoded into an LRU cache bounded by bytes, so flicking back and forth through dozens
+of runs reads each one from disk once, and a background thread loads the runs either
+side of the current view before they are scrolled to. Lines are reduced for drawing
+with the log display reducer, and the reduced lines are cached too, keyed by the axis
+width and x-range, so redrawing an unchanged view costs no array work at all.
+
+The energetic difference of a run against a reference removes the reference's power
+from the run's, 10*log10(10^(L/10) - 10^(Lref/10)): what the change between the runs
+added. Bins where the run is not louder than the reference have no difference (nan).
+Two-mic runs (coherent output power, power-averaged) are labelled as such and are
+only differenced against other two-mic runs, and single-mic runs against single-mic
+ones (see catalog.ISOLATION_*).
+
+Usage:
+    python compare_runs.py <experiment folders> [--reference N] [--spectrum isolated] [-o compare.png]
+"""
+import argparse
+import os
+import queue
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from catalog import ISOLATION_COHERENT, isolation_mode
+from display_reducer import display_reducer
+from result_store import has_results, load_results, CSV_FILES
+
+DEFAULT_CACHE_BYTES = 256 * 1024**2
+PREFETCH_NEIGHBOURS = 4   # Runs loaded ahead either side of the visible ones
+MAX_CACHED_LINES = 512
+MAX_LEGEND_RUNS = 12
+VISIBLE_RUNS = 8          # Runs drawn at once in the comparison window
+SPECTRA = ("isolated", "operation", "background")
+RESULT_NAMES = ("freqs", "band_freqs", "band_spl") + SPECTRA
+
+
+def energetic_difference(spl, reference_spl):
+    """Level of the power a run has above the reference (dB); nan where it has none."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        power = 10 ** (np.asarray(spl, dtype=np.float64) / 10) - 10 ** (np.asarray(reference_spl, dtype=np.float64) / 10)
+        return np.where(power > 0, 10 * np.log10(power), np.nan)
+
+
+def find_runs(folder):
+    """Experiment folders with saved results: the folder itself, or its sub-folders in name order."""
+    has_run = lambda path: has_results(path) or any(os.path.isfile(os.path.join(path, f)) for f in CSV_FILES.values())
+    if has_run(folder):
+        return [folder]
+    runs = [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+    return [run for run in runs if os.path.isdir(run) and has_run(run)]
+
+
+class RunCache:
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, names=RESULT_NAMES):
+        """
+        LRU cache of decoded result arrays, bounded by their total size.
+
+        :param max_bytes: Memory limit for cached arrays (the most recent run is always kept)
+        :param names: Result arrays loaded per run
+        """
+        self.max_bytes = max_bytes
+        self.names = list(names)
+        self.bytes = 0
+        self.hits = self.misses = 0
+        self._runs = OrderedDict()  # folder -> (results dict, bytes)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def __contains__(self, folder):
+        with self._lock:
+            return folder in self._runs
+
+    def _load(self, folder):
+        results = load_results(folder, self.names, mmap=False)
+        size = sum(value.nbytes for value in results.values() if isinstance(value, np.ndarray))
+        with self._lock:
+            if folder not in self._runs:
+                self._runs[folder] = (results, size)
+                self.bytes += size
+            self._runs.move_to_end(folder)
+            while self.bytes > self.max_bytes and len(self._runs) > 1:
+                _, (_, evicted) = self._runs.popitem(last=False)
+                self.bytes -= evicted
+            return self._runs[folder][0]
+
+    def get(self, folder):
+        """A run's results dict (arrays plus "metadata"), loaded on a miss."""
+        with self._lock:
+            cached = self._runs.get(folder)
+            if cached is not None:
+                self._runs.move_to_end(folder)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+        return self._load(folder)
+
+    def prefetch(self, folders):
+        """Queues runs for loading on the background thread (already cached runs are skipped)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._thread.start()
+        for folder in folders:
+            self._queue.put(folder)
+
+    def _prefetch_loop(self):
+        while True:
+            folder = self._queue.get()
+            if folder is None:
+                return
+            if folder in self:
+                continue
+            try:
+                self._load(folder)
+            except (OSError, ValueError) as e:
+                print(f"Prefetch of {folder} failed: {e}")
+
+    def close(self):
+        """Stops the prefetch thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+
+class RunComparison:
+    def __init__(self, folders, cache=None, reducer=display_reducer):
+        """
+        :param folders: Runs to compare, in display order
+        :param cache: RunCache shared between views (a new one by default)
+        """
+        self.folders = list(folders)
+        self.cache = cache or RunCache()
+        self.reducer = reducer
+        self._lines = OrderedDict()
+
+    def name(self, folder):
+        metadata = self.cache.get(folder).get("metadata") or {}
+        speed = metadata.get("air_speed")
+        name = metadata.get("name") or os.path.basename(os.path.normpath(folder))
+        if isolation_mode(metadata) == ISOLATION_COHERENT:
+            name += " [two-mic]"
+        return name + (f" ({speed:g} m/s)" if speed is not None else "")
+
+    def isolation(self, folder):
+        return isolation_mode(self.cache.get(folder).get("metadata"))
+
+    def visible(self, start, count):
+        """The runs shown at a scroll position; the runs either side are prefetched."""
+        start = min(max(start, 0), max(len(self.folders) - count, 0))
+        ahead = self.folders[start + count:start + count + PREFETCH_NEIGHBOURS]
+        behind = self.folders[max(start - PREFETCH_NEIGHBOURS, 0):start]
+        self.cache.prefetch(ahead + behind[::-1])
+        return self.folders[start:start + count]
+
+    def spectrum(self, folder, name, bands=False):
+        """freqs and dB levels of one saved spectrum ("isolated", ...), or band_freqs and band_spl."""
+        results = self.cache.get(folder)
+        if bands:
+            return results.get("band_freqs"), results.get("band_spl")
+        return results.get("freqs"), results.get(name)
+
+    def levels(self, folder, name, reference=None, bands=False):
+        """
+        A run's levels, or their energetic difference against a reference run.
+
+        The reference is interpolated onto the run's frequencies if their grids differ.
+        :return: freqs and levels, or (None, None) if the run lacks the spectrum or was
+                 isolated differently from the reference
+        """
+        freqs, spl = self.spectrum(folder, name, bands)
+        if freqs is None or spl is None or reference is None:
+            return freqs, spl
+        if self.isolation(folder) != self.isolation(reference):
+            return None, None
+        ref_freqs, ref_spl = self.spectrum(reference, name, bands)
+        if ref_freqs is None or ref_spl is None:
+            return None, None
+        if not np.array_equal(freqs, ref_freqs):
+            ref_spl = np.interp(freqs, ref_freqs, ref_spl, left=np.nan, right=np.nan)
+        return freqs, energetic_difference(spl, ref_spl)
+
+    def line(self, folder, name, reference, width_px, f_min, f_max):
+        """Display-reduced (x, y) of a run's spectrum for an axis view; cached per view."""
+        key = (folder, name, reference, int(width_px), float(f_min), float(f_max))
+        cached = self._lines.get(key)
+        if cached is not None:
+            self._lines.move_to_end(key)
+            return cached
+        freqs, spl = self.levels(folder, name, reference)
+        if freqs is None:
+            return None
+        # The envelope is taken over finite values, so nan gaps of a difference do not blank whole pixels
+        finite = np.where(np.isfinite(spl), spl, -np.inf)
+        x, y = self.reducer.reduce(freqs, finite, width_px, f_min, f_max)
+        cached = self._lines[key] = (x, np.where(np.isfinite(y), y, np.nan))
+        if len(self._lines) > MAX_CACHED_LINES:
+            self._lines.popitem(last=False)
+        return cached
+
+    def lines_for_axes(self, ax, folders, name, reference=None):
+        """Reduced lines of several runs for the current size and x-range of a matplotlib axis."""
+        width_px = max(int(ax.get_window_extent().width), 1)
+        f_min, f_max = ax.get_xlim()
+        return [(folder, self.line(folder, name, reference, width_px, f_min, f_max)) for folder in folders]
+
+
+def main():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    parser = argparse.ArgumentParser(description="Overlay or difference saved runs")
+    parser.add_argument("folders", nargs="+", help="Experiment folders, or folders of experiments")
+    parser.add_argument("--spectrum", choices=SPECTRA, default="isolated")
+    parser.add_argument("--reference", type=int, default=None,
+                        help="Index of the reference run; plots energetic differences against it")
+    parser.add_argument("-o", "--output", default="compare_runs.png")
+    args = parser.parse_args()
+
+    folders = [run for folder in args.folders for run in find_runs(folder)]
+    if not folders:
+        parser.error("No saved runs found.")
+    comparison = RunComparison(folders)
+    reference = folders[args.reference] if args.reference is not None else None
+
+    fig, (ax, band_ax) = plt.subplots(2, 1, figsize=(11, 8))
+    ax.set_xscale("log")
+    ax.set_xlim(20, max(comparison.spectrum(folder, args.spectrum)[0][-1] for folder in folders))
+    for folder, line in comparison.lines_for_axes(ax, folders, args.spectrum, reference):
+        if line is not None and folder != reference:
+            ax.plot(*line, linewidth=0.8, label=comparison.name(folder))
+        freqs, band = comparison.levels(folder, args.spectrum, reference, bands=True)
+        if freqs is not None and folder != reference:
+            band_ax.semilogx(freqs, band, marker="o", markersize=3, label=comparison.name(folder))
+    what = "Energetic difference" if reference else "SPL"
+    ax.set_title(f"{args.spectrum.capitalize()} FFT: {what}"
+                 + (f" vs. {comparison.name(reference)}" if reference else ""))
+    band_ax.set_title(f"Noise-isolated bands: {what}")
+    for axis in (ax, band_ax):
+        axis.set_xlabel("Frequency (Hz)")
+        axis.set_ylabel("dB")
+        axis.grid(True, which="both", alpha=0.3)
+        if len(folders) <= MAX_LEGEND_RUNS:
+            axis.legend(fontsize=7)
+    fig.tight_layout()
+    fig.savefig(args.output, dpi=120)
+    comparison.cache.close()
+    print(f"Compared {len(folders)} runs; saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
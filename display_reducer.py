@@ -0,0 +1,117 @@
+"""
+Decimation of spectra for drawing on log-frequency axes.
+
+On a log-x axis most of the high-frequency FFT bins land on the same few pixels, so
+each spectrum is reduced to one max/min pair per pixel-wide log-spaced bin before it
+is handed to matplotlib. The envelope keeps narrow peaks visible. Lines drawn through
+set_line_data keep their full-resolution spectrum and are reduced again whenever the
+axis is zoomed, panned or resized, so every other write to such a line (clearing it,
+or data drawn as is) goes through clear_line or set_unreduced_data.
+"""
+import weakref
+from collections import OrderedDict
+import numpy as np
+
+
+class LogDisplayReducer:
+    def __init__(self, max_cached=32):
+        """
+        :param max_cached: Number of index maps kept (one per axis width / x-range / frequency grid)
+        """
+        self.max_cached = max_cached
+        self._maps = OrderedDict()
+        self._spectra = weakref.WeakKeyDictionary()  # line -> full-resolution (freqs, spectrum)
+        self._watched = weakref.WeakSet()            # axes with view-change callbacks connected
+
+    def index_map(self, freqs, width_px, f_min, f_max):
+        """
+        Returns (starts, x) for np.maximum.reduceat: the first bin of every non-empty
+        pixel-wide log bin between f_min and f_max, and the x position of each group.
+        Maps are cached per (width, x-range, frequency grid).
+        """
+        freqs = np.asarray(freqs)
+        key = (int(width_px), float(f_min), float(f_max), len(freqs), float(freqs[0]), float(freqs[-1]))
+        cached = self._maps.get(key)
+        if cached is not None:
+            self._maps.move_to_end(key)
+            return cached
+
+        f_min = max(f_min, freqs[freqs > 0][0])
+        f_max = min(f_max, freqs[-1])
+        edges = np.geomspace(f_min, f_max, int(width_px) + 1)
+        # Keep one bin either side of the view so the line reaches the axis edges
+        first = max(np.searchsorted(freqs, f_min) - 1, 0)
+        last = min(np.searchsorted(freqs, f_max, side="right") + 1, len(freqs))
+        starts = np.unique(np.concatenate((
+            [first], np.clip(np.searchsorted(freqs, edges[1:-1]), first, last - 1))))
+        stops = np.append(starts[1:], last)
+        # Place each group at the geometric centre of the bins it covers
+        x = np.sqrt(np.maximum(freqs[starts], f_min / 2) * freqs[stops - 1])
+
+        cached = (starts, stops, x)
+        self._maps[key] = cached
+        if len(self._maps) > self.max_cached:
+            self._maps.popitem(last=False)
+        return cached
+
+    def reduce(self, freqs, spectra, width_px, f_min, f_max):
+        """
+        Reduces one spectrum (bins,) or many (runs, bins) to a max/min envelope.
+
+        :return: x (points,) and y (points,) or (runs, points), with the max and min of
+                 every pixel bin interleaved so a single line draws the envelope
+        """
+        starts, stops, x = self.index_map(freqs, width_px, f_min, f_max)
+        spectra = np.asarray(spectra)
+        view = spectra[..., starts[0] : stops[-1]]
+        offsets = starts - starts[0]
+        y_max = np.maximum.reduceat(view, offsets, axis=-1)
+        y_min = np.minimum.reduceat(view, offsets, axis=-1)
+
+        y = np.stack((y_max, y_min), axis=-1).reshape(spectra.shape[:-1] + (-1,))
+        return np.repeat(x, 2), y
+
+    def reduce_for_axes(self, ax, freqs, spectra):
+        """Reduces spectra to the current pixel width and x-range of a matplotlib axis."""
+        width_px = max(int(ax.get_window_extent().width), 1)
+        f_min, f_max = ax.get_xlim()
+        return self.reduce(freqs, spectra, width_px, f_min, f_max)
+
+    def set_line_data(self, line, freqs, spectrum):
+        """
+        Draws a spectrum on a line, reduced to its axis' current view.
+
+        The full-resolution spectrum is kept, so the line is reduced again on zoom, pan
+        and resize instead of showing the envelope of an old view.
+        """
+        self._spectra[line] = (np.asarray(freqs), np.asarray(spectrum))
+        self._watch(line.axes)
+        self._reduce_line(line)
+
+    def set_unreduced_data(self, line, x, y):
+        """Draws data on a line as given; the line is no longer reduced on view changes."""
+        self._spectra.pop(line, None)
+        line.set_data(x, y)
+
+    def clear_line(self, line):
+        """Empties a line and forgets its spectrum, so a later view change leaves it empty."""
+        self.set_unreduced_data(line, [], [])
+
+    def _reduce_line(self, line):
+        freqs, spectrum = self._spectra[line]
+        line.set_data(*self.reduce_for_axes(line.axes, freqs, spectrum))
+
+    def _refresh_axes(self, ax):
+        for line in ax.get_lines():
+            if line in self._spectra:
+                self._reduce_line(line)
+
+    def _watch(self, ax):
+        if ax in self._watched:
+            return
+        self._watched.add(ax)
+        ax.callbacks.connect("xlim_changed", self._refresh_axes)
+        ax.figure.canvas.mpl_connect("resize_event", lambda event: self._refresh_axes(ax))
+
+
+display_reducer = LogDisplayReducer()
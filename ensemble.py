@@ -0,0 +1,105 @@
+"""
+Ensemble averaging of repeated takes of one test condition.
+
+Each take's spectrum and fractional-octave (default 1/3) band levels are folded into running Welford
+mean/variance accumulators in the power domain, so memory stays O(bins) however many
+takes are recorded. Mean levels, standard errors and confidence intervals are reported
+back in dB.
+"""
+import numpy as np
+
+from live_spectrogram import compute_fractional_octave_band_spl
+
+DB_LOG_SLOPE = 10 / np.log(10)        # dL/dp = DB_LOG_SLOPE / p for L = 10*log10(p)
+CI_Z = 1.96                           # 95% confidence interval
+CI_TOLERANCE_DB = 0.5                 # Band CI half-width at which the ensemble counts as converged
+
+
+class WelfordAccumulator:
+    def __init__(self):
+        """Running per-element mean and variance of power values."""
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def add(self, levels_db):
+        """Adds one take given as dB levels."""
+        power = 10 ** (np.asarray(levels_db, dtype=np.float64) / 10)
+        if self.mean is None:
+            self.mean = np.zeros_like(power)
+            self.m2 = np.zeros_like(power)
+        self.count += 1
+        delta = power - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (power - self.mean)
+
+    def merge(self, other):
+        """Folds another accumulator in (Chan et al. parallel update)."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean.copy(), other.m2.copy()
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+
+    def variance(self):
+        """Sample variance of the power per element (nan with fewer than two takes)."""
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.count - 1)
+
+    def mean_db(self):
+        with np.errstate(divide="ignore"):
+            return 10 * np.log10(self.mean)
+
+    def stderr_db(self):
+        """Standard error of the mean level in dB (first-order propagation from power)."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return DB_LOG_SLOPE * np.sqrt(self.variance() / self.count) / self.mean
+
+
+class TakeEnsemble:
+    def __init__(self, band_fraction=3):
+        """
+        Spectrum and band accumulators for one kind of take (background or operation).
+
+        :param band_fraction: Bands per octave for the band accumulator (3 = 1/3 octave)
+        """
+        self.band_fraction = band_fraction
+        self.spectrum = WelfordAccumulator()
+        self.bands = WelfordAccumulator()
+        self.freqs = None
+        self.center_freqs = None
+
+    @property
+    def count(self):
+        return self.spectrum.count
+
+    def add(self, freqs, spl_db):
+        """Adds one take's averaged spectrum (dB SPL)."""
+        if self.freqs is not None and len(freqs) != len(self.freqs):
+            raise ValueError("Take has a different frequency grid from the rest of the ensemble.")
+        self.freqs = freqs
+        self.center_freqs, band_spl = compute_fractional_octave_band_spl(freqs, spl_db, self.band_fraction)
+        self.spectrum.add(spl_db)
+        self.bands.add(band_spl)
+
+    def band_ci_db(self, z=CI_Z):
+        """Widest confidence-interval half-width over the non-empty bands (dB), or inf with < 2 takes."""
+        if self.count < 2:
+            return np.inf
+        ci = z * self.bands.stderr_db()
+        ci = ci[np.isfinite(ci)]
+        return float(ci.max()) if len(ci) else np.inf
+
+    def converged(self, tolerance_db=CI_TOLERANCE_DB):
+        return self.band_ci_db() <= tolerance_db
+
+
+def combined_stderr_db(*stderrs):
+    """Standard error of a sum/difference of independent dB levels."""
+    return np.sqrt(sum(np.asarray(s) ** 2 for s in stderrs))
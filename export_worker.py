@@ -0,0 +1,161 @@
+"""
+Background export of analysis results.
+
+Saving used to run on the Tk main thread: CSV writes, the catalog update and a 300-dpi
+savefig of the live figure froze the UI (and the telemetry plots) for seconds. Jobs
+are now queued to a single worker thread that runs them in order. The arrays are
+snapshotted when the job is submitted, and the report figure is drawn on its own Agg
+Figure, so the live figure is never touched off the UI thread. Files are written to a
+temporary name in the target folder and renamed into place, so an interrupted export
+never leaves a truncated file behind. Progress is reported through a status callback
+instead of a modal dialog.
+"""
+import os
+import queue
+import threading
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from display_reducer import LogDisplayReducer
+
+REPORT_DPI = 300
+REPORT_POINTS = 2000  # Log-spaced max/min bins per spectrum in the report
+
+_reducer = LogDisplayReducer()
+
+
+def atomic_write(path, write):
+    """
+    Calls write(tmp_path) and renames the temporary file to path.
+
+    The temporary name keeps the extension, so writers that infer the format from it
+    (savefig, np.save) behave the same.
+    """
+    folder, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    tmp_path = os.path.join(folder, f".{stem}.{os.getpid()}.{threading.get_ident()}.tmp{ext}")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _style_axis(ax, title, xlabel, ylabel):
+    ax.set_facecolor("#000000")
+    ax.set_title(title, color="white")
+    ax.set_xlabel(xlabel, color="white")
+    ax.set_ylabel(ylabel, color="white")
+    ax.tick_params(axis="both", which="both", colors="white")
+    for spine in ax.spines.values():
+        spine.set_color("white")
+    ax.grid(True, which="both", ls="-", alpha=0.3)
+
+
+def render_report(path, freqs, spectra, band_freqs=None, band_spl=None, title=None,
+                  f_max=None, dpi=REPORT_DPI):
+    """
+    Draws the analysis report on a private Agg figure and saves it atomically.
+
+    Safe to call from any thread: no pyplot state or GUI canvas is used.
+
+    :param spectra: List of (title, spl, colour) for the spectrum panels
+    :param band_freqs: Band centre frequencies for the band-level panel (optional)
+    :param f_max: Upper frequency limit (defaults to the last bin)
+    """
+    freqs = np.asarray(freqs)
+    f_max = f_max or freqs[-1]
+    n_panels = len(spectra) + (band_spl is not None)
+    rows = (n_panels + 1) // 2
+    report = Figure(figsize=(12, 4 * rows), facecolor="#000000", constrained_layout=True)
+    FigureCanvasAgg(report)
+    axes = report.subplots(rows, 2, squeeze=False).ravel()
+
+    for ax, (name, spl, colour) in zip(axes, spectra):
+        x, y = _reducer.reduce(freqs, np.asarray(spl, dtype=np.float64), REPORT_POINTS, 20, f_max)
+        ax.plot(x, y, color=colour, lw=0.8)
+        ax.set_xscale("log")
+        ax.set_xlim([20, f_max])
+        ax.set_ylim([-50, 120])
+        ax.axvspan(1, 1905, facecolor="gray", alpha=0.3)
+        _style_axis(ax, name, "Frequency (Hz)", "SPL (dB)")
+
+    if band_spl is not None:
+        ax = axes[len(spectra)]
+        band_freqs = np.asarray(band_freqs)
+        ax.bar(np.arange(len(band_freqs)), band_spl, color="gold")
+        step = max(len(band_freqs) // 10, 1)
+        ax.set_xticks(np.arange(0, len(band_freqs), step))
+        ax.set_xticklabels([f"{f:g}" for f in band_freqs[::step]], rotation=45)
+        _style_axis(ax, "Noise-Isolated Band Levels", "Band Centre Frequency (Hz)", "SPL (dB)")
+
+    for ax in axes[n_panels:]:
+        ax.axis("off")
+    if title:
+        report.suptitle(title, color="white")
+    atomic_write(path, lambda tmp: report.savefig(tmp, dpi=dpi, facecolor=report.get_facecolor()))
+
+
+class ExportWorker:
+    def __init__(self, on_status=None):
+        """
+        :param on_status: Called from the worker thread with a status text after each job
+                          (marshal it to the GUI thread, e.g. with root.after)
+        """
+        self.on_status = on_status
+        self.jobs = queue.Queue()
+        self.pending = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name, func, *args, **kwargs):
+        """
+        Queues func(*args, **kwargs); returns immediately.
+
+        Pass copies of any arrays the caller may change afterwards (see snapshot).
+        """
+        with self._lock:
+            self.pending += 1
+        self.jobs.put((name, func, args, kwargs))
+        self._report(f"Saving {name}...")
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            name, func, args, kwargs = job
+            try:
+                func(*args, **kwargs)
+                message = f"Saved {name}"
+            except Exception as e:
+                print(f"Export of {name} failed:", e)
+                self.errors.append((name, e))
+                message = f"Export of {name} failed: {e}"
+            with self._lock:
+                self.pending -= 1
+            if self.pending:
+                message += f" ({self.pending} pending)"
+            self._report(message)
+            self.jobs.task_done()
+
+    def _report(self, message):
+        if self.on_status is not None:
+            self.on_status(message)
+
+    def wait(self, timeout=None):
+        """Blocks until the queued jobs are done (or timeout seconds passed); True if all finished."""
+        done = threading.Event()
+        threading.Thread(target=lambda: (self.jobs.join(), done.set()), daemon=True).start()
+        return done.wait(timeout)
+
+
+def snapshot(*arrays):
+    """Copies arrays for a queued job (None is passed through)."""
+    return tuple(None if a is None else np.array(a, copy=True) for a in arrays)
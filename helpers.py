@@ -1,22 +1,154 @@
 # helpers.py
+import heapq
+import threading
+from collections import deque
 import tkinter as tk
 
+CATEGORIES = ("AD", "PWM", "Other")
+HISTORY_LINES = 20000  # Lines kept per category
+DISPLAY_LINES = 1000   # Lines kept in the text widget
+FLUSH_MS = 100         # Interval between batched inserts
+
+
+def line_category(line):
+    """Filter category of a serial line by its prefix."""
+    if line.startswith("AD"):
+        return "AD"
+    if line.startswith("PWM"):
+        return "PWM"
+    return "Other"
+
+
 class SerialDebugWindow(tk.Toplevel):
+    """
+    Serial console backed by a bounded history.
+
+    append_data only stores the line (it is safe to call from the serial thread); a timer
+    inserts everything new in one batch every FLUSH_MS. Each category keeps its own ring of
+    (sequence number, line), so filtering or resuming rebuilds the view from those indexes
+    instead of rescanning the text, and the text widget never holds more than DISPLAY_LINES.
+    """
     def __init__(self, master=None):
         super().__init__(master)
         self.title("Serial Debug Monitor")
         self.geometry("600x400")
+
+        self.history = {category: deque(maxlen=HISTORY_LINES) for category in CATEGORIES}
+        self.lock = threading.Lock()
+        self.seq = 0            # Sequence number of the last stored line
+        self.shown_seq = 0      # Sequence number of the last line inserted into the widget
+        self.shown_lines = 0
+        self.paused = False
+        self.paused_seq = 0     # Last line shown when the view was paused
+        self.closed = False
+
+        controls = tk.Frame(self)
+        controls.pack(fill='x')
+        self.pause_button = tk.Button(controls, text="Pause", width=8, command=self.toggle_pause)
+        self.pause_button.pack(side='left', padx=2, pady=2)
+        tk.Button(controls, text="Clear", width=8, command=self.clear).pack(side='left', padx=2, pady=2)
+        self.filter_vars = {}
+        for category in CATEGORIES:
+            var = tk.BooleanVar(value=True)
+            tk.Checkbutton(controls, text=category, variable=var, command=self.rebuild).pack(side='left')
+            self.filter_vars[category] = var
+        self.status_label = tk.Label(controls, text="")
+        self.status_label.pack(side='right', padx=4)
+
         # Create a text widget to display serial data
         self.text_area = tk.Text(self, state='disabled')
         self.text_area.pack(expand=True, fill='both')
-    
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.after(FLUSH_MS, self.flush)
+
     def append_data(self, data: str):
-        """Append new serial data to the display."""
+        """Store a serial line; it is shown at the next flush."""
+        with self.lock:
+            self.seq += 1
+            self.history[line_category(data)].append((self.seq, data))
+
+    def _selected_since(self, since_seq, limit, until_seq=None):
+        """Newest lines of the selected categories with since_seq < sequence number <= until_seq (oldest first)."""
+        selected = [c for c in CATEGORIES if self.filter_vars[c].get()]
+        tails = []
+        with self.lock:
+            for category in selected:
+                tail = []
+                for seq, line in reversed(self.history[category]):
+                    if seq <= since_seq or len(tail) >= limit:
+                        break
+                    if until_seq is None or seq <= until_seq:
+                        tail.append((seq, line))
+                tail.reverse()
+                tails.append(tail)
+            last_seq = self.seq
+        lines = [line for _, line in heapq.merge(*tails)][-limit:]
+        return lines, last_seq
+
+    def flush(self):
+        """Timer: insert the lines received since the last flush in one batch."""
+        if self.closed:
+            return
+        if not self.paused and self.seq != self.shown_seq:
+            lines, self.shown_seq = self._selected_since(self.shown_seq, DISPLAY_LINES)
+            self._insert(lines)
+        self._update_status()
+        self.after(FLUSH_MS, self.flush)
+
+    def _insert(self, lines):
+        if not lines:
+            return
         self.text_area.config(state='normal')
-        self.text_area.insert(tk.END, data + "\n")
+        self.text_area.insert(tk.END, "\n".join(lines) + "\n")
+        self.shown_lines += len(lines)
+        excess = self.shown_lines - DISPLAY_LINES
+        if excess > 0:
+            self.text_area.delete("1.0", f"{excess + 1}.0")
+            self.shown_lines = DISPLAY_LINES
         self.text_area.config(state='disabled')
         self.text_area.see(tk.END)
 
+    def rebuild(self):
+        """Redraw the view from the history (after a filter change or on resume)."""
+        self.text_area.config(state='normal')
+        self.text_area.delete("1.0", tk.END)
+        self.text_area.config(state='disabled')
+        self.shown_lines = 0
+        if self.paused:
+            # Keep the frozen view, re-filtered
+            lines, _ = self._selected_since(0, DISPLAY_LINES, self.paused_seq)
+        else:
+            lines, self.shown_seq = self._selected_since(0, DISPLAY_LINES)
+        self._insert(lines)
+        self._update_status()
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+        self.paused_seq = self.shown_seq
+        self.pause_button.config(text="Resume" if self.paused else "Pause")
+        if not self.paused:
+            self.rebuild()
+        self._update_status()
+
+    def clear(self):
+        with self.lock:
+            for lines in self.history.values():
+                lines.clear()
+        self.rebuild()
+
+    def _update_status(self):
+        with self.lock:
+            stored = sum(len(lines) for lines in self.history.values())
+        text = f"{stored} lines"
+        if self.paused:
+            text += f" (paused, {self.seq - self.paused_seq} new)"
+        self.status_label.config(text=text)
+
+    def close(self):
+        self.closed = True
+        self.destroy()
+
 def show_serial_debug_window(existing_window=None):
     """
     Create and show the serial debug window.
@@ -0,0 +1,127 @@
+"""
+Statistical levels (L10/L50/L90) from fixed-size level histograms.
+
+Ln is the level exceeded n % of the time: L90 follows the steady floor (tunnel
+background) and L10 the intermittent peaks, which an averaged spectrum blends
+together. Levels are counted into histograms with a fixed dB step, so memory is set by
+the dB range and the number of channels, not by how long the capture runs, and
+histograms of repeated takes merge by adding counts.
+
+SpectrumStatistics keeps one histogram per FFT bin and per fractional-octave band and
+is fed the STFT frames of each take (the band level of a frame is the mean dB of its
+bins, as in compute_fractional_octave_band_spl).
+"""
+import numpy as np
+
+from live_spectrogram import band_center_frequencies
+
+HISTOGRAM_RANGE_DB = (-20.0, 160.0)
+HISTOGRAM_STEP_DB = 0.1
+SPECTRUM_RANGE_DB = (-40.0, 160.0)  # Per-bin histograms use a coarser step to stay small
+SPECTRUM_STEP_DB = 0.5
+LN_PERCENTS = (10, 50, 90)
+
+
+class LevelHistogram:
+    def __init__(self, low_db=HISTOGRAM_RANGE_DB[0], high_db=HISTOGRAM_RANGE_DB[1], step_db=HISTOGRAM_STEP_DB,
+                 channels=None, dtype=np.int64):
+        """
+        Fixed-memory histogram of levels for percentile (Ln) statistics.
+
+        :param channels: Number of independent histograms (e.g. FFT bins), or None for one
+        :param dtype: Count type (np.uint32 halves the memory of large per-bin histograms)
+        """
+        self.low_db = low_db
+        self.high_db = high_db
+        self.step_db = step_db
+        levels = int(round((high_db - low_db) / step_db))
+        self.counts = np.zeros(levels if channels is None else (channels, levels), dtype=dtype)
+
+    def add(self, levels_db):
+        """
+        Counts levels: scalars/1-D arrays for a single histogram, (frames, channels) otherwise.
+        """
+        levels = self.counts.shape[-1]
+        idx = np.clip(((np.asarray(levels_db, dtype=np.float64) - self.low_db) / self.step_db).astype(np.int64),
+                      0, levels - 1)
+        if self.counts.ndim == 1:
+            self.counts += np.bincount(np.ravel(idx), minlength=levels).astype(self.counts.dtype)
+            return
+        channels = self.counts.shape[0]
+        idx = idx.reshape(-1, channels) + np.arange(channels) * levels
+        self.counts += np.bincount(idx.ravel(), minlength=channels * levels).reshape(channels, levels).astype(self.counts.dtype)
+
+    def merge(self, other):
+        """Adds the counts of a histogram with the same range, step and channels."""
+        if (other.low_db, other.high_db, other.step_db, other.counts.shape) != \
+                (self.low_db, self.high_db, self.step_db, self.counts.shape):
+            raise ValueError("Level histograms have different layouts.")
+        self.counts += other.counts
+
+    def exceeded(self, percents):
+        """
+        Levels exceeded for the given percentages of the time (L10, L50, L90, ...).
+
+        :return: (percents,) levels in dB, or (percents, channels); nan where a histogram is empty
+        """
+        percents = np.atleast_1d(np.asarray(percents, dtype=np.float64))
+        counts = self.counts if self.counts.ndim == 2 else self.counts[None, :]
+        total = counts.sum(axis=-1, dtype=np.float64)
+        cum = np.cumsum(counts, axis=-1, dtype=np.float64)
+        targets = (1 - percents[:, None] / 100.0) * total  # (percents, channels)
+        # First level whose cumulative count reaches the target (searchsorted per channel)
+        idx = np.stack([np.sum(cum < target[:, None], axis=-1) for target in targets])
+        levels = self.low_db + (np.minimum(idx, counts.shape[-1] - 1) + 0.5) * self.step_db
+        levels = np.where(total > 0, levels, np.nan)
+        return levels if self.counts.ndim == 2 else levels[:, 0]
+
+
+class SpectrumStatistics:
+    def __init__(self, freqs, band_fraction=3):
+        """
+        Per-bin and per-band level histograms of a stream of spectrum frames.
+
+        :param freqs: FFT bin frequencies of the frames
+        :param band_fraction: Bands per octave for the band statistics
+        """
+        self.freqs = np.asarray(freqs)
+        self.band_fraction = band_fraction
+        self.band_freqs = band_center_frequencies(band_fraction)
+        half_band = 2 ** (1 / (2 * band_fraction))
+        self._lo = np.searchsorted(self.freqs, self.band_freqs / half_band, side="left")
+        self._hi = np.searchsorted(self.freqs, self.band_freqs * half_band, side="right")
+        self._band_valid = self._hi > self._lo
+        self.bins = LevelHistogram(*SPECTRUM_RANGE_DB, SPECTRUM_STEP_DB, channels=len(self.freqs), dtype=np.uint32)
+        self.bands = LevelHistogram(*SPECTRUM_RANGE_DB, SPECTRUM_STEP_DB, channels=len(self.band_freqs),
+                                    dtype=np.uint32)
+        self.frames = 0
+
+    def add(self, frames_db):
+        """Counts a take's (frames, bins) dB spectra."""
+        frames_db = np.atleast_2d(frames_db)
+        self.bins.add(frames_db)
+        # Mean dB of the bins in each band, from a running sum along the bins
+        cumulative = np.zeros((len(frames_db), len(self.freqs) + 1))
+        np.cumsum(frames_db, axis=1, out=cumulative[:, 1:])
+        width = np.maximum(self._hi - self._lo, 1)
+        band_db = (cumulative[:, self._hi] - cumulative[:, self._lo]) / width
+        self.bands.add(np.where(self._band_valid, band_db, SPECTRUM_RANGE_DB[0]))
+        self.frames += len(frames_db)
+
+    def merge(self, other):
+        """Adds the counts of statistics over the same bins and bands (e.g. another take)."""
+        if not np.array_equal(self.freqs, other.freqs) or self.band_fraction != other.band_fraction:
+            raise ValueError("Spectrum statistics have different bins or bands.")
+        self.bins.merge(other.bins)
+        self.bands.merge(other.bands)
+        self.frames += other.frames
+
+    def levels(self, percents=LN_PERCENTS):
+        """
+        Statistical spectra.
+
+        :return: ((percents, bins) levels, (percents, bands) band levels); bands without bins are nan
+        """
+        band_levels = self.bands.exceeded(percents)
+        band_levels[:, ~self._band_valid] = np.nan
+        return self.bins.exceeded(percents), band_levels
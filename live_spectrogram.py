@@ -3,6 +3,7 @@ import sounddevice as sd
 import time
 import matplotlib.pyplot as plt
 import queue
+from display_reducer import display_reducer
 
 # Constants
 FS = 96000  # Sampling rate (Hz)
@@ -13,6 +14,8 @@ ADC_PEAK_VOLTAGE = 5  # Assumed ADC peak voltage
 MIC_SENSITIVITY_V_PER_PA = 0.01  # 10 mV/Pa (-40 dB re 1V/Pa)
 P_REF = 20e-6  # Reference pressure for 0 dB SPL (Pa)
 CALIBRATION_OFFSET = 86 - 81.4
+PRECISION = "float64"  # DSP precision: "float64" or "float32" (single-precision path)
+CHUNK_SAMPLES = 2**20  # Samples windowed and transformed per batch (bounds the DSP working memory)
 
 # Ensure audio_queue exists
 audio_queue = queue.Queue()
@@ -26,92 +29,176 @@ def record_audio(duration=DURATION):
     audio_data = audio_data.flatten()  # Convert to 1D array
     return audio_data
 
-def update_plot(ax, line, data, title, fig):
-    """Updates the FFT graph in real-time."""
+def update_plot(ax, line, data, title, fig, freqs=None, autoscale=False):
+    """
+    Updates the FFT graph in real-time.
+
+    The spectrum is reduced to a max/min envelope per pixel-wide log-frequency bin
+    before drawing, so the line cost depends on the axis width rather than n_window.
+    The line is reduced again from the full spectrum when the view is zoomed, panned or resized.
+
+    :param freqs: Frequency bins of data (defaults to the rfft bins for len(data) at FS)
+    :param autoscale: Recompute the axis limits from the new data
+    """
     if len(data) == 0:
         return  # Prevent updates with empty data
     
     data = np.asarray(data)  # Ensure it's a proper NumPy array
     if data.ndim > 1:
         data = data.flatten()  # Flatten any nested structures
-    
-    line.set_ydata(data)  # Update plot with correct shape
-    ax.relim()  # Recompute limits
-    ax.autoscale_view()  # Adjust view dynamically
+    if freqs is None:
+        freqs = np.fft.rfftfreq(2 * (len(data) - 1), 1 / FS)
+
+    display_reducer.set_line_data(line, freqs, data)
+    if autoscale:
+        ax.relim()  # Recompute limits
+        ax.autoscale_view()  # Adjust view dynamically
     ax.set_title(title)
 
     fig.canvas.draw_idle()  # Update the figure
 
-def compute_fft(audio_data, n_window=4096, overlap=0.5):
+def full_scale(dtype):
+    """Sample value of digital full scale: 1.0 for float samples, 2**(bits-1) for integers."""
+    dtype = np.dtype(dtype)
+    return float(2 ** (8 * dtype.itemsize - 1)) if dtype.kind == "i" else 1.0
+
+def _fft_scaling(n_window, real_dtype, sample_full_scale=1.0):
     """
-    Computes FFT with 50% overlap and returns averaged frequency bins and dB SPL values.
+    Returns the scaled window and the log-domain constants shared by compute_fft and compute_stft.
+
+    The Hanning window has samples -> volts -> Pascals folded in (one fused scale, so
+    integer captures need no separate conversion pass), and normalisation plus RMS
+    window correction are applied in the log domain:
+    20*log10(|X| * norm / P_REF) == 10*log10(|X|^2) + db_offset
+    """
+    window = np.hanning(n_window)
+    pascals_per_count = ADC_PEAK_VOLTAGE / MIC_SENSITIVITY_V_PER_PA / sample_full_scale
+    scaled_window = (window * pascals_per_count).astype(real_dtype)
+    norm = (2.0 / n_window) / np.sqrt(np.mean(window**2))
+    db_offset = real_dtype.type(20 * np.log10(norm / P_REF) + CALIBRATION_OFFSET)
+    power_floor = real_dtype.type((P_REF / 1000 / norm) ** 2)
+    return scaled_window, db_offset, power_floor
+
+def _segment_frames(audio_data, n_window, overlap, real_dtype):
     """
+    Overlapping segments as a zero-copy view: (segments, [channels,] n_window).
+
+    Integer samples are left as they are; they are converted while windowing.
+    """
+    audio_data = np.asarray(audio_data)
+    if audio_data.dtype.kind != "i" and audio_data.dtype != real_dtype:
+        audio_data = audio_data.astype(real_dtype)
+
     step = int(n_window * (1 - overlap))  # Hop size (50% overlap)
     num_segments = (len(audio_data) - n_window) // step + 1  # Number of overlapping segments
+    if num_segments < 1:
+        raise ValueError("Audio shorter than one FFT window.")
 
-    fft_stack = []  # Store FFT results for averaging
+    frames = np.lib.stride_tricks.sliding_window_view(audio_data, n_window, axis=0)[::step]
+    return frames, step
 
-    for i in range(num_segments):
-        start = i * step
-        segment = audio_data[start : start + n_window]  # Extract segment
-        if len(segment) < n_window:
-            break  # Ignore incomplete segments
+def _chunk_segments(chunk_segments, frames):
+    """Segments per batch: as given, or as many as fit CHUNK_SAMPLES whatever the window length."""
+    if chunk_segments:
+        return chunk_segments
+    return max(CHUNK_SAMPLES // int(np.prod(frames.shape[1:])), 1)
 
-        # Apply Hanning window
-        window = np.hanning(n_window)
-        windowed_segment = segment * window
+def _frames_db(frames, scaled_window, db_offset, power_floor):
+    """dB SPL spectrum of each segment in a batch of frames."""
+    fft_data = np.fft.rfft(np.multiply(frames, scaled_window, dtype=scaled_window.dtype), axis=-1)
+    power = fft_data.real**2 + fft_data.imag**2
+    return 10 * np.log10(np.maximum(power, power_floor)) + db_offset
 
-        # Convert float to voltage
-        voltage_signal = windowed_segment * ADC_PEAK_VOLTAGE
+def compute_fft(audio_data, n_window=4096, overlap=0.5, precision=None, chunk_segments=None, fs=None):
+    """
+    Computes FFT with 50% overlap and returns averaged frequency bins and dB SPL values.
 
-        # Convert to Pascals
-        pressure_pa = voltage_signal / MIC_SENSITIVITY_V_PER_PA
+    The whole take is framed as a strided view (no copies), and the Hanning window,
+    ADC volts and mic sensitivity are folded into one scale vector so each frame costs
+    a single multiply. With precision="float32" the windowing, rfft (complex64) and
+    power/dB conversion stay in single precision; only the running sum of per-segment
+    dB values is kept in float64. Against the float64 path the averaged spectrum agrees
+    to within ~1e-4 dB (see benchmarks.py). Integer takes (int16, or int32 holding
+    24/32-bit samples) are converted to pressure by the same window multiply.
 
-        # Compute FFT
-        fft_data = np.fft.rfft(pressure_pa)
-        mag_pa = np.abs(fft_data) * (2.0 / n_window)  # Normalize
-        mag_pa /= np.sqrt(np.mean(window**2))  # RMS correction
+    :param audio_data: 1-D take, or 2-D (samples, channels) for multi-channel takes
+    :param n_window: FFT length
+    :param overlap: Fractional overlap between segments
+    :param precision: "float32" or "float64" (defaults to the module-level PRECISION)
+    :param chunk_segments: Segments transformed per batch, bounds the working memory
+                           (default: CHUNK_SAMPLES worth of samples)
+    :param fs: Sample rate of the take (defaults to FS)
+    :return: freqs and averaged dB SPL (bins,) or (bins, channels)
+    """
+    real_dtype = np.dtype(precision or PRECISION)
+    frames, _ = _segment_frames(audio_data, n_window, overlap, real_dtype)
+    scaled_window, db_offset, power_floor = _fft_scaling(n_window, real_dtype, full_scale(frames.dtype))
+    num_segments = len(frames)
+    chunk_segments = _chunk_segments(chunk_segments, frames)
 
-        # Convert to dB SPL
-        mag_db_spl = 20 * np.log10(np.maximum(mag_pa, P_REF / 1000) / P_REF)
-        mag_db_spl += CALIBRATION_OFFSET
-        fft_stack.append(mag_db_spl)
+    db_sum = None  # float64 accumulator across segments
+    for start in range(0, num_segments, chunk_segments):
+        mag_db_spl = _frames_db(frames[start : start + chunk_segments], scaled_window, db_offset, power_floor)
+        chunk_sum = mag_db_spl.sum(axis=0, dtype=np.float64)
+        db_sum = chunk_sum if db_sum is None else db_sum + chunk_sum
 
     # Average across all segments
-    avg_fft = np.mean(fft_stack, axis=0)
-    freqs = np.fft.rfftfreq(n_window, 1 / FS)
+    avg_fft = (db_sum / num_segments).astype(real_dtype)
+    if avg_fft.ndim > 1:
+        avg_fft = avg_fft.T  # (bins, channels)
+    freqs = np.fft.rfftfreq(n_window, 1 / (fs or FS))
 
     return freqs, avg_fft
 
-def save_fft_data(filename, freqs, mag_db_spl):
+def compute_stft(audio_data, n_window=4096, overlap=0.5, precision=None, fs=None):
+    """
+    Computes the per-segment dB SPL spectra (a spectrogram) with the same scaling as compute_fft.
+
+    :param audio_data: 1-D take
+    :return: freqs, segment centre times (s), and dB SPL frames (segments, bins)
+    """
+    real_dtype = np.dtype(precision or PRECISION)
+    frames, step = _segment_frames(audio_data, n_window, overlap, real_dtype)
+    scaled_window, db_offset, power_floor = _fft_scaling(n_window, real_dtype, full_scale(frames.dtype))
+
+    fs = fs or FS
+    frames_db = _frames_db(frames, scaled_window, db_offset, power_floor)
+    times = (np.arange(len(frames)) * step + n_window / 2) / fs
+    freqs = np.fft.rfftfreq(n_window, 1 / fs)
+
+    return freqs, times, frames_db
+
+def save_fft_data(filename, freqs, mag_db_spl, stderr=None):
     """
     Saves frequency bins and dB SPL values to a CSV file.
-    Columns: Frequency (Hz), SPL (dB)
+    Columns: Frequency (Hz), SPL (dB)[, Std Err (dB)]
     """
+    columns = (freqs, mag_db_spl) if stderr is None else (freqs, mag_db_spl, stderr)
+    header = "Frequency (Hz),SPL (dB)" if stderr is None else "Frequency (Hz),SPL (dB),Std Err (dB)"
     np.savetxt(
         filename,
-        np.column_stack((freqs, mag_db_spl)),
+        np.column_stack(columns),
         delimiter=",",
-        header="Frequency (Hz),SPL (dB)",
+        header=header,
         comments="",
         fmt="%.6f"
     )
-    print(f"FFT data saved to {filename}")
 
-def save_third_octave_data(filename, center_freqs, band_spl):
+def save_third_octave_data(filename, center_freqs, band_spl, stderr=None):
     """
     Saves 1/3 octave band center frequencies and SPL values to a CSV file.
-    Columns: Center Frequency (Hz), SPL (dB)
+    Columns: Center Frequency (Hz), SPL (dB)[, Std Err (dB)]
     """
+    columns = (center_freqs, band_spl) if stderr is None else (center_freqs, band_spl, stderr)
+    header = "Center Frequency (Hz),SPL (dB)" if stderr is None else "Center Frequency (Hz),SPL (dB),Std Err (dB)"
     np.savetxt(
         filename,
-        np.column_stack((center_freqs, band_spl)),
+        np.column_stack(columns),
         delimiter=",",
-        header="Center Frequency (Hz),SPL (dB)",
+        header=header,
         comments="",
         fmt="%.6f"
     )
-    print(f"1/3 Octave data saved to {filename}")
 
 def plot_fft(freqs, mag_db_spl, title="FFT Spectrum"):
     """Plots the FFT spectrum."""
@@ -126,6 +213,46 @@ def plot_fft(freqs, mag_db_spl, title="FFT Spectrum"):
     plt.grid(True, which="both", ls="-", alpha=0.5)
     plt.show()
 
+# Nominal band centre frequencies (ISO 266); other fractions use exact base-2 centres
+OCTAVE_CENTERS = np.array([31.5, 63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000])
+THIRD_OCTAVE_CENTERS = np.array([
+    31.5, 40, 50, 63, 80, 100, 125, 160, 200, 250, 315, 400, 500, 630,
+    800, 1000, 1250, 1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000,
+    10000, 12500, 16000
+])
+
+def band_center_frequencies(fraction=3):
+    """Centre frequencies of the 1/fraction octave bands from ~31.5 Hz to 16 kHz."""
+    if fraction == 1:
+        return OCTAVE_CENTERS
+    if fraction == 3:
+        return THIRD_OCTAVE_CENTERS
+    k = np.arange(np.ceil(fraction * np.log2(31.5 / 1000)), np.floor(fraction * np.log2(16000 / 1000)) + 1)
+    return 1000 * 2 ** (k / fraction)
+
+def compute_fractional_octave_band_spl(freqs, mag_db_spl, fraction=3):
+    """
+    Averages SPL values in each 1/fraction octave band.
+
+    :param freqs: FFT frequency bins (ascending)
+    :param mag_db_spl: FFT magnitude SPL values
+    :param fraction: Bands per octave (1, 3, 6, 12, ...)
+    :return: center_frequencies & averaged SPL per band
+    """
+    center_frequencies = band_center_frequencies(fraction)
+    half_band = 2 ** (1 / (2 * fraction))
+    lo = np.searchsorted(freqs, center_frequencies / half_band, side="left")
+    hi = np.searchsorted(freqs, center_frequencies * half_band, side="right")
+
+    band_spl = []  # Store averaged SPL per band
+    for start, stop in zip(lo, hi):
+        if stop > start:
+            band_spl.append(np.mean(mag_db_spl[start:stop], axis=0))
+        else:
+            band_spl.append(np.full(np.shape(mag_db_spl)[1:], -np.inf))  # If no data, set to -inf
+
+    return center_frequencies, np.array(band_spl)
+
 def compute_1_3_octave_band_spl(freqs, mag_db_spl):
     """
     Averages SPL values in each 1/3 octave band.
@@ -134,32 +261,20 @@ def compute_1_3_octave_band_spl(freqs, mag_db_spl):
     :param mag_db_spl: FFT magnitude SPL values
     :return: center_frequencies & averaged SPL per 1/3 octave band
     """
-    # Standard 1/3 octave band center frequencies (ISO 266)
-    center_frequencies = np.array([
-        31.5, 40, 50, 63, 80, 100, 125, 160, 200, 250, 315, 400, 500, 630, 
-        800, 1000, 1250, 1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000, 
-        10000, 12500, 16000
-    ])
-
-    band_spl = []  # Store averaged SPL per band
-
-    for fc in center_frequencies:
-        # Define band edges
-        f_low = fc / (2 ** (1 / 6))  # Lower edge of 1/3 octave band
-        f_high = fc * (2 ** (1 / 6))  # Upper edge
+    return compute_fractional_octave_band_spl(freqs, mag_db_spl, 3)
 
-        # Find indices within this band
-        idx = np.where((freqs >= f_low) & (freqs <= f_high))[0]
+def apply_calibration(freqs, spl_array, calibration_data):
+    """
+    Subtracts a microphone calibration curve, interpolated onto the frequency bins.
 
-        if len(idx) > 0:
-            # Average SPL in this band
-            avg_spl = np.mean(mag_db_spl[idx])
-            band_spl.append(avg_spl)
-        else:
-            band_spl.append(-np.inf)  # If no data, set to -∞
+    :param spl_array: dB SPL spectrum (bins,) or spectra (frames, bins)
+    :param calibration_data: Dict of frequency (Hz) -> correction (dB)
+    """
+    cal_freqs = np.array(sorted(calibration_data.keys()))
+    cal_values = np.array([calibration_data[f] for f in cal_freqs])
+    interp = np.interp(freqs, cal_freqs, cal_values).astype(np.asarray(spl_array).dtype)
+    return spl_array - interp
 
-    return center_frequencies, np.array(band_spl)
-    
 def setup_plot():
     """Initializes a Matplotlib figure with subplots for real-time FFT visualization."""
     fig, axs = plt.subplots(
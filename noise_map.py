@@ -0,0 +1,214 @@
+"""
+Session-level noise map: SPL versus air speed and frequency.
+
+Every spectrum merged into the map lands in the row of its binned air speed. The map
+holds linear power sums on a fixed log-spaced frequency grid, so spectra with any
+n_window or sample rate merge into the same cells: each spectrum's mean bin power per
+grid cell is found with one bincount (O(bins)) and added to the cell, and a cell's
+level is the energetic mean 10*log10(sum / count) over the spectra merged into it, so
+a spectrum with finer bins does not outweigh the others.
+
+Each merged run is recorded by its ID (the experiment folder), and a run already in
+the map is skipped, so re-computing or re-importing a run does not count it twice.
+A map holds one kind of isolated spectrum: single-mic differences or two-mic coherent
+output powers (see catalog.ISOLATION_*), set by the first spectrum merged into it.
+
+The whole map is one (speed bins, frequency bins) float32 power array plus a count
+per cell, saved as NOISE_MAP_FILE next to the experiment catalog, so a campaign's map
+opens without re-reading any runs.
+
+Usage:
+    python noise_map.py add <experiment folders>   # merge saved runs into the map
+    python noise_map.py info
+"""
+import argparse
+import os
+import numpy as np
+
+from catalog import ISOLATION_DIFFERENCE, isolation_mode
+from export_worker import atomic_write
+
+NOISE_MAP_FILE = "noise_map.npz"
+SPEED_STEP = 0.25         # Air speed bin width (m/s)
+SPEED_MAX = 12.0          # Upper edge of the speed axis (m/s)
+FREQ_MIN = 20.0
+FREQ_MAX = 96000.0        # Covers captures up to 192 kHz
+BINS_PER_OCTAVE = 48
+
+
+class NoiseMap:
+    def __init__(self, speed_edges=None, freq_edges=None):
+        """
+        :param speed_edges: Air speed bin edges (m/s); defaults to 0..SPEED_MAX in SPEED_STEP steps
+        :param freq_edges: Frequency cell edges (Hz); defaults to BINS_PER_OCTAVE log-spaced cells
+        """
+        if speed_edges is None:
+            speed_edges = np.arange(0, SPEED_MAX + SPEED_STEP / 2, SPEED_STEP)
+        if freq_edges is None:
+            octaves = np.log2(FREQ_MAX / FREQ_MIN)
+            freq_edges = FREQ_MIN * 2 ** (np.arange(int(octaves * BINS_PER_OCTAVE) + 1) / BINS_PER_OCTAVE)
+        self.speed_edges = np.asarray(speed_edges, dtype=np.float64)
+        self.freq_edges = np.asarray(freq_edges, dtype=np.float64)
+        shape = (len(self.speed_edges) - 1, len(self.freq_edges) - 1)
+        self.power = np.zeros(shape, dtype=np.float64)   # Sum of the spectra's mean linear power per cell
+        self.counts = np.zeros(shape, dtype=np.float64)  # Spectra merged per cell
+        self.spectra = 0
+        self.merged = set()  # IDs of the runs merged so far
+        self.isolation = ISOLATION_DIFFERENCE  # Kind of isolated spectra in the map
+        self._cell_maps = {}  # (bins, first freq, last freq) -> (cell index per bin, in-grid mask)
+
+    @property
+    def speed_centers(self):
+        return (self.speed_edges[:-1] + self.speed_edges[1:]) / 2
+
+    @property
+    def freq_centers(self):
+        return np.sqrt(self.freq_edges[:-1] * self.freq_edges[1:])
+
+    def _cell_map(self, freqs):
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]))
+        cell_map = self._cell_maps.get(key)
+        if cell_map is None:
+            cells = np.searchsorted(self.freq_edges, freqs, side="right") - 1
+            inside = (cells >= 0) & (cells < self.power.shape[1])
+            cell_map = self._cell_maps[key] = (cells[inside], inside)
+        return cell_map
+
+    def speed_bin(self, air_speed):
+        """Row of an air speed, or None if it is outside the speed axis."""
+        if air_speed is None or not np.isfinite(air_speed):
+            return None
+        row = int(np.searchsorted(self.speed_edges, air_speed, side="right")) - 1
+        return row if 0 <= row < self.power.shape[0] else None
+
+    def accepts(self, isolation):
+        """True if spectra isolated this way can be merged (an empty map takes either kind)."""
+        return self.spectra == 0 or isolation == self.isolation
+
+    def add(self, air_speed, freqs, spl, run_id=None, isolation=ISOLATION_DIFFERENCE):
+        """
+        Merges a dB spectrum into the row of its air speed.
+
+        :param run_id: ID of the run the spectrum belongs to (e.g. its experiment folder);
+                       a run already in the map is not merged again
+        :param isolation: How the spectrum was isolated (see catalog.ISOLATION_*)
+        :return: The row index, or None if the speed is outside the map, the run is already
+                 merged or the map holds the other kind of spectra
+        """
+        row = self.speed_bin(air_speed)
+        if row is None or (run_id is not None and run_id in self.merged) or not self.accepts(isolation):
+            return None
+        self.isolation = isolation
+        cells, inside = self._cell_map(np.asarray(freqs))
+        power = 10 ** (np.asarray(spl, dtype=np.float64)[inside] / 10)
+        width = self.power.shape[1]
+        bins = np.bincount(cells, minlength=width)
+        filled = bins > 0
+        # One contribution per cell (the mean of the spectrum's bins in it), whatever the bin width
+        self.power[row, filled] += np.bincount(cells, weights=power, minlength=width)[filled] / bins[filled]
+        self.counts[row, filled] += 1
+        self.spectra += 1
+        if run_id is not None:
+            self.merged.add(run_id)
+        return row
+
+    def merge(self, other):
+        """Adds another map with the same grid (e.g. a second rig's session)."""
+        if not (np.array_equal(self.speed_edges, other.speed_edges) and np.array_equal(self.freq_edges, other.freq_edges)):
+            raise ValueError("Noise maps have different grids.")
+        if self.merged & other.merged:
+            raise ValueError("Noise maps share merged runs.")
+        if other.spectra and not self.accepts(other.isolation):
+            raise ValueError("Noise maps hold differently isolated spectra.")
+        if other.spectra:
+            self.isolation = other.isolation
+        self.power += other.power
+        self.counts += other.counts
+        self.spectra += other.spectra
+        self.merged |= other.merged
+
+    def copy(self):
+        """Independent copy (e.g. to save on the export worker while merging continues)."""
+        noise_map = NoiseMap(self.speed_edges, self.freq_edges)
+        noise_map.power, noise_map.counts = self.power.copy(), self.counts.copy()
+        noise_map.spectra = self.spectra
+        noise_map.merged = set(self.merged)
+        noise_map.isolation = self.isolation
+        return noise_map
+
+    def levels(self):
+        """(speed bins, frequency bins) dB map; nan where nothing was merged."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.counts > 0, 10 * np.log10(self.power / self.counts), np.nan)
+
+    def save(self, path=NOISE_MAP_FILE):
+        """Writes the map atomically (power and counts as one float32 array)."""
+        stacked = np.stack((self.power, self.counts)).astype(np.float32)
+        atomic_write(path, lambda tmp: np.savez(tmp, map=stacked, speed_edges=self.speed_edges,
+                                                 freq_edges=self.freq_edges, spectra=self.spectra,
+                                                 merged=np.array(sorted(self.merged), dtype=str),
+                                                 isolation=self.isolation))
+
+    @classmethod
+    def load(cls, path=NOISE_MAP_FILE):
+        """Opens a saved map, or returns an empty one if the file does not exist."""
+        if not os.path.isfile(path):
+            return cls()
+        with np.load(path) as data:
+            noise_map = cls(data["speed_edges"], data["freq_edges"])
+            noise_map.power, noise_map.counts = data["map"].astype(np.float64)
+            noise_map.spectra = int(data["spectra"])
+            if "merged" in data:
+                noise_map.merged = set(data["merged"].tolist())
+            if "isolation" in data:
+                noise_map.isolation = str(data["isolation"])
+        return noise_map
+
+
+def run_id(folder):
+    """ID of an experiment folder in the map's merged set."""
+    return os.path.normcase(os.path.abspath(folder))
+
+
+def add_run_folder(noise_map, folder):
+    """Merges a saved run's noise-isolated spectrum at its recorded air speed; returns the row or None."""
+    from result_store import load_results
+
+    if run_id(folder) in noise_map.merged:
+        print(f"{folder}: already in the noise map, skipped")
+        return None
+    results = load_results(folder, ["freqs", "isolated"])
+    air_speed = (results["metadata"] or {}).get("air_speed")
+    if "isolated" not in results or air_speed is None:
+        print(f"{folder}: no noise-isolated spectrum or air speed, skipped")
+        return None
+    isolation = isolation_mode(results["metadata"])
+    if not noise_map.accepts(isolation):
+        print(f"{folder}: {isolation} isolation, but the map holds {noise_map.isolation} spectra, skipped")
+        return None
+    return noise_map.add(air_speed, results["freqs"], results["isolated"], run_id(folder), isolation)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed-frequency noise map")
+    parser.add_argument("--map", default=NOISE_MAP_FILE, help="Noise map file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_add = sub.add_parser("add", help="Merge saved runs into the map")
+    p_add.add_argument("folders", nargs="+")
+    sub.add_parser("info", help="Show the map's coverage")
+    args = parser.parse_args()
+
+    noise_map = NoiseMap.load(args.map)
+    if args.command == "add":
+        added = sum(add_run_folder(noise_map, folder) is not None for folder in args.folders)
+        noise_map.save(args.map)
+        print(f"Merged {added} of {len(args.folders)} runs into {args.map}")
+    filled = np.flatnonzero(noise_map.counts.any(axis=1))
+    print(f"{noise_map.spectra} {noise_map.isolation} spectra; {len(filled)} of {noise_map.power.shape[0]} speed bins filled")
+    for row in filled:
+        low, high = noise_map.speed_edges[row], noise_map.speed_edges[row + 1]
+        print(f"  {low:.2f}-{high:.2f} m/s")
+
+
+if __name__ == "__main__":
+    main()
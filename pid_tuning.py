@@ -0,0 +1,484 @@
+"""
+PID gain-table identification for the fan speed controller (PID/PID.ino).
+
+1. Step tests: scripted open-loop PWM steps are sent through ComPortHandler and the
+   AD (air speed) / PWM telemetry is logged to CSV.
+2. Plant fit: each step is fitted with a first-order-plus-dead-time (FOPDT) model by
+   least squares. The offset and gain are linear, so for every (dead time, time
+   constant) pair on a grid they come from closed-form normal equations evaluated for
+   the whole grid at once; the best pair wins. Steady-state (PWM, speed) points give the
+   static fan curve.
+3. Tuning: for each table entry the firmware loop is simulated on the fitted plant for
+   a whole grid of (Kp, Ki, Kd) candidates in parallel. The simulation follows PID.ino
+   as shipped: the velocity-form update PWM += 255 * (p + i + d) / speed every
+   LOOP_DT with its rounding, the integral as average() actually computes it, and the
+   table lookup as linInterpolate() reads it. The candidate with the shortest settle
+   time (within SETTLE_TOLERANCE for the rest of the run) is proposed.
+
+The result is printed as pGains/iGains/dGains lines ready to paste into PID.ino.
+
+Usage:
+    python pid_tuning.py run --port COM3          # step tests, then fit and tune
+    python pid_tuning.py fit step_log.csv         # fit and tune from an existing log
+    python pid_tuning.py simulate                 # validate against a simulated plant
+"""
+import argparse
+import csv
+import threading
+import time
+import numpy as np
+
+GAIN_POINTS = 6           # One table entry per m/s, from 1 m/s
+LOOP_DT = 0.05            # Firmware loop period (s), delay(50)
+AVERAGE_COUNT = 512       # Length of the firmware's error buffer
+MAX_PWM = 255
+SETTLE_TOLERANCE = 0.1    # m/s
+SIM_DURATION = 60.0       # s simulated per step
+
+# (time constant, dead time, static gain) scalings each candidate must settle under; the
+# firmware's rounding deadband leaves steady errors close to the tolerance, so the
+# optimum on the nominal fit alone is fragile
+ROBUST_PERTURBATIONS = [(1.0, 1.0, 1.0), (0.8, 0.8, 1.0), (1.25, 1.25, 1.0), (1.0, 1.0, 0.9), (1.0, 1.0, 1.1)]
+
+# Gain tables currently in PID.ino
+CURRENT_GAINS = {
+    "p": np.array([0.03, 0.04, 0.035, 0.04, 0.04, 0.06]),
+    "i": np.array([0.1, 0.15, 0.15, 0.15, 0.2, 0.2]),
+    "d": np.array([0.01, 0.01, 0.01, 0.01, 0.02, 0.01]),
+}
+
+DEFAULT_PWM_STEPS = [40, 80, 120, 160, 200, 240, 160, 80, 0]
+DEFAULT_HOLD_S = 20.0
+
+LOG_FIELDS = ["time", "pwm_command", "air_speed", "pwm_reported"]
+
+
+# ------------------------------
+# Step tests
+# ------------------------------
+def run_step_tests(port, pwm_steps=DEFAULT_PWM_STEPS, hold_s=DEFAULT_HOLD_S, baudrate=115200, log_file=None):
+    """
+    Runs open-loop PWM steps and logs the response.
+
+    :param port: COM port of the fan controller
+    :param pwm_steps: PWM levels, each held for hold_s seconds
+    :param log_file: CSV file to write the log to (optional)
+    :return: Log as a dict of arrays (LOG_FIELDS)
+    """
+    from com_port import ComPortHandler
+
+    rows = []
+    state = {"pwm_command": 0, "pwm_reported": np.nan}
+    lock = threading.Lock()
+    t0 = time.time()
+
+    def on_line(line):
+        with lock:
+            if line.startswith("AD"):
+                try:
+                    rows.append((time.time() - t0, state["pwm_command"], float(line[2:]), state["pwm_reported"]))
+                except ValueError:
+                    pass
+            elif line.startswith("PWM"):
+                try:
+                    state["pwm_reported"] = int(line[3:])
+                except ValueError:
+                    pass
+
+    handler = ComPortHandler(port=port, baudrate=baudrate, timeout=1, callback=on_line)
+    handler.open()
+    try:
+        for pwm in pwm_steps:
+            with lock:
+                state["pwm_command"] = pwm
+            handler.send_pwm(pwm)
+            time.sleep(hold_s)
+    finally:
+        handler.send_pwm(0)
+        handler.close()
+
+    log = {name: np.array(column, dtype=np.float64) for name, column in zip(LOG_FIELDS, zip(*rows))} if rows \
+        else {name: np.zeros(0) for name in LOG_FIELDS}
+    if log_file:
+        save_log(log_file, log)
+    return log
+
+
+def save_log(filename, log):
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LOG_FIELDS)
+        writer.writerows(zip(*(log[name] for name in LOG_FIELDS)))
+    print(f"Step test log saved to {filename}")
+
+
+def load_log(filename):
+    data = np.genfromtxt(filename, delimiter=",", names=True)
+    return {name: np.atleast_1d(data[name]) for name in LOG_FIELDS}
+
+
+# ------------------------------
+# Plant identification
+# ------------------------------
+def fit_fopdt(t, y, dead_times=None, time_constants=None):
+    """
+    Least-squares FOPDT fit  y(t) = y0 + dy * (1 - exp(-(t - theta) / tau)),  t >= theta.
+
+    :param t: Time since the input step (s)
+    :param y: Response samples
+    :return: y0, dy, theta, tau, rms residual
+    """
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if dead_times is None:
+        dead_times = np.arange(0.0, 3.0, LOOP_DT)
+    if time_constants is None:
+        time_constants = np.geomspace(0.1, 30.0, 120)
+
+    theta = np.asarray(dead_times)[:, None, None]
+    tau = np.asarray(time_constants)[None, :, None]
+    basis = 1 - np.exp(-np.maximum(t - theta, 0.0) / tau)           # (thetas, taus, samples)
+
+    # Closed-form simple linear regression of y on each basis row
+    b_mean = basis.mean(axis=-1)
+    b_centered = basis - b_mean[..., None]
+    y_centered = y - y.mean()
+    var = np.einsum("...n,...n->...", b_centered, b_centered)
+    dy = np.einsum("...n,n->...", b_centered, y_centered) / np.maximum(var, 1e-12)
+    y0 = y.mean() - dy * b_mean
+    sse = np.sum(y_centered**2) - dy * np.einsum("...n,n->...", b_centered, y_centered)
+
+    i, j = np.unravel_index(np.argmin(sse), sse.shape)
+    rms = np.sqrt(max(sse[i, j], 0.0) / len(t))
+    return y0[i, j], dy[i, j], float(dead_times[i]), float(time_constants[j]), rms
+
+
+def split_steps(log, settle_fraction=0.3):
+    """
+    Splits a step-test log at each PWM command change (the first segment is a step from rest).
+
+    :return: List of dicts with t (from the step), y, pwm_before, pwm_after and the
+             steady speed over the last settle_fraction of the segment
+    """
+    t, u, y = log["time"], log["pwm_command"], log["air_speed"]
+    changes = np.flatnonzero(np.diff(u)) + 1
+    bounds = np.concatenate(([0], changes, [len(u)]))
+    steps = []
+    for k in range(len(bounds) - 1):
+        start, stop = bounds[k], bounds[k + 1]
+        if stop - start < 10 or (k == 0 and u[0] == 0):
+            continue
+        tail = y[start + int((stop - start) * (1 - settle_fraction)) : stop]
+        steps.append({
+            "t": t[start:stop] - t[start],
+            "y": y[start:stop],
+            "pwm_before": u[start - 1] if start else 0.0,
+            "pwm_after": u[start],
+            "steady_speed": float(np.mean(tail)),
+        })
+    return steps
+
+
+class FanModel:
+    def __init__(self, steady_pwm, steady_speed, model_speeds, time_constants, dead_times):
+        """
+        Fitted fan/tunnel plant: a static PWM -> speed curve plus speed-dependent FOPDT dynamics.
+
+        :param steady_pwm: PWM of the steady-state points (ascending)
+        :param steady_speed: Steady air speed at those PWM values (m/s)
+        :param model_speeds: Speeds at which the dynamics were identified (ascending)
+        :param time_constants: Time constant at each model speed (s)
+        :param dead_times: Dead time at each model speed (s)
+        """
+        self.steady_pwm = np.asarray(steady_pwm, dtype=np.float64)
+        self.steady_speed = np.asarray(steady_speed, dtype=np.float64)
+        self.model_speeds = np.asarray(model_speeds, dtype=np.float64)
+        self.time_constants = np.asarray(time_constants, dtype=np.float64)
+        self.dead_times = np.asarray(dead_times, dtype=np.float64)
+
+    def static_speed(self, pwm):
+        return np.interp(pwm, self.steady_pwm, self.steady_speed)
+
+    def steady_pwm_for(self, speed):
+        return np.interp(speed, self.steady_speed, self.steady_pwm)
+
+    def time_constant(self, speed):
+        return float(np.interp(speed, self.model_speeds, self.time_constants))
+
+    def dead_time(self, speed):
+        return float(np.interp(speed, self.model_speeds, self.dead_times))
+
+
+def identify_plant(log):
+    """Fits every step of a log and builds the FanModel."""
+    steps = split_steps(log)
+    if not steps:
+        raise ValueError("The log has no PWM steps to fit.")
+
+    fits = []
+    for step in steps:
+        y0, dy, theta, tau, rms = fit_fopdt(step["t"], step["y"])
+        fits.append((step["pwm_after"], step["steady_speed"], theta, tau, rms))
+        print(f"  PWM {step['pwm_before']:5.0f} -> {step['pwm_after']:5.0f}: "
+              f"speed {y0:5.2f} -> {y0 + dy:5.2f} m/s, dead time {theta:4.2f} s, tau {tau:5.2f} s, rms {rms:.3f}")
+
+    pwm, speed, theta, tau, _ = (np.array(c) for c in zip(*fits))
+    # Static curve from the steady points (averaging repeated PWM levels), anchored at rest
+    levels = np.unique(np.concatenate(([0.0], pwm)))
+    curve = np.array([0.0 if level == 0 and not np.any(pwm == 0) else speed[pwm == level].mean() for level in levels])
+    curve = np.maximum.accumulate(curve)  # Speed rises with PWM
+    if levels[-1] < MAX_PWM and len(levels) > 1:
+        # Extend the last segment to full PWM rather than clamping the speed there
+        slope = (curve[-1] - curve[-2]) / (levels[-1] - levels[-2])
+        levels = np.append(levels, MAX_PWM)
+        curve = np.append(curve, curve[-1] + slope * (MAX_PWM - levels[-2]))
+    # Dynamics per final speed (steps that end at rest say little about the loop)
+    moving = speed > 0.2
+    order = np.argsort(speed[moving])
+    return FanModel(levels, curve, speed[moving][order], tau[moving][order], theta[moving][order])
+
+
+# ------------------------------
+# Closed-loop simulation of PID.ino
+# ------------------------------
+def firmware_gain(table, speed):
+    """The gain linInterpolate() in PID.ino reads from a table at a set speed."""
+    index = int(speed) - 1
+    if index >= GAIN_POINTS - 1:
+        return table[GAIN_POINTS - 1]
+    if index <= 0:
+        return table[0]
+    return table[index] + (table[index + 1] - table[index]) * (speed - index)
+
+
+def firmware_entry(speed):
+    """Table entry linInterpolate() returns at a whole-number set speed."""
+    index = int(speed) - 1
+    return 0 if index <= 0 else min(index + 1, GAIN_POINTS - 1)
+
+
+def _firmware_integral(error, prev_error):
+    """
+    average(prev_error) as PID.ino computes it, for arrays of errors.
+
+    errorShift() copies forwards, so after each shift the buffer holds the new error
+    followed by AVERAGE_COUNT - 1 copies of the previous one. average() sums them into
+    an int, truncating at every addition, then divides in integer arithmetic, so the
+    term is zero for errors under 1 m/s. The repeated truncating sum has a closed form
+    (trunc is odd, so it is worked for a non-negative addend and the sign restored).
+    """
+    count = np.trunc(error)
+    sign = np.where(prev_error < 0, -1.0, 1.0)
+    c, x = count * sign, prev_error * sign
+    n = AVERAGE_COUNT - 1
+    step_up = np.ceil(x)
+    # While c + x < 0 the sum truncates towards zero and gains ceil(x) per addition...
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m = np.where(c < -x, np.where(step_up > 0, np.ceil((-x - c) / np.maximum(step_up, 1)), np.inf), 0)
+    m = np.minimum(m, n)
+    # ...after which it gains floor(x) per addition
+    count = (c + m * step_up + (n - m) * np.floor(x)) * sign
+    return np.trunc(count / AVERAGE_COUNT)
+
+
+def simulate_loop(model, target, start_speed, kp, ki, kd, duration=SIM_DURATION, dt=LOOP_DT,
+                  noise=0.0, seed=0, tau_scale=1.0, dead_time_scale=1.0, gain_scale=1.0):
+    """
+    Simulates PID.ino's speed loop for many gain candidates at once.
+
+    :param model: FanModel
+    :param target: Set speed (m/s)
+    :param start_speed: Speed (and matching steady PWM) before the set-point step
+    :param kp, ki, kd: Gain arrays of equal shape (one entry per candidate)
+    :param noise: Standard deviation of sensor noise (m/s)
+    :param tau_scale, dead_time_scale, gain_scale: Scale the model's dynamics and fan curve (robustness checks)
+    :return: times (steps,), speeds (steps, candidates)
+    """
+    kp, ki, kd = np.broadcast_arrays(*(np.atleast_1d(np.asarray(g, dtype=np.float64)) for g in (kp, ki, kd)))
+    n = len(kp)
+    steps = int(round(duration / dt))
+    rng = np.random.default_rng(seed)
+
+    tau = model.time_constant(target) * tau_scale
+    delay = int(round(model.dead_time(target) * dead_time_scale / dt))
+    decay = np.exp(-dt / tau)
+
+    speed = np.full(n, float(start_speed))
+    pwm = np.full(n, np.round(model.steady_pwm_for(start_speed / gain_scale)))
+    pwm_history = np.repeat(pwm[None, :], delay + 1, axis=0)  # Ring of applied PWM for the dead time
+    prev_error = np.full(n, target - float(start_speed))
+    out = np.empty((steps, n))
+
+    for k in range(steps):
+        measured = speed + (rng.normal(0.0, noise, n) if noise else 0.0)
+        error = target - measured
+        control = MAX_PWM * (kp * error + ki * _firmware_integral(error, prev_error)
+                             + kd * (error - prev_error) / dt) / np.maximum(measured, 0.05)
+        prev_error = error
+
+        # Firmware rounding: truncate, then add one if the fractional part of control >= 0.5
+        frac = control - np.trunc(control)
+        pwm = np.clip(np.trunc(pwm + control) + (frac >= 0.5), 0, MAX_PWM)
+
+        pwm_history[k % (delay + 1)] = pwm
+        applied = pwm_history[(k + 1) % (delay + 1)]
+        speed = decay * speed + (1 - decay) * gain_scale * model.static_speed(applied)
+        out[k] = speed
+
+    return np.arange(1, steps + 1) * dt, out
+
+
+def settle_times(times, speeds, target, tolerance=SETTLE_TOLERANCE):
+    """Time after which each candidate stays within tolerance of the target (inf if it never does)."""
+    outside = np.abs(speeds - target) > tolerance
+    last_outside = len(times) - 1 - np.argmax(outside[::-1], axis=0)
+    result = np.where(outside.any(axis=0), times[last_outside], 0.0)
+    return np.where(outside[-1], np.inf, result)
+
+
+def step_start(target):
+    """Set-point steps are simulated from 1 m/s below (0.5 m/s for the lowest speed)."""
+    return max(target - 1.0, 0.5)
+
+
+def gain_grid(kp=None, ki=None, kd=None):
+    """Flattened (Kp, Ki, Kd) candidate grid."""
+    kp = np.geomspace(0.005, 0.3, 14) if kp is None else kp
+    ki = np.concatenate(([0.0], np.geomspace(0.01, 2.0, 13))) if ki is None else ki
+    kd = np.array([0.0, 0.0025, 0.005, 0.01, 0.02, 0.04]) if kd is None else kd
+    grid = np.meshgrid(kp, ki, kd, indexing="ij")
+    return tuple(g.ravel() for g in grid)
+
+
+def propose_gains(model, grid=None, tolerance=SETTLE_TOLERANCE, perturbations=ROBUST_PERTURBATIONS):
+    """
+    Picks the settle-time-optimal gains for each table entry.
+
+    Each entry is tuned at the whole-number speeds linInterpolate() reads it at (entry 1
+    is never read at whole speeds and gets entry 2's gains; entry 5 serves 5 and 6 m/s).
+    A candidate's settle time is its worst over those speeds and the model
+    perturbations; ties are broken by the integrated absolute error on the nominal model.
+
+    :return: dict of gain tables "p", "i", "d"
+    """
+    kp, ki, kd = gain_grid() if grid is None else grid
+    table = {"p": np.zeros(GAIN_POINTS), "i": np.zeros(GAIN_POINTS), "d": np.zeros(GAIN_POINTS)}
+    speeds = np.arange(1, GAIN_POINTS + 1, dtype=np.float64)
+    for entry in range(GAIN_POINTS):
+        entry_speeds = [v for v in speeds if firmware_entry(v) == entry]
+        if not entry_speeds:
+            continue
+        settle = np.zeros(len(kp))
+        iae = np.zeros(len(kp))
+        for target in entry_speeds:
+            for tau_scale, dead_time_scale, gain_scale in perturbations:
+                times, sim = simulate_loop(model, target, step_start(target), kp, ki, kd, tau_scale=tau_scale,
+                                           dead_time_scale=dead_time_scale, gain_scale=gain_scale)
+                settle = np.maximum(settle, settle_times(times, sim, target, tolerance))
+                if (tau_scale, dead_time_scale, gain_scale) == (1.0, 1.0, 1.0):
+                    iae += np.abs(sim - target).sum(axis=0) * LOOP_DT
+        best = np.lexsort((iae, settle))[0]
+        for key, values in (("p", kp), ("i", ki), ("d", kd)):
+            table[key][entry] = values[best]
+    for entry in range(GAIN_POINTS):
+        if not any(firmware_entry(v) == entry for v in speeds):
+            for key in table:
+                table[key][entry] = table[key][min(entry + 1, GAIN_POINTS - 1)]
+    return table
+
+
+def table_settle_times(model, gains, tolerance=SETTLE_TOLERANCE):
+    """Settle time of a gain table at each whole-number speed, read as the firmware reads it."""
+    result = []
+    for target in np.arange(1, GAIN_POINTS + 1, dtype=np.float64):
+        gain = [firmware_gain(gains[key], target) for key in ("p", "i", "d")]
+        times, sim = simulate_loop(model, target, step_start(target), *gain)
+        result.append(settle_times(times, sim, target, tolerance)[0])
+    return np.array(result)
+
+
+def format_gain_table(gains):
+    """The pGains/dGains/iGains declarations as they appear in PID.ino."""
+    fmt = lambda values: ", ".join(f"{v:.4g}" for v in values)
+    return (f"const float pGains[GAIN_POINTS] = {{{fmt(gains['p'])}}};             // Proportional constant for control\n"
+            f"const float dGains[GAIN_POINTS] = {{{fmt(gains['d'])}}};             // Derivatice constant for control\n"
+            f"const float iGains[GAIN_POINTS] = {{{fmt(gains['i'])}}};             // Integral constant for control")
+
+
+def report(model, gains):
+    """Prints the settle times of the proposed and current tables and the table to paste."""
+    proposed = table_settle_times(model, gains)
+    current = table_settle_times(model, CURRENT_GAINS)
+    for k, (new, old) in enumerate(zip(proposed, current)):
+        print(f"  {k + 1} m/s: settle {new:5.1f} s (current table {old:5.1f} s)")
+    print("\nPaste into PID/PID.ino:\n")
+    print(format_gain_table(gains))
+    return proposed, current
+
+
+# ------------------------------
+# Validation against a simulated plant
+# ------------------------------
+def simulated_step_log(model, pwm_steps=DEFAULT_PWM_STEPS, hold_s=DEFAULT_HOLD_S, dt=LOOP_DT, noise=0.02, seed=0):
+    """Open-loop step-test log of a known plant, in the format run_step_tests produces."""
+    rng = np.random.default_rng(seed)
+    speed, pwm_prev = 0.0, 0.0
+    rows = []
+    t = 0.0
+    for pwm in pwm_steps:
+        tau = model.time_constant(model.static_speed(pwm) if pwm else model.static_speed(pwm_prev))
+        delay = model.dead_time(model.static_speed(pwm) if pwm else model.static_speed(pwm_prev))
+        step_t = t
+        for _ in range(int(round(hold_s / dt))):
+            applied = pwm if t - step_t >= delay else pwm_prev
+            speed = np.exp(-dt / tau) * speed + (1 - np.exp(-dt / tau)) * model.static_speed(applied)
+            rows.append((t, pwm, speed + rng.normal(0, noise), pwm))
+            t += dt
+        pwm_prev = pwm
+    return {name: np.array(column) for name, column in zip(LOG_FIELDS, zip(*rows))}
+
+
+def validate(noise=0.02):
+    """Fits a log from a known plant and checks the recovered model and proposed gains."""
+    true_model = FanModel(
+        steady_pwm=[0, 40, 80, 120, 160, 200, 240, 255],
+        steady_speed=[0.0, 0.6, 1.6, 2.7, 3.8, 4.9, 6.0, 6.3],
+        model_speeds=[1.0, 3.0, 6.0], time_constants=[3.0, 2.0, 1.5], dead_times=[0.4, 0.3, 0.25],
+    )
+    print("Fitting simulated step tests:")
+    fitted = identify_plant(simulated_step_log(true_model, noise=noise))
+    speeds = np.array([1.6, 2.7, 3.8, 4.9, 6.0])
+    tau_err = np.abs([fitted.time_constant(v) - true_model.time_constant(v) for v in speeds])
+    theta_err = np.abs([fitted.dead_time(v) - true_model.dead_time(v) for v in speeds])
+    print(f"Max time constant error {tau_err.max():.2f} s, max dead time error {theta_err.max():.2f} s")
+
+    gains = propose_gains(fitted)
+    print("\nOn the true plant:")
+    report(true_model, gains)
+    return gains
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identify the fan plant and propose PID gain tables.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="Run step tests on the tunnel, then fit and tune")
+    run_parser.add_argument("--port", default="COM3")
+    run_parser.add_argument("--pwm", type=int, nargs="+", default=DEFAULT_PWM_STEPS, help="PWM levels to step through")
+    run_parser.add_argument("--hold", type=float, default=DEFAULT_HOLD_S, help="Seconds per level")
+    run_parser.add_argument("--log", default="step_log.csv")
+    fit_parser = sub.add_parser("fit", help="Fit and tune from a step-test log")
+    fit_parser.add_argument("log")
+    sub.add_parser("simulate", help="Validate the fit and tuning against a simulated plant")
+    args = parser.parse_args()
+
+    if args.command == "simulate":
+        validate()
+        return
+    log = run_step_tests(args.port, args.pwm, args.hold, log_file=args.log) if args.command == "run" else load_log(args.log)
+    print("Fitting step responses:")
+    model = identify_plant(log)
+    report(model, propose_gains(model))
+
+
+if __name__ == "__main__":
+    main()
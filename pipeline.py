@@ -0,0 +1,207 @@
+"""
+Cached analysis pipeline for re-analysing a capture with different settings.
+
+The analysis is a small graph of named stages (FFT -> calibration -> isolation ->
+fractional-octave bands). Each stage result is cached under a content address: the
+hash of the stage name, the settings that stage reads, and the addresses of its
+inputs, with raw captures addressed by a hash of their samples. Changing a setting
+therefore only recomputes the stages downstream of it; e.g. a new band fraction reuses
+the cached spectra and only re-runs the band averaging.
+
+The cache may be used from several threads (record threads and the GUI): lookups and
+stores are locked, while the stages themselves run unlocked, so two threads missing
+the same result at once both compute it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+import live_spectrogram
+from live_spectrogram import compute_fft, compute_fractional_octave_band_spl, apply_calibration
+from zoom_fft import zoom_fft
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+DEFAULT_SETTINGS = {
+    "n_window": 4096,
+    "overlap": 0.5,
+    "precision": None,
+    "sample_rate": None,  # Sample rate of the captures (None = live_spectrogram.FS)
+    "calibration": None,  # Dict of frequency -> dB correction, or None
+    "band_fraction": 3,
+    "zoom": None,         # Zoom-FFT band as (f_low, f_high, resolution), see zoom_fft.py
+}
+
+
+def _hash_array(array):
+    array = np.ascontiguousarray(array)
+    h = hashlib.sha1()
+    h.update(str((array.dtype.str, array.shape)).encode())
+    h.update(memoryview(array).cast("B"))
+    return h.hexdigest()
+
+
+def _setting_token(value):
+    """Stable text form of a setting value for hashing."""
+    if isinstance(value, dict):
+        return repr(sorted(value.items()))
+    if isinstance(value, np.ndarray):
+        return _hash_array(value)
+    return repr(value)
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    return 64
+
+
+class Pipeline:
+    def __init__(self, max_cache_bytes=DEFAULT_CACHE_BYTES):
+        """
+        :param max_cache_bytes: Bound on cached stage results (least recently used are evicted first)
+        """
+        self.stages = {}          # name -> (func, inputs, setting names)
+        self.sources = {}         # name -> (address, value)
+        self.cache = OrderedDict()  # address -> value
+        self.cache_bytes = 0
+        self.max_cache_bytes = max_cache_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, func, inputs=(), settings=()):
+        """
+        Registers a stage computing func(*input values, **{setting: value}).
+
+        :param inputs: Names of the sources/stages whose results are passed positionally
+        :param settings: Names of the settings the stage depends on
+        """
+        self.stages[name] = (func, tuple(inputs), tuple(settings))
+
+    def set_source(self, name, value):
+        """Sets a raw input (e.g. a captured take); unchanged data keeps its cached results."""
+        self.sources[name] = (_hash_array(value), value)
+
+    def has_source(self, name):
+        return name in self.sources
+
+    def address(self, name, settings, _memo=None):
+        """Content address of a source or stage result for the given settings."""
+        if name in self.sources:
+            return self.sources[name][0]
+        memo = {} if _memo is None else _memo
+        if name not in memo:
+            func, inputs, setting_names = self.stages[name]
+            h = hashlib.sha1(name.encode())
+            for setting in setting_names:
+                h.update(f"|{setting}={_setting_token(settings.get(setting))}".encode())
+            for input_name in inputs:
+                h.update(b"|" + self.address(input_name, settings, memo).encode())
+            memo[name] = h.hexdigest()
+        return memo[name]
+
+    def run(self, name, **settings):
+        """
+        Returns the result of a stage, computing only the stages whose inputs or settings changed.
+
+        :param settings: Overrides of DEFAULT_SETTINGS
+        """
+        settings = dict(DEFAULT_SETTINGS, **settings)
+        return self._run(name, settings, {})
+
+    def _run(self, name, settings, memo):
+        if name in self.sources:
+            return self.sources[name][1]
+        if name not in self.stages:
+            raise KeyError(f"No source or stage named {name!r}")
+        key = self.address(name, settings, memo)
+        with self._lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            self.misses += 1
+
+        func, inputs, setting_names = self.stages[name]
+        args = [self._run(input_name, settings, memo) for input_name in inputs]
+        value = func(*args, **{s: settings.get(s) for s in setting_names})
+        self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        with self._lock:
+            if key in self.cache:  # Stored meanwhile by another thread
+                self.cache.move_to_end(key)
+                return
+            self.cache[key] = value
+            self.cache_bytes += _nbytes(value)
+            while self.cache_bytes > self.max_cache_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= _nbytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.cache_bytes = 0
+
+
+# ------------------------------
+# Stages of the noise-isolation analysis
+# ------------------------------
+def _spectrum_stage(audio, n_window, overlap, precision, sample_rate):
+    return compute_fft(audio, n_window, overlap, precision, fs=sample_rate)
+
+
+def _zoom_stage(audio, zoom, overlap, precision, sample_rate):
+    f_low, f_high, resolution = zoom
+    return zoom_fft(audio, sample_rate or live_spectrogram.FS, f_low, f_high, resolution, overlap, precision)
+
+
+def _calibration_stage(spectrum, calibration):
+    freqs, spl = spectrum
+    if calibration:
+        spl = apply_calibration(freqs, spl, calibration)
+    return freqs, spl
+
+
+def _isolation_stage(background, operation):
+    freqs, background_spl = background
+    _, operation_spl = operation
+    return freqs, operation_spl - background_spl
+
+
+def _band_stage(spectrum, band_fraction):
+    freqs, spl = spectrum
+    return compute_fractional_octave_band_spl(freqs, spl, band_fraction)
+
+
+def build_analysis_pipeline(max_cache_bytes=DEFAULT_CACHE_BYTES):
+    """
+    Pipeline from the "background_audio" and "operation_audio" sources to:
+
+        background_fft, operation_fft   raw dB SPL spectra        (n_window, overlap, precision, sample_rate)
+        background, operation           calibrated spectra        (calibration)
+        isolated                        operation - background
+        isolated_bands                  fractional-octave bands   (band_fraction)
+        background_zoom, operation_zoom calibrated zoom-FFT spectra  (zoom, overlap, precision, sample_rate, calibration)
+        isolated_zoom                   operation_zoom - background_zoom
+
+    Spectrum stages return (freqs, spl); isolated_bands returns (center_freqs, band_spl).
+    """
+    pipeline = Pipeline(max_cache_bytes)
+    for name in ("background", "operation"):
+        pipeline.add_stage(name + "_fft", _spectrum_stage, [name + "_audio"],
+                           ["n_window", "overlap", "precision", "sample_rate"])
+        pipeline.add_stage(name, _calibration_stage, [name + "_fft"], ["calibration"])
+    pipeline.add_stage("isolated", _isolation_stage, ["background", "operation"])
+    pipeline.add_stage("isolated_bands", _band_stage, ["isolated"], ["band_fraction"])
+    for name in ("background", "operation"):
+        pipeline.add_stage(name + "_zoom_fft", _zoom_stage, [name + "_audio"],
+                           ["zoom", "overlap", "precision", "sample_rate"])
+        pipeline.add_stage(name + "_zoom", _calibration_stage, [name + "_zoom_fft"], ["calibration"])
+    pipeline.add_stage("isolated_zoom", _isolation_stage, ["background_zoom", "operation_zoom"])
+    return pipeline
@@ -0,0 +1,376 @@
+"""
+Replay of recorded takes and telemetry through the live code path.
+
+A ReplaySource stands in for the sound card and the serial port. It plays a stored take
+(.npy or .wtz, see result_store.load_take) block by block to every stream opened through
+CaptureSettings, with sounddevice's InputStream/RawInputStream callback interface, and
+hands the recorded serial lines to a ReplayComPort, ComPortHandler's drop-in. Capture
+callbacks, take recording, the analysis, bands and plots therefore run unchanged.
+
+Timing: the source owns a virtual clock, origin + frames played / sample_rate, and
+installs it as the common clock (timeline.use_clock) while it runs. Block ADC times and
+serial line stamps keep their recorded spacing at any speed:
+    speed=1.0   real time, like the live rig
+    speed=N     N times faster (the wall-clock pacing is divided by N)
+    speed=None  as fast as the consumers take the blocks; the clock only advances
+                while a stream is open, so nothing is skipped between takes
+
+Benchmark (end-to-end throughput of the take and analysis path):
+    python replay.py <take.npy|take.wtz> [--speed max|N] [--duration 5] [--takes 10]
+"""
+import argparse
+import csv
+import os
+import threading
+import time
+import types
+import numpy as np
+
+from live_spectrogram import full_scale
+from result_store import load_take
+from timeline import use_clock
+
+REPLAY_BLOCK = 1024      # Frames the source advances per step
+READ_AHEAD_S = 1.0       # Span decoded at once from an archive (one chunk by default)
+
+
+def _stream_format(block, dtype):
+    """Converts a (frames, channels) block to a stream sample format ("int24" gives packed bytes)."""
+    target = np.dtype("int32" if dtype == "int24" else dtype)
+    if block.dtype != target:
+        scaled = block.astype(np.float64) * (full_scale(target) / full_scale(block.dtype))
+        if target.kind == "i":
+            info = np.iinfo(target)
+            scaled = np.clip(np.round(scaled), info.min, info.max)
+        block = scaled.astype(target)
+    if dtype == "int24":
+        # Left-justified int32 -> the top three bytes of each sample, little-endian
+        return np.ascontiguousarray(block, dtype="<i4").view(np.uint8).reshape(-1, 4)[:, 1:].tobytes()
+    return np.ascontiguousarray(block)
+
+
+class _Status:
+    """Stand-in for sounddevice.CallbackFlags: a replay never overflows."""
+    input_overflow = input_underflow = False
+
+    def __bool__(self):
+        return False
+
+    def __str__(self):
+        return ""
+
+
+class ReplayStream:
+    def __init__(self, source, samplerate, channels, dtype, blocksize, callback, raw=False):
+        """Input stream fed by a ReplaySource; created through source.InputStream/RawInputStream."""
+        if samplerate != source.sample_rate:
+            raise ValueError(f"The replayed take is {source.sample_rate} Hz, not {samplerate} Hz.")
+        if channels > source.channels:
+            raise ValueError(f"The replayed take has {source.channels} channel(s), not {channels}.")
+        self.source = source
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = dtype
+        self.blocksize = blocksize or REPLAY_BLOCK
+        self.callback = callback
+        self.raw = raw
+        self.active = False
+        self._pending = []
+        self._pending_frames = 0
+        self._first_frame = None  # Source frame of the first pending sample
+
+    def start(self):
+        self._pending, self._pending_frames, self._first_frame = [], 0, None
+        self.active = True
+        self.source._attach(self)
+
+    def stop(self):
+        self.active = False
+        self.source._detach(self)
+
+    close = stop
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _feed(self, frame, block):
+        """Called by the source thread with the next frames; emits full blocksize callbacks."""
+        if self._first_frame is None:
+            self._first_frame = frame
+        self._pending.append(block[:, :self.channels])
+        self._pending_frames += len(block)
+        while self.active and self._pending_frames >= self.blocksize:
+            data = np.concatenate(self._pending)
+            out, rest = data[:self.blocksize], data[self.blocksize:]
+            adc = self.source.frame_time(self._first_frame)
+            time_info = types.SimpleNamespace(inputBufferAdcTime=adc, currentTime=self.source.clock(),
+                                              outputBufferDacTime=0.0)
+            self._pending, self._pending_frames = [rest], len(rest)
+            self._first_frame += self.blocksize
+            self.callback(_stream_format(out, self.dtype), self.blocksize, time_info, _Status())
+
+
+class ReplaySource:
+    def __init__(self, audio, sample_rate, lines=(), speed=1.0, loop=False):
+        """
+        :param audio: (samples,) or (samples, channels) take, or a TakeArchive (read chunk by chunk)
+        :param sample_rate: Sample rate of the take (Hz)
+        :param lines: Serial lines as (seconds from the take start, text), e.g. from load_telemetry
+        :param speed: Replay speed factor, or None for as fast as possible
+        :param loop: Start again from the beginning at the end of the take
+        """
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.lines = sorted(lines, key=lambda line: line[0])
+        self.speed = speed
+        self.loop = loop
+        shape = audio.shape
+        self.frames = shape[0]
+        self.channels = shape[1] if len(shape) > 1 else 1
+        self.position = 0        # Frames played since start (keeps growing when looping)
+        self.origin = None       # Virtual clock time of frame 0
+        self.finished = False
+        self.on_finished = None  # Called from the replay thread at the end of the take
+        self.streams = []
+        self.line_sinks = []
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._buffer_start, self._buffer = 0, None
+
+    # ------------------------------
+    # sounddevice-style constructors (see capture.set_audio_source)
+    # ------------------------------
+    def InputStream(self, samplerate=None, channels=1, dtype="float32", blocksize=0, callback=None, **kwargs):
+        return ReplayStream(self, samplerate or self.sample_rate, channels, dtype, blocksize, callback)
+
+    def RawInputStream(self, samplerate=None, channels=1, dtype="int24", blocksize=0, callback=None, **kwargs):
+        return ReplayStream(self, samplerate or self.sample_rate, channels, dtype, blocksize, callback, raw=True)
+
+    def stop(self):
+        """sounddevice.stop() stand-in (on_close calls it)."""
+
+    # ------------------------------
+    # Virtual clock
+    # ------------------------------
+    def clock(self):
+        """Common-clock time: the virtual time of the frames played so far."""
+        return self.frame_time(self.position)
+
+    def frame_time(self, frame):
+        return self.origin + frame / self.sample_rate
+
+    def start(self):
+        """Installs the virtual clock and starts playing."""
+        self.origin = time.monotonic()
+        self._running = True
+        use_clock(self.clock)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops playing and restores the system clock (streams stay attached but get no more blocks)."""
+        self._running = False
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        use_clock(None)
+        for stream in list(self.streams):
+            stream.active = False
+
+    def _attach(self, stream):
+        with self._lock:
+            self.streams.append(stream)
+        self._wake.set()
+
+    def _detach(self, stream):
+        with self._lock:
+            if stream in self.streams:
+                self.streams.remove(stream)
+
+    def _read(self, start, stop):
+        if not hasattr(self.audio, "read"):
+            block = np.asarray(self.audio[start:stop])
+            return block.reshape(len(block), -1)
+        buffer = self._buffer
+        if buffer is None or start < self._buffer_start or stop > self._buffer_start + len(buffer):
+            # Decode a whole span so each archive chunk is inflated once
+            span = max(int(READ_AHEAD_S * self.sample_rate), stop - start)
+            buffer = self.audio.read(start, start + span)
+            self._buffer_start, self._buffer = start, buffer.reshape(len(buffer), -1)
+        return self._buffer[start - self._buffer_start:stop - self._buffer_start]
+
+    # ------------------------------
+    # Replay thread
+    # ------------------------------
+    def _run(self):
+        next_line = 0
+        anchor_wall, anchor_frame = time.monotonic(), self.position
+        while self._running:
+            if self.speed is None and not self.streams:
+                # As fast as possible: hold the clock until a stream consumes the blocks
+                self._wake.wait(0.1)
+                self._wake.clear()
+                continue
+            offset = self.position % self.frames
+            if self.position and offset == 0:
+                if not self.loop:
+                    break
+                next_line = 0
+            block = self._read(offset, min(offset + REPLAY_BLOCK, self.frames))
+            end_s = (offset + len(block)) / self.sample_rate
+            # Serial lines recorded during this block, stamped at their own times
+            while next_line < len(self.lines) and self.lines[next_line][0] < end_s:
+                t, line = self.lines[next_line]
+                next_line += 1
+                stamp = self.frame_time(self.position - offset) + t
+                for sink in list(self.line_sinks):
+                    sink._deliver(stamp, line)
+            if self.speed is not None:
+                due = anchor_wall + (self.position + len(block) - anchor_frame) / self.sample_rate / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            frame = self.position
+            self.position += len(block)
+            # Held while feeding, so a stream's close() returns only after its last callback
+            with self._lock:
+                for stream in list(self.streams):
+                    stream._feed(frame, block)
+        self.finished = True
+        for stream in list(self.streams):
+            stream.active = False
+        if self.on_finished is not None:
+            self.on_finished()
+
+
+class ReplayComPort:
+    def __init__(self, source, callback=None, port="replay"):
+        """Drop-in for ComPortHandler that receives the serial lines of a ReplaySource."""
+        self.source = source
+        self.callback = callback
+        self.port = port
+        self.running = False
+        self.last_line_time = None
+
+    def open(self):
+        self.running = True
+        self.source.line_sinks.append(self)
+
+    def close(self):
+        self.running = False
+        if self in self.source.line_sinks:
+            self.source.line_sinks.remove(self)
+
+    def _deliver(self, t, line):
+        self.last_line_time = t
+        if self.callback:
+            self.callback(line)
+
+    def send_fan_speed(self, speed):
+        print(f"Replay: fan speed command {speed:.2f} ignored.")
+
+    def send_pwm(self, pwm):
+        print(f"Replay: PWM command {int(pwm)} ignored.")
+
+
+def telemetry_lines(telemetry):
+    """Serial lines from a take sidecar's "telemetry" dict (see run_analysis.keep_raw_take)."""
+    lines = [(t, f"AD{v:.2f}") for t, v in telemetry.get("air_speed", [])]
+    lines += [(t, f"PWM{int(v)}") for t, v in telemetry.get("pwm", [])]
+    return lines
+
+
+def load_telemetry(path, offset_s=0.0):
+    """
+    Reads serial lines for a replay from a CSV file.
+
+    Accepts a fan speed recording ("Time (s)", "Air Speed (m/s)"), replayed as AD lines,
+    or rows of (time, raw serial line).
+    :param offset_s: Take start time on the file's time axis
+    """
+    lines = []
+    with open(path, newline="") as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        air_speed = header is not None and "Air Speed" in header[-1]
+        if header is not None and not air_speed:
+            try:
+                float(header[0])
+                rows = [header] + list(rows)
+            except ValueError:
+                pass
+        for row in rows:
+            if len(row) < 2:
+                continue
+            t = float(row[0]) - offset_s
+            lines.append((t, f"AD{float(row[1]):.2f}" if air_speed else row[1]))
+    return lines
+
+
+def open_replay(filename, telemetry_path=None, speed=1.0, loop=False):
+    """
+    Builds a ReplaySource for a saved take (.npy or .wtz).
+
+    Serial lines come from telemetry_path, or from the telemetry saved in the take's sidecar.
+    """
+    from archive import ARCHIVE_EXT, TakeArchive
+
+    stem, ext = os.path.splitext(filename)
+    if ext == ARCHIVE_EXT or (ext != ".npy" and not os.path.isfile(stem + ".npy")):
+        audio = TakeArchive(stem + ARCHIVE_EXT)
+        _, metadata = load_take(filename, stop=0)
+    else:
+        audio, metadata = load_take(filename)
+    if telemetry_path:
+        lines = load_telemetry(telemetry_path)
+    else:
+        lines = telemetry_lines(metadata.get("telemetry", {}))
+    sample_rate = metadata.get("sample_rate")
+    if sample_rate is None:
+        raise ValueError(f"{os.path.basename(filename)} has no sample rate in its sidecar.")
+    return ReplaySource(audio, sample_rate, lines, speed, loop)
+
+
+def main():
+    from capture import CaptureSettings, set_audio_source
+    from pipeline import build_analysis_pipeline
+
+    parser = argparse.ArgumentParser(description="Replay a take through the capture and analysis path")
+    parser.add_argument("take", help="Take file (.npy or .wtz)")
+    parser.add_argument("--speed", default="max", help="Speed factor, or 'max' (default)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Take length per analysis (s)")
+    parser.add_argument("--takes", type=int, default=10, help="Background/operation take pairs to record and analyse")
+    parser.add_argument("--n-window", type=int, default=4096)
+    parser.add_argument("--bit-depth", type=int, default=24)
+    args = parser.parse_args()
+
+    source = open_replay(args.take, speed=None if args.speed == "max" else float(args.speed), loop=True)
+    settings = CaptureSettings(source.sample_rate, args.bit_depth)
+    pipeline = build_analysis_pipeline()
+    analysis = {"n_window": args.n_window, "sample_rate": source.sample_rate}
+    set_audio_source(source)
+    source.start()
+    try:
+        start_t = time.perf_counter()
+        for k in range(args.takes):
+            take_t = time.perf_counter()
+            for name in ("background_audio", "operation_audio"):
+                pipeline.set_source(name, settings.record(args.duration))
+            pipeline.run("isolated_bands", **analysis)
+            print(f"Take pair {k + 1}: {time.perf_counter() - take_t:.2f} s")
+        elapsed = time.perf_counter() - start_t
+    finally:
+        source.close()
+        set_audio_source(None)
+    audio_s = 2 * args.takes * args.duration
+    print(f"{audio_s:.0f} s of audio in {elapsed:.2f} s ({audio_s / elapsed:.1f}x real time)")
+
+
+if __name__ == "__main__":
+    main()
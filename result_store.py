@@ -0,0 +1,160 @@
+"""
+Binary result storage: one folder of .npy arrays per run.
+
+Each run folder gets a results/ subfolder with one .npy file per array (frequency bins,
+background, operation and isolated spectra, band centres and levels, ...) next to the
+run_metadata.json settings. Arrays load zero-copy through np.load(mmap_mode="r"), so
+overlaying many runs is limited by disk speed rather than CSV parsing. CSV files remain
+available as an export. Raw audio takes (e.g. triggered captures) are kept under takes/
+as .npy files with a JSON sidecar, or as compressed .wtz archives (see archive.py).
+"""
+import json
+import os
+import numpy as np
+
+from archive import ARCHIVE_EXT, TakeArchive
+from catalog import read_run_metadata, write_run_metadata
+from export_worker import atomic_write
+
+RESULTS_DIR = "results"
+TAKES_DIR = "takes"
+
+# Legacy CSV files and the result arrays they hold
+CSV_FILES = {
+    "background": "background_fft.csv",
+    "operation": "operation_fft.csv",
+    "isolated": "noise_isolated_fft.csv",
+    "band_spl": "noise_isolated_thirdoct.csv",
+}
+
+
+def results_path(folder):
+    return os.path.join(folder, RESULTS_DIR)
+
+
+def has_results(folder):
+    """True if the folder holds a binary result set."""
+    return os.path.isfile(os.path.join(results_path(folder), "freqs.npy"))
+
+
+def save_results(folder, metadata=None, **arrays):
+    """
+    Saves result arrays as results/<name>.npy and the settings as run_metadata.json.
+    Each file is written under a temporary name and renamed into place.
+
+    :param folder: Experiment folder
+    :param metadata: Run settings dict (written to run_metadata.json if given)
+    :param arrays: Named arrays, e.g. freqs=..., background=..., band_spl=...
+    """
+    path = results_path(folder)
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        if array is not None:
+            atomic_write(os.path.join(path, name + ".npy"), lambda tmp: np.save(tmp, np.asarray(array)))
+    if metadata is not None:
+        write_run_metadata(folder, metadata)
+    print(f"Results saved to {path}")
+
+
+def load_results(folder, names=None, mmap=True):
+    """
+    Loads a run's result arrays and settings.
+
+    Binary result sets are memory-mapped; folders with only the legacy CSV files are
+    parsed from the CSVs instead.
+
+    :param folder: Experiment folder
+    :param names: Arrays to load (e.g. ["freqs", "isolated"]), or None for all of them
+    :param mmap: Memory-map the .npy files (read-only) instead of reading them into memory
+    :return: Dict of arrays plus "metadata"
+    """
+    results = {}
+    path = results_path(folder)
+    if has_results(folder):
+        if names is None:
+            names = [f[:-4] for f in os.listdir(path) if f.endswith(".npy")]
+        for name in names:
+            filename = os.path.join(path, name + ".npy")
+            if os.path.isfile(filename):
+                results[name] = np.load(filename, mmap_mode="r" if mmap else None)
+    else:
+        for name, filename in CSV_FILES.items():
+            csv_path = os.path.join(folder, filename)
+            if not os.path.isfile(csv_path):
+                continue
+            data = np.loadtxt(csv_path, delimiter=",", skiprows=1, ndmin=2)
+            if name == "band_spl":
+                results["band_freqs"] = data[:, 0]
+            else:
+                results["freqs"] = data[:, 0]
+            results[name] = data[:, 1]
+    results["metadata"] = read_run_metadata(folder)
+    return results
+
+
+def export_csv(folder):
+    """Writes the legacy CSV files from a binary result set."""
+    from live_spectrogram import save_fft_data, save_third_octave_data
+
+    results = load_results(folder)
+    for name, filename in CSV_FILES.items():
+        if name not in results:
+            continue
+        path = os.path.join(folder, filename)
+        if name == "band_spl":
+            atomic_write(path, lambda tmp: save_third_octave_data(tmp, results["band_freqs"], results["band_spl"]))
+        else:
+            atomic_write(path, lambda tmp: save_fft_data(tmp, results["freqs"], results[name]))
+        print(f"CSV data saved to {path}")
+
+
+def save_take(folder, name, audio, metadata=None):
+    """
+    Saves a raw audio take as takes/<name>.npy with a <name>.json sidecar.
+
+    :param folder: Experiment folder
+    :param audio: Samples as captured (integer or float)
+    :param metadata: Trigger/capture settings for the sidecar
+    :return: Path of the .npy file
+    """
+    path = os.path.join(folder, TAKES_DIR)
+    os.makedirs(path, exist_ok=True)
+    filename = os.path.join(path, name + ".npy")
+    atomic_write(filename, lambda tmp: np.save(tmp, np.asarray(audio)))
+
+    def write_sidecar(tmp):
+        with open(tmp, "w") as f:
+            json.dump(dict(metadata or {}, dtype=str(np.asarray(audio).dtype)), f, indent=2)
+    atomic_write(os.path.join(path, name + ".json"), write_sidecar)
+    print(f"Take saved to {filename}")
+    return filename
+
+
+def load_take(filename, mmap=True, start=0, stop=None):
+    """
+    Loads a take saved by save_take, or its compressed archive.
+
+    Archives are read transparently: the .wtz is used when the .npy is gone (or named
+    directly), and only the chunks overlapping [start, stop) are decoded.
+
+    :param filename: Path of the .npy or .wtz file (or the path without extension)
+    :param start: First sample
+    :param stop: End sample (exclusive), or None for the end of the take
+    :return: (audio, metadata)
+    """
+    stem, ext = os.path.splitext(filename)
+    if ext not in (".npy", ARCHIVE_EXT):
+        stem, ext = filename, ".npy"
+    if ext == ARCHIVE_EXT or not os.path.isfile(stem + ".npy"):
+        archive = TakeArchive(stem + ARCHIVE_EXT)
+        audio, metadata = archive.read(start, stop), archive.metadata
+    else:
+        audio = np.load(stem + ".npy", mmap_mode="r" if mmap else None)[start:stop]
+        metadata = None
+    if os.path.isfile(stem + ".json") or metadata is None:
+        try:
+            with open(stem + ".json") as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = metadata or {}
+    return audio, metadata
@@ -1,4 +1,8 @@
 import sys
+if len(sys.argv) > 1 and sys.argv[1] == "--acquisition-worker":
+    # Frozen builds start the acquisition process through this executable
+    from acquisition_process import worker_main
+    sys.exit(worker_main(sys.argv[2:]))
 import os
 import csv
 import numpy as np
@@ -13,6 +17,8 @@ matplotlib.use("TkAgg")
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import matplotlib.pyplot as plt
 from matplotlib.pyplot import figure
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
 from helpers import show_serial_debug_window
 
 # Pillow for loading images
@@ -33,17 +39,36 @@ def resource_path(relative_path):
 
 
 from live_spectrogram import (
-    compute_fft,
-    compute_1_3_octave_band_spl,
+    compute_stft,
+    compute_fractional_octave_band_spl,
+    apply_calibration,
     save_fft_data,
     save_third_octave_data,
     setup_plot,
-    update_plot,
-    audio_callback,
-    audio_queue
+    update_plot
 )
 
 from com_port import ComPortHandler
+from tone_tracker import ToneTracker, save_tone_table
+from catalog import ExperimentCatalog, ISOLATION_DIFFERENCE, ISOLATION_COHERENT
+from result_store import save_results, save_take, load_take, export_csv, has_results
+from ensemble import TakeEnsemble, combined_stderr_db
+from coherence import coherent_isolation
+from sound_level_meter import SoundLevelMeter
+from telemetry_server import SpectrumServer
+from display_reducer import display_reducer
+from pipeline import build_analysis_pipeline
+from capture import CaptureSettings, SAMPLE_RATES, BIT_DEPTHS, set_audio_source, audio_source
+from steady_state import SteadyStateDetector
+from export_worker import ExportWorker, atomic_write, render_report, snapshot
+from capture_buffer import TriggeredCapture
+from timeline import timeline, now
+from acquisition_process import AcquisitionClient, WorkerComProxy
+from replay import ReplayComPort, open_replay
+from zoom_fft import ZoomFFT
+from noise_map import NoiseMap, NOISE_MAP_FILE, add_run_folder, run_id
+from level_stats import SpectrumStatistics, LN_PERCENTS
+from compare_runs import RunCache, RunComparison, SPECTRA, VISIBLE_RUNS, find_runs
 
 output_folder = None
 background_spl = None
@@ -53,17 +78,64 @@ BACKGROUND_FFT_FILE = None
 OPERATION_FFT_FILE = None
 NOISE_ISOLATED_FFT_FILE = None
 NOISE_ISOLATED_THIRDOCT_FILE = None
+TONES_FILE = None
 
 use_mic_calibration = False
 mic_calibration_data = None
+mic_calibration_file = None
+
+# Active capture settings (changed through "Microphone Settings")
+capture_settings = CaptureSettings()
+
+# Analysis settings (changed through "Re-analyse Last Capture")
+analysis_settings = {"n_window": 4096, "overlap": 0.5, "band_fraction": 3}
+spectrum_freqs = capture_settings.freqs(analysis_settings["n_window"])
+
+# Cached analysis stages; holds the last background/operation captures for re-analysis
+analysis_pipeline = build_analysis_pipeline()
+
+# Repeated takes of the current condition (one condition per experiment folder)
+background_takes = TakeEnsemble()
+operation_takes = TakeEnsemble()
+# L10/L50/L90 level histograms over every STFT frame of those takes
+take_statistics = {"background": None, "operation": None}
+
+# Live sound level meter (runs on its own input stream while enabled)
+sound_level_meter = None
+slm_stream = None
+triggered_capture = None  # Always-on pre-trigger capture, when enabled
+acquisition_client = None  # Acquisition worker process, when that mode is on
+replay_source = None  # Replayed take standing in for the microphone and serial port
+# Zoom-FFT band and the plots shown zoomed ("live" = live zoom stream over the operation plot)
+zoom_settings = {"f_low": 20.0, "f_high": 1905.0, "resolution": 0.5}
+zoom_plots = {"background": False, "operation": False, "isolated": False, "live": False}
+live_zoom = None
+live_zoom_stream = None
+noise_map = NoiseMap.load()  # Campaign speed-frequency map (saved next to the catalog)
+noise_map_view = None        # (window, canvas, image) while the noise map window is open
+run_cache = RunCache()       # Decoded results of compared runs, shared by comparison windows
+trigger_settings = {"pre_s": 2.0, "post_s": 3.0, "spl_threshold": None, "kurtosis_threshold": None, "speed_deviation": None}
+
+# Optional WebSocket server for remote monitoring
+monitor_server = None
+
+# Result of the last synchronous two-microphone recording (None in single-mic mode)
+coherence_result = None
+
+# Held while a take records, so two takes never share the audio blocks
+take_lock = threading.Lock()
+
+# BPF tone tracking on the operation recording
+tone_tracker = ToneTracker()
+operation_tones = None
+operation_flow = None  # Per-frame level of the operation take joined with air speed and PWM
 
 # ------------------------------
 # Global Variables for COM Port / Sensor Data
 # ------------------------------
 current_air_speed = None  # Latest air speed value (float) or "Sensor Missing"
-last_update_time = 0      # Time when a new value was received
-last_speed = None         # Last stable air speed
 current_pwm = None        # Latest PWM value received from Arduino
+steady_detector = SteadyStateDetector()  # Runs on every air speed sample
 
 # ------------------------------
 # Global Variables for Fan Speed Recording
@@ -86,11 +158,12 @@ time_speed_line = None
 # ------------------------------
 def set_output_folder(folder):
     """Updates global file paths based on the new experiment folder."""
-    global BACKGROUND_FFT_FILE, OPERATION_FFT_FILE, NOISE_ISOLATED_FFT_FILE, NOISE_ISOLATED_THIRDOCT_FILE
+    global BACKGROUND_FFT_FILE, OPERATION_FFT_FILE, NOISE_ISOLATED_FFT_FILE, NOISE_ISOLATED_THIRDOCT_FILE, TONES_FILE
     BACKGROUND_FFT_FILE = os.path.join(folder, "background_fft.csv")
     OPERATION_FFT_FILE = os.path.join(folder, "operation_fft.csv")
     NOISE_ISOLATED_FFT_FILE = os.path.join(folder, "noise_isolated_fft.csv")
     NOISE_ISOLATED_THIRDOCT_FILE = os.path.join(folder, "noise_isolated_thirdoct.csv")
+    TONES_FILE = os.path.join(folder, "operation_tones.csv")
 
 def start_new_experiment():
     from tkinter import simpledialog
@@ -107,6 +180,7 @@ def start_new_experiment():
     speed_series = []
     pwm_time_series = []
     pwm_series = []
+    reset_takes()
     messagebox.showinfo("New Experiment", f"New experiment folder created:\n{output_folder}")
 
 def reset_experiment():
@@ -116,19 +190,19 @@ def reset_experiment():
     except Exception as e:
         messagebox.showerror("Error", f"Could not stop the fan: {e}")
 
-    background_plot.set_data([], [])
+    display_reducer.clear_line(background_plot)
     axs[0,0].relim()
     axs[0,0].autoscale_view()
     axs[0,0].set_title("Background Noise FFT")
     
     # Clear Operation Noise FFT plot
-    operation_plot.set_data([], [])
+    display_reducer.clear_line(operation_plot)
     axs[0,1].relim()
     axs[0,1].autoscale_view()
     axs[0,1].set_title("Operation Noise FFT")
     
     # Clear Noise-Isolated FFT plot
-    noise_isolated_plot.set_data([], [])
+    display_reducer.clear_line(noise_isolated_plot)
     axs[1,0].relim()
     axs[1,0].autoscale_view()
     axs[1,0].set_title("Noise-Isolated FFT")
@@ -140,32 +214,118 @@ def reset_experiment():
     pwm_time_series = []
     pwm_series = []
     time_speed_line.set_data([], [])
+    reset_takes()
     canvas.draw()
 
+def reset_takes():
+    """Clears the background/operation take ensembles and their level statistics (any thread)."""
+    global background_takes, operation_takes
+    background_takes = TakeEnsemble(analysis_settings["band_fraction"])
+    operation_takes = TakeEnsemble(analysis_settings["band_fraction"])
+    take_statistics.update(background=None, operation=None)
+    root.after(0, update_ensemble_label)
+
+def switch_capture_mode(two_mic):
+    """
+    Starts the spectra over when a take's capture mode differs from the current one (record threads).
+
+    Single-mic background/operation takes and two-mic captures are never combined: the
+    spectra, take ensembles, statistics and pipeline sources of the other mode are dropped.
+    """
+    global background_spl, operation_spl, coherence_result, operation_tones, operation_flow
+    if two_mic:
+        changed = background_takes.count > 0 or operation_takes.count > 0
+    else:
+        changed = coherence_result is not None
+    if not changed:
+        return
+    background_spl = operation_spl = coherence_result = None
+    operation_tones = operation_flow = None
+    analysis_pipeline.sources.clear()
+    reset_takes()
+    for line in (background_plot, operation_plot, noise_isolated_plot):
+        root.after(0, lambda line=line: display_reducer.clear_line(line))
+
+def update_ensemble_label():
+    """Shows take counts and the widest band 95% CI; green once both are within tolerance."""
+    parts = []
+    for name, takes in (("Bkg", background_takes), ("Op", operation_takes)):
+        ci = takes.band_ci_db()
+        parts.append(f"{name}: {takes.count}" + (f" (\u00b1{ci:.2f} dB)" if np.isfinite(ci) else ""))
+    converged = background_takes.converged() and operation_takes.converged()
+    ensemble_status_label.config(
+        text="Takes  " + "  ".join(parts),
+        fg="lime green" if converged else ("white" if is_dark_mode else "black")
+    )
+
 # ------------------------------
 # FFT Recording Functions
 # ------------------------------
+def record_take(duration, channels=1):
+    """
+    Records a take in this process, or from the acquisition process's running stream when that mode is on.
+
+    Takes are recorded one at a time; a take requested during another waits for it to finish.
+    """
+    with take_lock:
+        return _record_take(duration, channels)
+
+def _record_take(duration, channels):
+    if acquisition_client is not None and channels <= acquisition_client.channels:
+        audio, t0 = acquisition_client.record(duration, channels)
+        if audio is not None:
+            timeline.start_stream("take", capture_settings.sample_rate)
+            timeline.add_audio_block("take", t0, len(audio))
+            return audio
+        print("The acquisition process could not record; recording locally.")
+    return capture_settings.record(duration, channels)
+
+def keep_raw_take(kind, audio):
+    """Queues a background/operation take for saving under takes/ when Keep Raw Takes is on."""
+    if len(audio) == 0:
+        print(f"The {kind} take is empty; no raw take kept.")
+        return
+    name = f"{kind}_" + datetime.datetime.now().strftime("%H-%M-%S")
+    info = {"kind": kind, "sample_rate": capture_settings.sample_rate, "bit_depth": capture_settings.bit_depth,
+            "record_time": time.time()}
+    # Telemetry received during the take, in seconds from its first sample (replayed by replay.py)
+    try:
+        t0 = timeline.sample_times("take", [0])[0]
+    except ValueError:
+        t0 = None
+    if t0 is not None:
+        end = t0 + len(audio) / capture_settings.sample_rate
+        info["telemetry"] = {}
+        for channel in ("air_speed", "pwm"):
+            t, v = timeline.series(channel)
+            inside = (t >= t0) & (t < end)
+            info["telemetry"][channel] = [[round(ts - t0, 4), float(value)] for ts, value in zip(t[inside], v[inside])]
+    export_worker.submit(name, save_take, output_folder, name, snapshot(audio)[0], info)
+
 def record_background():
     if output_folder is None:
         messagebox.showerror("Error", "Please start a new experiment first!")
         return
 
     def record():
-        global background_spl
-        stream = sd.InputStream(samplerate=96000, channels=1, callback=audio_callback, blocksize=4096)
-        collected_audio = []
-        with stream:
-            start_t = time.time()
-            while time.time() - start_t < 5:
-                while not audio_queue.empty():
-                    collected_audio.append(audio_queue.get().flatten())
-                time.sleep(0.01)
-        if collected_audio:
-            full_audio = np.concatenate(collected_audio)
-            freqs, background_spl = compute_fft(full_audio)
-            if use_mic_calibration and mic_calibration_data:
-                background_spl = apply_mic_calibration(freqs, background_spl)
-            root.after(0, lambda: update_plot(axs[0, 0], background_plot, background_spl, "Background Noise FFT", fig))
+        global background_spl, spectrum_freqs
+        full_audio = record_take(5, channels=1)
+        if keep_raw:
+            keep_raw_take("background", full_audio)
+        if len(full_audio) >= analysis_settings["n_window"]:
+            switch_capture_mode(two_mic=False)
+            analysis_pipeline.set_source("background_audio", full_audio)
+            freqs, background_spl = analysis_pipeline.run("background", **pipeline_settings())
+            spectrum_freqs = freqs
+            background_takes.add(freqs, background_spl)
+            add_take_statistics("background", *take_frames(full_audio)[::2])
+            background_spl = background_takes.spectrum.mean_db().astype(background_spl.dtype)
+            title = f"Background Noise FFT ({background_takes.count} takes)"
+            root.after(0, lambda: update_plot(axs[0, 0], background_plot, background_spl, title, fig, freqs=freqs))
+            root.after(0, update_zoom_plots)
+            publish_spectrum("background", freqs, background_spl)
+            root.after(0, update_ensemble_label)
+    keep_raw = keep_raw_takes_var.get()
     threading.Thread(target=record, daemon=True).start()
 
 def record_operation():
@@ -174,23 +334,189 @@ def record_operation():
         return
 
     def record():
-        global operation_spl
-        stream = sd.InputStream(samplerate=96000, channels=1, callback=audio_callback, blocksize=4096)
-        collected_audio = []
-        with stream:
-            start_t = time.time()
-            while time.time() - start_t < 5:
-                while not audio_queue.empty():
-                    collected_audio.append(audio_queue.get().flatten())
-                time.sleep(0.01)
-        if collected_audio:
-            full_audio = np.concatenate(collected_audio)
-            freqs, operation_spl = compute_fft(full_audio)
+        global operation_spl, operation_tones, operation_flow, spectrum_freqs
+        full_audio = record_take(5, channels=1)
+        if keep_raw:
+            keep_raw_take("operation", full_audio)
+        if len(full_audio) >= analysis_settings["n_window"]:
+            switch_capture_mode(two_mic=False)
+            analysis_pipeline.set_source("operation_audio", full_audio)
+            freqs, operation_spl = analysis_pipeline.run("operation", **pipeline_settings())
+            spectrum_freqs = freqs
+            frames = take_frames(full_audio)
+            operation_tones, operation_flow = track_tones(*frames)
+            add_take_statistics("operation", *frames[::2])
+            operation_takes.add(freqs, operation_spl)
+            operation_spl = operation_takes.spectrum.mean_db().astype(operation_spl.dtype)
+            title = f"Operation Noise FFT ({operation_takes.count} takes)"
+            root.after(0, lambda: update_plot(axs[0, 1], operation_plot, operation_spl, title, fig, freqs=freqs))
+            root.after(0, update_zoom_plots)
+            publish_spectrum("operation", freqs, operation_spl)
+            root.after(0, update_ensemble_label)
+    keep_raw = keep_raw_takes_var.get()
+    threading.Thread(target=record, daemon=True).start()
+
+def record_two_mic_isolation():
+    """
+    Records the measurement mic (input 1) and a reference mic at the fan (input 2) together
+    and splits the spectrum into fan-coherent and background parts from the one capture.
+    """
+    if output_folder is None:
+        messagebox.showerror("Error", "Please start a new experiment first!")
+        return
+
+    def record():
+        global background_spl, operation_spl, operation_tones, operation_flow, spectrum_freqs, coherence_result
+        full_audio = record_take(5, channels=2)
+        if len(full_audio) >= analysis_settings["n_window"]:
+            switch_capture_mode(two_mic=True)
+            result = coherent_isolation(full_audio, analysis_settings["n_window"], analysis_settings["overlap"],
+                                        fs=capture_settings.sample_rate)
+            freqs = spectrum_freqs = result["freqs"]
             if use_mic_calibration and mic_calibration_data:
-                operation_spl = apply_mic_calibration(freqs, operation_spl)
-            root.after(0, lambda: update_plot(axs[0, 1], operation_plot, operation_spl, "Operation Noise FFT", fig))
+                for key in ("total", "coherent", "incoherent"):
+                    result[key] = apply_mic_calibration(freqs, result[key])
+            coherence_result = result
+            background_spl = result["incoherent"]
+            operation_spl = result["total"]
+            operation_tones, operation_flow = track_tones(*take_frames(full_audio[:, 0]))
+            root.after(0, lambda: update_plot(axs[0, 0], background_plot, background_spl, "Background (Incoherent) FFT", fig, freqs=freqs))
+            root.after(0, lambda: update_plot(axs[0, 1], operation_plot, operation_spl, "Operation (Total) FFT", fig, freqs=freqs))
+            root.after(0, lambda: update_plot(axs[1, 0], noise_isolated_plot, result["coherent"], "Noise-Isolated (Coherent) FFT", fig, freqs=freqs))
+            for name, key in (("background", "incoherent"), ("operation", "total"), ("isolated", "coherent")):
+                publish_spectrum(name, freqs, result[key])
     threading.Thread(target=record, daemon=True).start()
 
+def slm_callback(indata, frames, time_info, status):
+    """Audio callback for the live sound level meter."""
+    if status:
+        print("SLM stream status:", status)
+    sound_level_meter.process(indata[:, 0])
+
+def toggle_sound_level_meter():
+    """Starts or stops the live sound level meter stream."""
+    global sound_level_meter, slm_stream
+    if slm_var.get():
+        sound_level_meter = SoundLevelMeter(capture_settings.sample_rate, 4096, slm_weighting_var.get())
+        try:
+            slm_stream = audio_source().InputStream(samplerate=capture_settings.sample_rate, channels=1, callback=slm_callback, blocksize=4096)
+            slm_stream.start()
+        except Exception as e:
+            slm_var.set(False)
+            sound_level_meter = None
+            messagebox.showerror("Error", f"Could not start the sound level meter:\n{e}")
+    else:
+        if slm_stream is not None:
+            slm_stream.close()
+        slm_stream = None
+        sound_level_meter = None
+        slm_status_label.config(text="Sound Level: off")
+
+def set_slm_weighting():
+    """Restarts the meter with the newly selected frequency weighting."""
+    if sound_level_meter is not None:
+        sound_level_meter.set_weighting(slm_weighting_var.get())
+
+def toggle_always_on_capture():
+    """Starts or stops the always-on capture stream with the current trigger settings."""
+    global triggered_capture
+    if triggered_capture is not None:
+        triggered_capture.stop()
+        triggered_capture = None
+    if not always_on_var.get():
+        return
+    if output_folder is None:
+        always_on_var.set(False)
+        messagebox.showerror("Error", "Please start a new experiment first!")
+        return
+    capture = TriggeredCapture(capture_settings, trigger_settings["pre_s"], trigger_settings["post_s"],
+                               spl_threshold=trigger_settings["spl_threshold"],
+                               kurtosis_threshold=trigger_settings["kurtosis_threshold"])
+    capture.on_capture = on_triggered_capture
+    deviation = trigger_settings["speed_deviation"]
+    if deviation is not None:
+        # Air speed leaving the steady window mean by more than the deviation (gust, stall)
+        capture.telemetry_condition = lambda v: steady_detector.steady and abs(v - steady_detector.mean) > deviation
+    try:
+        capture.start()
+    except Exception as e:
+        always_on_var.set(False)
+        messagebox.showerror("Error", f"Could not start the capture stream:\n{e}")
+        return
+    triggered_capture = capture
+
+def on_triggered_capture(audio, info):
+    """Capture callback (capture copy thread): queues the take for saving."""
+    info = dict(info, air_speed=current_air_speed if isinstance(current_air_speed, (int, float)) else None,
+                pwm=current_pwm if isinstance(current_pwm, (int, float)) else None)
+    # Millisecond resolution, so triggers in the same second do not overwrite each other
+    name = "take_" + datetime.datetime.fromtimestamp(info["trigger_time"]).strftime("%H-%M-%S-%f")[:-3] + "_" + info["reason"]
+    export_worker.submit(name, save_take, output_folder, name, audio, info)
+
+def trigger_capture_now():
+    if triggered_capture is None:
+        messagebox.showerror("Error", "Enable Always-On Capture first.")
+    elif not triggered_capture.trigger("manual"):
+        print("Capture already in progress")
+
+def open_trigger_settings():
+    """Dialog for the pre/post-trigger times and the automatic trigger thresholds (blank = off)."""
+    dialog = tk.Toplevel(root)
+    dialog.title("Capture Triggers")
+    dialog.configure(bg="#2b2b2b")
+
+    fields = (
+        ("pre_s", "Pre-Trigger (s):"),
+        ("post_s", "Post-Trigger (s):"),
+        ("spl_threshold", "SPL Threshold (dB, blank = off):"),
+        ("kurtosis_threshold", "Spectral Kurtosis Threshold (blank = off):"),
+        ("speed_deviation", "Air Speed Deviation (m/s, blank = off):"),
+    )
+    entries = {}
+    for key, label in fields:
+        tk.Label(dialog, text=label, fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+        entry = tk.Entry(dialog, bg="#3a3a3a", fg="white", insertbackground="white")
+        if trigger_settings[key] is not None:
+            entry.insert(0, str(trigger_settings[key]))
+        entry.pack(pady=(0, 5))
+        entries[key] = entry
+
+    def apply():
+        try:
+            values = {key: float(entry.get()) if entry.get().strip() else None for key, entry in entries.items()}
+            if values["pre_s"] is None or values["post_s"] is None or values["pre_s"] < 0 or values["post_s"] <= 0:
+                raise ValueError("Pre- and post-trigger times are required.")
+        except ValueError as e:
+            messagebox.showerror("Input Error", str(e))
+            return
+        trigger_settings.update(values)
+        if triggered_capture is not None:
+            toggle_always_on_capture()  # Restart with the new settings
+        dialog.destroy()
+
+    tk.Button(dialog, text="Apply", command=apply, bg="#3a3a3a", fg="white").pack(pady=(5, 10))
+
+def toggle_monitor_server():
+    """Starts or stops the local WebSocket monitoring server."""
+    global monitor_server
+    if monitor_var.get():
+        try:
+            monitor_server = SpectrumServer()
+            monitor_server.start()
+            messagebox.showinfo("Monitoring Server", f"Open http://localhost:{monitor_server.port}/ in a browser.")
+        except Exception as e:
+            monitor_var.set(False)
+            monitor_server = None
+            messagebox.showerror("Error", f"Could not start the monitoring server:\n{e}")
+    elif monitor_server is not None:
+        monitor_server.stop()
+        monitor_server = None
+
+def publish_spectrum(name, freqs, spl):
+    """Sends a spectrum to remote monitors, if the server is running."""
+    if monitor_server is not None:
+        monitor_server.publish_spectrum(name, freqs, spl)
+
 def compute_noise_isolation():
     if output_folder is None:
         messagebox.showerror("Error", "Please start a new experiment first!")
@@ -198,44 +524,517 @@ def compute_noise_isolation():
     if background_spl is None or operation_spl is None:
         messagebox.showerror("Error", "Please record both background and operation noise first!")
         return
-    noise_isolated_spl = operation_spl - background_spl
-    update_plot(axs[1, 0], noise_isolated_plot, noise_isolated_spl, "Noise-Isolated FFT", fig)
-    freqs = np.fft.rfftfreq(4096, 1 / 96000)
-    save_fft_data(BACKGROUND_FFT_FILE, freqs, background_spl)
-    save_fft_data(OPERATION_FFT_FILE, freqs, operation_spl)
-    save_fft_data(NOISE_ISOLATED_FFT_FILE, freqs, noise_isolated_spl)
-    center_freqs, thirdoct_spl = compute_1_3_octave_band_spl(freqs, noise_isolated_spl)
-    save_third_octave_data(NOISE_ISOLATED_THIRDOCT_FILE, center_freqs, thirdoct_spl)
-    fig.savefig(os.path.join(output_folder, "fft_analysis.png"), dpi=300)
-    messagebox.showinfo("Completed", f"Analysis complete! Results saved in {output_folder}")
+    freqs = spectrum_freqs
+    if coherence_result is not None:
+        # Two-mic mode: the coherent output power is the fan's contribution
+        noise_isolated_spl = coherence_result["coherent"]
+    else:
+        noise_isolated_spl = operation_spl - background_spl
+    update_plot(axs[1, 0], noise_isolated_plot, noise_isolated_spl, "Noise-Isolated FFT", fig, freqs=freqs)
+    publish_spectrum("isolated", freqs, noise_isolated_spl)
+    update_zoom_plots()
+    center_freqs, thirdoct_spl = compute_fractional_octave_band_spl(freqs, noise_isolated_spl, analysis_settings["band_fraction"])
+
+    # Standard errors across repeated takes (nan until a condition has two takes)
+    background_se = operation_se = isolated_se = band_se = None
+    if coherence_result is None and background_takes.count and operation_takes.count:
+        background_se = background_takes.spectrum.stderr_db()
+        operation_se = operation_takes.spectrum.stderr_db()
+        isolated_se = combined_stderr_db(background_se, operation_se)
+        band_se = combined_stderr_db(background_takes.bands.stderr_db(), operation_takes.bands.stderr_db())
+
+    metadata = run_metadata()
+    metadata["background_takes"] = background_takes.count
+    metadata["operation_takes"] = operation_takes.count
+    # "isolated" is a dB difference (single mic) or an absolute coherent output power (two mics)
+    metadata["isolation"] = ISOLATION_DIFFERENCE if coherence_result is None else ISOLATION_COHERENT
+    # Hand snapshots of the results to the export worker; the UI carries on immediately
+    arrays = dict(zip(
+        ("freqs", "background", "operation", "isolated", "band_freqs", "band_spl", "tones", "coherence",
+         "background_stderr", "operation_stderr", "isolated_stderr", "band_stderr"),
+        snapshot(freqs, background_spl, operation_spl, noise_isolated_spl, center_freqs, thirdoct_spl,
+                 operation_tones, None if coherence_result is None else coherence_result["coherence"],
+                 background_se, operation_se, isolated_se, band_se)
+    ))
+    if operation_flow is not None:
+        for key, values in operation_flow.items():
+            arrays["flow_" + key] = values.copy()
+    zoom = zoom_spectrum("isolated") if zoom_plots["isolated"] else None
+    if zoom is not None:
+        arrays["zoom_freqs"], arrays["isolated_zoom"] = snapshot(*zoom)
+    # Statistical spectra (levels exceeded 10/50/90 % of the frames) alongside the mean spectra
+    for name, stats in take_statistics.items():
+        if coherence_result is None and stats is not None and np.array_equal(stats.freqs, freqs):
+            arrays["ln_percents"] = np.array(LN_PERCENTS)
+            arrays[name + "_ln"], arrays[name + "_band_ln"] = stats.levels(LN_PERCENTS)
+    csv_files = None
+    if export_csv_var.get():
+        csv_files = {"background": BACKGROUND_FFT_FILE, "operation": OPERATION_FFT_FILE, "isolated": NOISE_ISOLATED_FFT_FILE,
+                     "band_spl": NOISE_ISOLATED_THIRDOCT_FILE, "tones": TONES_FILE}
+    export_worker.submit(f"results to {metadata['name']}", export_analysis,
+                         output_folder, metadata, arrays, csv_files, capture_settings.sample_rate / 2)
+    add_to_noise_map(freqs, noise_isolated_spl, metadata["isolation"])
+
+def add_to_noise_map(freqs, spl, isolation):
+    """Merges a noise-isolated spectrum into the noise map at the take's mean air speed."""
+    if not noise_map.accepts(isolation):
+        print(f"Noise map: it holds {noise_map.isolation} spectra, {isolation} spectrum not added")
+        return
+    speeds = operation_flow["air_speed"] if operation_flow is not None else np.empty(0)
+    speeds = speeds[np.isfinite(speeds)]
+    if len(speeds):
+        air_speed = float(np.mean(speeds))
+    elif isinstance(current_air_speed, (int, float)):
+        air_speed = current_air_speed
+    else:
+        print("Noise map: no air speed reading, spectrum not added")
+        return
+    if run_id(output_folder) in noise_map.merged:
+        print("Noise map: this experiment is already in the map, spectrum not added again")
+        return
+    if noise_map.add(air_speed, freqs, spl, run_id(output_folder), isolation) is None:
+        print(f"Noise map: {air_speed:.2f} m/s is outside the speed axis")
+        return
+    export_worker.submit("noise map", noise_map.copy().save, NOISE_MAP_FILE)
+    refresh_noise_map_view()
+
+def refresh_noise_map_view():
+    """Updates the noise map image in place, if its window is open."""
+    if noise_map_view is None:
+        return
+    _, view_canvas, image = noise_map_view
+    levels = noise_map.levels().T
+    image.set_data(levels)
+    kind = "two-mic coherent" if noise_map.isolation == ISOLATION_COHERENT else "single-mic"
+    image.axes.set_title(f"Noise-Isolated SPL vs. Air Speed ({kind})", color="white")
+    if np.isfinite(levels).any():
+        image.set_clim(np.nanpercentile(levels, 1), np.nanpercentile(levels, 99.5))
+    view_canvas.draw_idle()
+
+def open_noise_map_window():
+    """Shows the speed-frequency noise map; merged spectra update the image in place."""
+    global noise_map_view
+    if noise_map_view is not None:
+        noise_map_view[0].lift()
+        return
+    window = tk.Toplevel(root)
+    window.title("Noise Map")
+    window.configure(bg="#2b2b2b")
+    map_fig = Figure(figsize=(8, 6), facecolor="#000000")
+    ax = map_fig.add_subplot(111)
+    ax.set_facecolor("#000000")
+    # Frequency on a log axis: the image rows are log-spaced cells, drawn against log10(f)
+    extent = [noise_map.speed_edges[0], noise_map.speed_edges[-1],
+              np.log10(noise_map.freq_edges[0]), np.log10(noise_map.freq_edges[-1])]
+    image = ax.imshow(noise_map.levels().T, origin="lower", aspect="auto", extent=extent,
+                      cmap="inferno", interpolation="nearest")
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda v, _: f"{10 ** v:g}"))
+    ax.set_ylim(np.log10(20), np.log10(capture_settings.sample_rate / 2))
+    ax.set_xlabel("Air Speed (m/s)", color="white")
+    ax.set_ylabel("Frequency (Hz)", color="white")
+    ax.set_title("Noise-Isolated SPL vs. Air Speed", color="white")
+    ax.tick_params(axis="both", colors="white")
+    colorbar = map_fig.colorbar(image, ax=ax)
+    colorbar.set_label("SPL (dB)", color="white")
+    colorbar.ax.tick_params(colors="white")
+    map_canvas = FigureCanvasTkAgg(map_fig, master=window)
+    map_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    buttons = tk.Frame(window, bg="#2b2b2b")
+    buttons.pack(pady=5)
+    tk.Button(buttons, text="Add Experiments...", command=add_experiments_to_noise_map,
+              bg="#3a3a3a", fg="white").pack(side=tk.LEFT, padx=5)
+    tk.Button(buttons, text="Clear Map", command=clear_noise_map, bg="#3a3a3a", fg="white").pack(side=tk.LEFT, padx=5)
+
+    def close():
+        global noise_map_view
+        noise_map_view = None
+        window.destroy()
+
+    window.protocol("WM_DELETE_WINDOW", close)
+    noise_map_view = (window, map_canvas, image)
+    refresh_noise_map_view()
+
+def add_experiments_to_noise_map():
+    """Merges the saved runs in a folder of experiments into the noise map."""
+    folder = filedialog.askdirectory(title="Select Folder Containing Experiments")
+    if not folder:
+        return
+    runs = [os.path.join(folder, name) for name in sorted(os.listdir(folder))]
+    runs = [run for run in runs if os.path.isdir(run)] or [folder]
+    added = 0
+    for run in runs:
+        try:
+            added += add_run_folder(noise_map, run) is not None
+        except (OSError, ValueError) as e:
+            print(f"Noise map: {run} skipped ({e})")
+    export_worker.submit("noise map", noise_map.copy().save, NOISE_MAP_FILE)
+    refresh_noise_map_view()
+    messagebox.showinfo("Noise Map", f"Added {added} runs to the noise map.")
+
+def clear_noise_map():
+    global noise_map
+    if not messagebox.askyesno("Noise Map", "Clear the whole noise map?"):
+        return
+    noise_map = NoiseMap()
+    export_worker.submit("noise map", noise_map.copy().save, NOISE_MAP_FILE)
+    refresh_noise_map_view()
+
+def open_compare_window():
+    """Overlays (or differences against a reference) the saved runs in a folder of experiments."""
+    folder = filedialog.askdirectory(title="Select Folder Containing Experiments")
+    if not folder:
+        return
+    runs = find_runs(folder)
+    if not runs:
+        messagebox.showerror("Error", "No saved runs found in that folder.")
+        return
+    comparison = RunComparison(runs, run_cache)
+    labels = [os.path.basename(os.path.normpath(run)) for run in runs]
+
+    window = tk.Toplevel(root)
+    window.title(f"Compare Runs ({len(runs)})")
+    window.configure(bg="#2b2b2b")
+    compare_fig = Figure(figsize=(10, 7), facecolor="#000000")
+    ax, band_ax = compare_fig.subplots(2, 1)
+    for axis in (ax, band_ax):
+        axis.set_facecolor("#000000")
+        axis.set_xscale("log")
+        axis.set_xlabel("Frequency (Hz)", color="white")
+        axis.set_ylabel("SPL (dB)", color="white")
+        axis.tick_params(axis="both", colors="white")
+        axis.grid(True, which="both", color="#444444", linewidth=0.5)
+    ax.set_xlim(20, capture_settings.sample_rate / 2)
+    band_ax.set_xlim(20, 20000)
+    compare_fig.tight_layout()
+    compare_canvas = FigureCanvasTkAgg(compare_fig, master=window)
+    compare_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+    colors = plt.cm.tab10(np.arange(VISIBLE_RUNS) % 10)
+    lines = [ax.plot([], [], color=c, linewidth=0.8)[0] for c in colors]
+    band_lines = [band_ax.plot([], [], color=c, marker="o", markersize=3)[0] for c in colors]
+
+    controls = tk.Frame(window, bg="#2b2b2b")
+    controls.pack(fill=tk.X, pady=5)
+    spectrum_var = tk.StringVar(value=SPECTRA[0])
+    mode_var = tk.StringVar(value="Overlay")
+    reference_var = tk.StringVar(value=labels[0])
+    start_var = tk.IntVar(value=0)
+
+    def redraw(*_):
+        reference = runs[labels.index(reference_var.get())] if mode_var.get() == "Difference" else None
+        visible = [run for run in comparison.visible(start_var.get(), VISIBLE_RUNS) if run != reference]
+        name = spectrum_var.get()
+        try:
+            reduced = comparison.lines_for_axes(ax, visible, name, reference)
+            for i, (line, band_line) in enumerate(zip(lines, band_lines)):
+                run, xy = reduced[i] if i < len(reduced) else (None, None)
+                line.set_data(*(xy if xy is not None else ([], [])))
+                band_freqs, band_spl = comparison.levels(run, name, reference, bands=True) if run else (None, None)
+                band_line.set_data(*((band_freqs, band_spl) if band_freqs is not None else ([], [])))
+                label = comparison.name(run) if run else "_nolegend_"
+                line.set_label(label)
+                band_line.set_label(label)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not load runs:\n{e}")
+            return
+        what = "Energetic Difference vs. " + reference_var.get() if reference else "SPL"
+        ax.set_title(f"{name.capitalize()} FFT: {what}", color="white")
+        band_ax.set_title("Noise-Isolated Bands: " + what, color="white")
+        for axis in (ax, band_ax):
+            axis.relim()
+            axis.autoscale_view(scalex=False)
+            legend = axis.legend(fontsize=7, loc="upper right", facecolor="#2b2b2b", labelcolor="white")
+            legend.get_frame().set_edgecolor("#444444")
+        compare_canvas.draw_idle()
+
+    tk.Label(controls, text="Spectrum:", bg="#2b2b2b", fg="white").pack(side=tk.LEFT, padx=(10, 2))
+    tk.OptionMenu(controls, spectrum_var, *SPECTRA, command=redraw).pack(side=tk.LEFT)
+    tk.OptionMenu(controls, mode_var, "Overlay", "Difference", command=redraw).pack(side=tk.LEFT, padx=5)
+    tk.Label(controls, text="Reference:", bg="#2b2b2b", fg="white").pack(side=tk.LEFT, padx=(10, 2))
+    tk.OptionMenu(controls, reference_var, *labels, command=redraw).pack(side=tk.LEFT)
+    if len(runs) > VISIBLE_RUNS:
+        tk.Label(controls, text="First Run:", bg="#2b2b2b", fg="white").pack(side=tk.LEFT, padx=(10, 2))
+        tk.Scale(controls, from_=0, to=len(runs) - VISIBLE_RUNS, orient=tk.HORIZONTAL, variable=start_var,
+                 command=redraw, bg="#3a3a3a", fg="white", highlightthickness=0, length=300).pack(side=tk.LEFT, fill=tk.X, expand=True)
+    redraw()
+
+def export_analysis(folder, metadata, arrays, csv_files, f_max):
+    """Export worker job: result arrays, optional CSVs, the catalog entry and the report figure."""
+    save_results(folder, metadata, **arrays)
+    if csv_files:
+        for name in ("background", "operation", "isolated"):
+            atomic_write(csv_files[name], lambda tmp: save_fft_data(tmp, arrays["freqs"], arrays[name], arrays[name + "_stderr"]))
+            print(f"FFT data saved to {csv_files[name]}")
+        atomic_write(csv_files["band_spl"], lambda tmp: save_third_octave_data(tmp, arrays["band_freqs"], arrays["band_spl"], arrays["band_stderr"]))
+        print(f"1/3 Octave data saved to {csv_files['band_spl']}")
+        if arrays["tones"] is not None:
+            atomic_write(csv_files["tones"], lambda tmp: save_tone_table(tmp, arrays["tones"]))
+            print(f"Tone table saved to {csv_files['tones']}")
+    update_catalog(folder, metadata, arrays["band_freqs"], arrays["band_spl"])
+    speed = f", {metadata['air_speed']} m/s" if metadata["air_speed"] is not None else ""
+    render_report(
+        os.path.join(folder, "fft_analysis.png"), arrays["freqs"],
+        [("Background Noise FFT", arrays["background"], "violet"),
+         ("Operation Noise FFT", arrays["operation"], "aquamarine"),
+         ("Noise-Isolated FFT", arrays["isolated"], "gold")],
+        arrays["band_freqs"], arrays["band_spl"], title=metadata["name"] + speed, f_max=f_max
+    )
+
+def show_export_status(message):
+    """Export worker status callback (worker thread)."""
+    root.after(0, lambda: export_status_label.config(text=message))
+
+def run_metadata():
+    """Settings and operating point of the current run, as saved with the results."""
+    import live_spectrogram
+    return {
+        "name": os.path.basename(os.path.abspath(output_folder)),
+        "saved_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "air_speed": current_air_speed if isinstance(current_air_speed, (int, float)) else None,
+        "pwm": current_pwm if isinstance(current_pwm, (int, float)) else None,
+        "calibration": mic_calibration_file if use_mic_calibration and mic_calibration_data else "manual",
+        "n_window": analysis_settings["n_window"],
+        "overlap": analysis_settings["overlap"],
+        "band_fraction": analysis_settings["band_fraction"],
+        "sample_rate": capture_settings.sample_rate,
+        "bit_depth": capture_settings.bit_depth,
+        "precision": live_spectrogram.PRECISION,
+        "bpf": tone_tracker.bpf,
+    }
+
+def update_catalog(folder, metadata, center_freqs, band_spl):
+    """Indexes the saved run in the experiment catalog."""
+    try:
+        catalog = ExperimentCatalog()
+        catalog.add_run(folder, metadata, center_freqs, band_spl)
+        catalog.close()
+    except Exception as e:
+        print("Error updating experiment catalog:", e)
+
+def import_experiments_to_catalog():
+    """Back-fills the catalog from a folder of existing experiments."""
+    folder = filedialog.askdirectory(title="Select Folder Containing Experiments")
+    if not folder:
+        return
+    try:
+        catalog = ExperimentCatalog()
+        count = catalog.import_folders(folder)
+        catalog.close()
+        messagebox.showinfo("Experiment Catalog", f"Imported {count} runs into the catalog.")
+    except Exception as e:
+        messagebox.showerror("Error", f"Catalog import failed:\n{e}")
+
+def export_results_to_csv():
+    """Writes the CSV files for a run saved in the binary result format."""
+    folder = filedialog.askdirectory(title="Select Experiment Folder")
+    if not folder:
+        return
+    if not has_results(folder):
+        messagebox.showerror("Error", "No binary results found in this folder.")
+        return
+    try:
+        export_csv(folder)
+        messagebox.showinfo("Export Complete", f"CSV files written to {folder}")
+    except Exception as e:
+        messagebox.showerror("Error", f"CSV export failed:\n{e}")
+
+def take_frames(audio):
+    """
+    STFT frames of a recording, mic-calibrated when calibration is on.
+
+    :return: freqs, frame times (s) and (frames, bins) dB SPL
+    """
+    freqs, times, frames_db = compute_stft(audio, analysis_settings["n_window"], analysis_settings["overlap"],
+                                           fs=capture_settings.sample_rate)
+    if use_mic_calibration and mic_calibration_data:
+        frames_db = apply_mic_calibration(freqs, frames_db)
+    return freqs, times, frames_db
+
+def track_tones(freqs, times, frames_db):
+    """
+    Runs the BPF tone tracker over every STFT frame of a recording (see take_frames).
+
+    :return: Tone table and the per-frame flow join (see join_flow)
+    """
+    tone_tracker.reset()
+    tones = tone_tracker.update(freqs, frames_db, times, pwm=current_pwm, air_speed=current_air_speed)
+    if tone_tracker.bpf is not None:
+        print(f"Tracked BPF: {tone_tracker.bpf:.1f} Hz ({len(tones)} tone detections)")
+    return tones, join_flow(times, frames_db)
+
+def add_take_statistics(name, freqs, frames_db):
+    """Counts a take's STFT frames into the condition's level statistics (restarted if the bins changed)."""
+    stats = take_statistics[name]
+    if stats is None or not np.array_equal(stats.freqs, freqs) or stats.band_fraction != analysis_settings["band_fraction"]:
+        stats = take_statistics[name] = SpectrumStatistics(freqs, analysis_settings["band_fraction"])
+    stats.add(frames_db)
+
+def join_flow(times, frames_db):
+    """
+    Overall level of each STFT frame of the last take joined with air speed and PWM on the
+    common clock: dict of "time" (s, monotonic), "spl", "air_speed" and "pwm" arrays.
+    """
+    frame_times = timeline.sample_times("take", times * capture_settings.sample_rate)
+    flow = timeline.join(frame_times, ("air_speed", "pwm"), max_gap=1.0)
+    flow["spl"] = 10 * np.log10(np.sum(10 ** (frames_db / 10), axis=-1))
+    if np.count_nonzero(np.isfinite(flow["air_speed"])) > 2:
+        valid = np.isfinite(flow["air_speed"])
+        print(f"Level vs air speed correlation over the take: "
+              f"{np.corrcoef(flow['spl'][valid], flow['air_speed'][valid])[0, 1]:.2f}")
+    return flow
+
+def pipeline_settings():
+    """Current analysis settings in the form the analysis pipeline takes them."""
+    import live_spectrogram
+    return {
+        "n_window": analysis_settings["n_window"],
+        "overlap": analysis_settings["overlap"],
+        "precision": live_spectrogram.PRECISION,
+        "sample_rate": capture_settings.sample_rate,
+        "calibration": mic_calibration_data if use_mic_calibration and mic_calibration_data else None,
+        "band_fraction": analysis_settings["band_fraction"],
+        "zoom": (zoom_settings["f_low"], zoom_settings["f_high"], zoom_settings["resolution"]),
+    }
+
+def reanalyse_last_capture(n_window, overlap, band_fraction, calibrated):
+    """
+    Re-runs the analysis of the last background/operation capture with new settings.
+
+    Only the pipeline stages affected by the changed settings are recomputed. The new
+    settings also apply to later recordings, so the take ensembles and level statistics
+    restart from the re-analysed capture (after confirmation if they hold earlier takes).
+    """
+    global background_spl, operation_spl, spectrum_freqs, coherence_result, use_mic_calibration
+    if not (analysis_pipeline.has_source("background_audio") and analysis_pipeline.has_source("operation_audio")):
+        messagebox.showerror("Error", "Please record both background and operation noise first!")
+        return
+    if max(background_takes.count, operation_takes.count) > 1 and not messagebox.askyesno(
+            "Re-analyse",
+            f"The current condition has {background_takes.count} background and {operation_takes.count} operation takes.\n"
+            "Re-analysing replaces them (and their L10/L50/L90 statistics) with the last capture only.\n\nContinue?"):
+        return
+    analysis_settings.update(n_window=n_window, overlap=overlap, band_fraction=band_fraction)
+    use_mic_calibration = calibrated and mic_calibration_data is not None
+
+    settings = pipeline_settings()
+    misses = analysis_pipeline.misses
+    start_t = time.perf_counter()
+    freqs, background_spl = analysis_pipeline.run("background", **settings)
+    _, operation_spl = analysis_pipeline.run("operation", **settings)
+    _, isolated = analysis_pipeline.run("isolated", **settings)
+    elapsed = time.perf_counter() - start_t
+    print(f"Re-analysed in {elapsed * 1000:.0f} ms ({analysis_pipeline.misses - misses} stages recomputed)")
+
+    spectrum_freqs = freqs
+    coherence_result = None
+    reset_takes()
+    background_takes.add(freqs, background_spl)
+    operation_takes.add(freqs, operation_spl)
+    for name in ("background", "operation"):
+        add_take_statistics(name, *take_frames(analysis_pipeline.run(name + "_audio"))[::2])
+    update_ensemble_label()
+
+    update_plot(axs[0, 0], background_plot, background_spl, "Background Noise FFT (re-analysed)", fig, freqs=freqs)
+    update_plot(axs[0, 1], operation_plot, operation_spl, "Operation Noise FFT (re-analysed)", fig, freqs=freqs)
+    update_plot(axs[1, 0], noise_isolated_plot, isolated, "Noise-Isolated FFT (re-analysed)", fig, freqs=freqs)
+    for name, spl in (("background", background_spl), ("operation", operation_spl), ("isolated", isolated)):
+        publish_spectrum(name, freqs, spl)
+    update_zoom_plots()
+
+def open_reanalysis_dialog():
+    """Dialog for re-analysing the last capture with a different window, overlap, calibration or band fraction."""
+    dialog = tk.Toplevel(root)
+    dialog.title("Re-analyse Last Capture")
+    dialog.configure(bg="#2b2b2b")
+
+    n_window_var = tk.StringVar(value=str(analysis_settings["n_window"]))
+    overlap_var = tk.StringVar(value=str(analysis_settings["overlap"]))
+    fraction_var = tk.StringVar(value=str(analysis_settings["band_fraction"]))
+    calibrated_var = tk.BooleanVar(value=bool(use_mic_calibration and mic_calibration_data))
+
+    for label, var, options in (
+        ("FFT Length:", n_window_var, ("1024", "2048", "4096", "8192", "16384", "32768", "65536")),
+        ("Overlap:", overlap_var, ("0.0", "0.25", "0.5", "0.75")),
+        ("Bands per Octave:", fraction_var, ("1", "3", "6", "12")),
+    ):
+        tk.Label(dialog, text=label, fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+        dropdown = tk.OptionMenu(dialog, var, *options)
+        dropdown.config(bg="#3a3a3a", fg="white", highlightthickness=0)
+        dropdown.pack(pady=(0, 5))
+
+    tk.Checkbutton(
+        dialog, text="Apply Microphone Calibration", variable=calibrated_var,
+        state=tk.NORMAL if mic_calibration_data else tk.DISABLED,
+        fg="white", bg="#2b2b2b", selectcolor="#3a3a3a", activebackground="#2b2b2b"
+    ).pack(pady=5)
+
+    def apply():
+        reanalyse_last_capture(int(n_window_var.get()), float(overlap_var.get()),
+                               int(fraction_var.get()), calibrated_var.get())
+
+    tk.Button(dialog, text="Apply", command=apply, bg="#3a3a3a", fg="white").pack(pady=(5, 10))
+
+def reanalyse_take_files():
+    """
+    Loads a saved background and operation take (.npy or .wtz archive) as the pipeline
+    sources and opens the re-analysis dialog on them.
+    """
+    takes = []
+    for kind in ("Background", "Operation"):
+        filename = filedialog.askopenfilename(
+            title=f"Select {kind} Take",
+            initialdir=os.path.join(output_folder, "takes") if output_folder else None,
+            filetypes=[("Takes", "*.npy *.wtz"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            audio, metadata = load_take(filename)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not load the take:\n{e}")
+            return
+        rate = metadata.get("sample_rate", capture_settings.sample_rate)
+        if rate != capture_settings.sample_rate:
+            messagebox.showerror("Error", f"{os.path.basename(filename)} was recorded at {rate} Hz.\n"
+                                          f"Set the microphone sample rate to {rate} Hz first.")
+            return
+        if audio.ndim > 1:
+            audio = audio[:, 0]
+        takes.append(np.ascontiguousarray(audio))
+    analysis_pipeline.set_source("background_audio", takes[0])
+    analysis_pipeline.set_source("operation_audio", takes[1])
+    open_reanalysis_dialog()
 
 # ------------------------------
 # COM Port Fan Speed & PWM Section
 # ------------------------------
 def handle_serial_data(data):
-    global current_air_speed, last_update_time, last_speed, current_pwm, debug_window
+    global current_air_speed, current_pwm, debug_window
     try:
         data = data.strip()
         if data.startswith("AD"):
             try:
                 sensorValue = float(data[2:])
                 current_air_speed = sensorValue
-                if last_speed is None or abs(sensorValue - last_speed) > 0.1:
-                    last_speed = sensorValue
-                    last_update_time = time.time()
+                t = com_handler.last_line_time or now()
+                timeline.add("air_speed", sensorValue, t)
+                if triggered_capture is not None:
+                    triggered_capture.on_telemetry(sensorValue)
+                steady_detector.update(t, sensorValue)
             except ValueError:
                 current_air_speed = data
         elif data.startswith("PWM"):
             try:
                 current_pwm = int(data[3:])
+                timeline.add("pwm", current_pwm, com_handler.last_line_time)
                 root.after(0, lambda: pwm_status_label.config(text=f"PWM: {current_pwm}"))
             except ValueError:
                 current_pwm = data
         else:
             print("Arduino Console:", data)
         # Duplicate the data into the serial debug window
-        if debug_window is not None and debug_window.winfo_exists():
-            root.after(0, lambda: debug_window.append_data(data))
+        if debug_window is not None and not debug_window.closed:
+            debug_window.append_data(data)
         root.after(0, update_fan_speed_label)
     except Exception as e:
         print("Error in handle_serial_data:", e)
@@ -243,13 +1042,13 @@ def handle_serial_data(data):
 def update_fan_speed_label():
     """
     Updates the air speed status label.
-    If the value has not changed significantly for 3 seconds, append "(Stable)".
+    Appends "(Stable)" while the steady-state detector reports settled flow.
     """
     if current_air_speed == "Sensor Missing":
         fan_speed_status_label.config(text="Air Speed: Sensor Missing")
     else:
         if isinstance(current_air_speed, (int, float, np.float64)):
-            if time.time() - last_update_time >= 3:
+            if steady_detector.steady:
                 fan_speed_status_label.config(text=f"Air Speed: {current_air_speed} (Stable)")
             else:
                 fan_speed_status_label.config(text=f"Air Speed: {current_air_speed}")
@@ -261,6 +1060,8 @@ def set_fan_speed():
     try:
         speed_val = float(fan_speed_entry.get())
         com_handler.send_fan_speed(speed_val)
+        steady_detector.mark_step(now(), speed_val)
+        timeline.add("set_speed", speed_val)
     except ValueError:
         messagebox.showerror("Input Error", "Please enter a valid speed for fan speed.")
     except Exception as e:
@@ -268,6 +1069,17 @@ def set_fan_speed():
 
 def periodic_fan_check():
     update_fan_speed_label()
+    if sound_level_meter is not None:
+        slm_status_label.config(text=sound_level_meter.summary())
+    if monitor_server is not None:
+        monitor_server.publish_telemetry(
+            current_air_speed, current_pwm,
+            sound_level_meter.level if sound_level_meter is not None else None
+        )
+    if acquisition_client is not None:
+        update_live_spectrum()
+    if live_zoom is not None:
+        update_live_zoom()
     if experiment_start_time is not None:
         t = time.time() - experiment_start_time
 
@@ -288,10 +1100,34 @@ def periodic_fan_check():
     canvas.draw()
     root.after(125, periodic_fan_check)
 
+def on_flow_settled(entry):
+    """Steady-state detector callback (serial thread): hands the settle to the Tk thread."""
+    root.after(0, lambda: handle_flow_settled(entry))
+
+def handle_flow_settled(entry):
+    """Logs a settle and runs any armed recording (Tk thread)."""
+    print(f"Air speed settled at {entry['mean']:.2f} m/s after {entry['settle_s']:.1f} s")
+    if entry["commanded"] and output_folder is not None:
+        mode = auto_record_var.get()
+        if mode != "off" and take_lock.locked():
+            print(f"Auto-record ({mode}) skipped: a take is already recording.")
+            return
+        if mode == "background":
+            record_background()
+        elif mode == "operation":
+            record_operation()
+
+steady_detector.on_settle = on_flow_settled
+
+def show_settle_metrics():
+    messagebox.showinfo("Time to Settle", steady_detector.summary())
+
 def stop_fan():
     """Stops the fan by sending a speed command of 0."""
     try:
         com_handler.send_fan_speed(0)
+        steady_detector.mark_step(now(), 0.0)
+        timeline.add("set_speed", 0.0)
         fan_speed_entry.delete(0, tk.END)
         fan_speed_entry.insert(0, "0")
     except Exception as e:
@@ -307,12 +1143,8 @@ def set_pwm_signal():
         if pwm_val < 0 or pwm_val > 255:
             messagebox.showerror("Input Error", "Please enter a number between 0 and 255 for PWM.")
             return
-        command = f"MP{pwm_val}\n"
-        if com_handler.ser and com_handler.ser.is_open:
-            com_handler.ser.write(command.encode('utf-8'))
-            print(f"Sent PWM signal: {command.strip()}")
-        else:
-            print("Serial port is not open. Cannot send PWM signal.")
+        com_handler.send_pwm(pwm_val)
+        steady_detector.mark_step(now())
     except ValueError:
         messagebox.showerror("Input Error", "Please enter a valid integer for PWM.")
     except Exception as e:
@@ -322,13 +1154,19 @@ def set_pwm_signal():
 # Fan Speed Recording Functions
 # ------------------------------
 def record_fan_speed_loop():
+    """Writes every air speed sample received since the recording started, with its serial timestamp."""
     global recording_fan_speed, record_start_time, fan_speed_csv_file, fan_speed_csv_writer
+    t, _ = timeline.series("air_speed")
+    written = len(t)
     while recording_fan_speed:
-        elapsed = time.time() - record_start_time
+        elapsed = now() - record_start_time
         try:
-            if current_air_speed is not None and isinstance(current_air_speed, (int, float)):
-                fan_speed_csv_writer.writerow([f"{elapsed:.2f}", f"{current_air_speed:.2f}"])
+            t, speeds = timeline.series("air_speed")
+            if len(t) > written:
+                fan_speed_csv_writer.writerows(
+                    [f"{ts - record_start_time:.3f}", f"{v:.2f}"] for ts, v in zip(t[written:], speeds[written:]))
                 fan_speed_csv_file.flush()
+                written = len(t)
         except Exception as e:
             print("Error writing to CSV:", e)
         record_timer_label.config(text=f"Recording time: {int(elapsed)} s")
@@ -341,7 +1179,7 @@ def toggle_record_fan_speed():
             messagebox.showerror("Error", "Please start a new experiment first!")
             return
         recording_fan_speed = True
-        record_start_time = time.time()
+        record_start_time = now()
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         filename = os.path.join(output_folder, f"fan_speed_record_{timestamp}.csv")
         try:
@@ -395,11 +1233,7 @@ def set_y_axis_specific():
 # Microphone Calibration File
 # ------------------------------
 def apply_mic_calibration(freqs, spl_array):
-    calibrated_spl = np.copy(spl_array)
-    cal_freqs = np.array(sorted(mic_calibration_data.keys()))
-    cal_values = np.array([mic_calibration_data[f] for f in cal_freqs])
-    interp = np.interp(freqs, cal_freqs, cal_values)
-    return calibrated_spl - interp
+    return apply_calibration(freqs, spl_array, mic_calibration_data)
 
 # ------------------------------
 # Dark Mode
@@ -470,42 +1304,51 @@ def set_microphone_settings():
     settings_win.configure(bg="#2b2b2b")
 
     # Variables to store user selections
-    sr_var = tk.StringVar(value="44100")
-    bd_var = tk.StringVar(value="16")
+    sr_var = tk.StringVar(value=str(capture_settings.sample_rate))
+    bd_var = tk.StringVar(value=str(capture_settings.bit_depth))
 
     # Label + Dropdown for Sample Rate
     freq_label = tk.Label(settings_win, text="Sample Rate:", fg="white", bg="#2b2b2b")
     freq_label.pack(pady=(10,0))
-    freq_dropdown = tk.OptionMenu(settings_win, sr_var, "44100", "96000")
+    freq_dropdown = tk.OptionMenu(settings_win, sr_var, *[str(rate) for rate in SAMPLE_RATES])
     freq_dropdown.config(bg="#3a3a3a", fg="white", highlightthickness=0)
     freq_dropdown.pack(pady=(0,10))
 
     # Label + Dropdown for Bit Depth
     bit_label = tk.Label(settings_win, text="Bit Depth:", fg="white", bg="#2b2b2b")
     bit_label.pack(pady=(0,0))
-    bit_dropdown = tk.OptionMenu(settings_win, bd_var, "16", "24")
+    bit_dropdown = tk.OptionMenu(settings_win, bd_var, *[str(bits) for bits in BIT_DEPTHS])
     bit_dropdown.config(bg="#3a3a3a", fg="white", highlightthickness=0)
     bit_dropdown.pack(pady=(0,10))
 
     # Callback for "Apply" button
     def apply_settings():
+        global capture_settings, background_spl, operation_spl, spectrum_freqs
         try:
-            sr = int(sr_var.get())
-            if sr not in [44100, 96000]:
-                messagebox.showerror("Input Error", "Sample rate must be 44100 or 96000.")
-                return
-            bd = int(bd_var.get())
-            if bd not in [16, 24]:
-                messagebox.showerror("Input Error", "Bit depth must be 16 or 24.")
-                return
-
-            import live_spectrogram
-            live_spectrogram.FS = sr
-            live_spectrogram.BIT_DEPTH = bd
-            messagebox.showinfo("Microphone Settings", f"Settings updated: {sr} Hz, {bd}-bit.")
-            settings_win.destroy()
-        except Exception as e:
-            messagebox.showerror("Error", f"Invalid input: {e}")
+            new_settings = CaptureSettings(int(sr_var.get()), int(bd_var.get()))
+        except ValueError as e:
+            messagebox.showerror("Input Error", str(e))
+            return
+
+        import live_spectrogram
+        capture_settings = new_settings
+        live_spectrogram.FS = capture_settings.sample_rate
+        live_spectrogram.BIT_DEPTH = capture_settings.bit_depth
+        # Takes at the old rate can't be combined with new ones
+        background_spl = operation_spl = None
+        spectrum_freqs = capture_settings.freqs(analysis_settings["n_window"])
+        analysis_pipeline.sources.clear()
+        reset_takes()
+        if triggered_capture is not None:
+            toggle_always_on_capture()  # Reopen the capture stream at the new rate
+        if acquisition_client is not None:
+            toggle_acquisition_process()  # Restart the worker at the new rate
+        apply_zoom_views()
+        if live_zoom_stream is not None:
+            restart_live_zoom()  # Reopen the live zoom stream at the new rate
+        canvas.draw()
+        messagebox.showinfo("Microphone Settings", f"Settings updated: {capture_settings.describe()}.")
+        settings_win.destroy()
 
     # Apply Button
     apply_btn = tk.Button(settings_win, text="Apply", command=apply_settings, bg="#3a3a3a", fg="white")
@@ -527,10 +1370,299 @@ def set_com_port():
     if com_handler:
         com_handler.close()
     # Create a new handler using the new port
-    com_handler = ComPortHandler(port=new_port, baudrate=115200, timeout=1, callback=handle_serial_data)
-    com_handler.open()
+    if acquisition_client is not None:
+        # The acquisition process owns the serial port; restart it on the new one
+        com_handler.port = new_port
+        toggle_acquisition_process()
+    else:
+        com_handler = ComPortHandler(port=new_port, baudrate=115200, timeout=1, callback=handle_serial_data)
+        com_handler.open()
     messagebox.showinfo("COM Port Changed", f"COM port changed to {new_port}")
 
+def toggle_acquisition_process():
+    """
+    Moves audio capture, serial I/O and the live spectrum into a worker process (or back).
+
+    The serial port is handed over to the worker, and com_handler becomes a proxy that
+    forwards commands and replays the worker's telemetry through handle_serial_data.
+    """
+    global acquisition_client, com_handler
+    if replay_source is not None:
+        acquisition_process_var.set(False)
+        messagebox.showerror("Error", "Stop the replay before starting the Acquisition Process.")
+        return
+    port = com_handler.port if com_handler else "COM3"
+    if acquisition_client is not None:
+        com_handler.close()
+        acquisition_client.stop()
+        acquisition_client = None
+        display_reducer.clear_line(live_plot)
+    if com_handler is not None:
+        com_handler.close()
+
+    if acquisition_process_var.get() and live_zoom_stream is not None:
+        # The worker takes over the microphone
+        zoom_plots["live"] = False
+        restart_live_zoom()
+        apply_zoom_views()
+    if acquisition_process_var.get():
+        client = AcquisitionClient(capture_settings, analysis_settings["n_window"], port=port, baudrate=115200)
+        try:
+            client.start()
+        except Exception as e:
+            acquisition_process_var.set(False)
+            messagebox.showerror("Error", f"Could not start the acquisition process:\n{e}")
+        else:
+            client.on_error = lambda message: root.after(0, lambda: messagebox.showerror("Acquisition Process", message))
+            acquisition_client = client
+            com_handler = WorkerComProxy(client, callback=handle_serial_data)
+            return
+    com_handler = ComPortHandler(port=port, baudrate=115200, timeout=1, callback=handle_serial_data)
+    com_handler.open()
+
+def update_live_spectrum():
+    """Draws the newest live spectrum from the acquisition process over the operation plot."""
+    latest = acquisition_client.latest_spectrum()
+    if latest is None:
+        return
+    _, live_freqs, live_spl = latest
+    display_reducer.set_line_data(live_plot, live_freqs, live_spl)
+    publish_spectrum("live", live_freqs, live_spl)
+
+# ------------------------------
+# Zoom-FFT
+# ------------------------------
+def zoom_spectrum(name):
+    """Zoom-FFT spectrum (freqs, spl) of the last "background", "operation" or "isolated" capture, or None."""
+    sources = ("background_audio", "operation_audio") if name == "isolated" else (name + "_audio",)
+    if (name == "isolated" and coherence_result is not None) or not all(analysis_pipeline.has_source(s) for s in sources):
+        return None
+    try:
+        return analysis_pipeline.run(name + "_zoom", **pipeline_settings())
+    except ValueError as e:
+        print(f"Zoom FFT of {name}:", e)
+        return None
+
+def set_zoom_view(ax, zoomed):
+    """Shows the zoom band on a linear axis, or the full band on the usual log axis."""
+    if zoomed:
+        ax.set_xscale("linear")
+        ax.set_xlim([zoom_settings["f_low"], zoom_settings["f_high"]])
+    else:
+        ax.set_xscale("log")
+        ax.set_xlim([20, capture_settings.sample_rate / 2])
+
+def apply_zoom_views():
+    """Sets each spectrum axis to its zoom band or the full band."""
+    set_zoom_view(axs[0, 0], zoom_plots["background"])
+    set_zoom_view(axs[0, 1], zoom_plots["operation"] or zoom_plots["live"])
+    set_zoom_view(axs[1, 0], zoom_plots["isolated"])
+
+def update_zoom_plots():
+    """Redraws the zoom-FFT lines of the plots selected for zooming from the last captures."""
+    for name, ax in (("background", axs[0, 0]), ("operation", axs[0, 1]), ("isolated", axs[1, 0])):
+        result = zoom_spectrum(name) if zoom_plots[name] else None
+        if result is None:
+            zoom_lines[name].set_data([], [])
+        else:
+            zoom_lines[name].set_data(*result)
+            publish_spectrum(name + "_zoom", *result)
+    canvas.draw_idle()
+
+def update_live_zoom():
+    """Draws the newest live zoom-FFT segment over the operation plot."""
+    latest = live_zoom.latest
+    if latest is not None:
+        display_reducer.set_unreduced_data(live_plot, live_zoom.freqs, latest)
+        publish_spectrum("live_zoom", live_zoom.freqs, latest)
+
+def restart_live_zoom():
+    """Opens (or closes) the live zoom-FFT stream to match zoom_plots["live"]."""
+    global live_zoom, live_zoom_stream
+    if live_zoom_stream is not None:
+        live_zoom_stream.close()
+        live_zoom_stream = None
+        live_zoom = None
+        display_reducer.clear_line(live_plot)
+    if not zoom_plots["live"]:
+        return
+    if acquisition_client is not None:
+        zoom_plots["live"] = False
+        messagebox.showerror("Error", "The live zoom FFT is not available while the Acquisition Process owns the microphone.")
+        return
+    import live_spectrogram
+    zoom = ZoomFFT(capture_settings.sample_rate, zoom_settings["f_low"], zoom_settings["f_high"],
+                   zoom_settings["resolution"], analysis_settings["overlap"], live_spectrogram.PRECISION,
+                   capture_settings.sample_dtype)
+    try:
+        stream = capture_settings.open_stream(1, callback=zoom.process)
+        stream.start()
+    except Exception as e:
+        zoom_plots["live"] = False
+        messagebox.showerror("Error", f"Could not start the live zoom FFT:\n{e}")
+        return
+    live_zoom, live_zoom_stream = zoom, stream
+
+def open_zoom_dialog():
+    """Dialog for the zoom-FFT band, resolution and the plots shown zoomed."""
+    dialog = tk.Toplevel(root)
+    dialog.title("Zoom FFT")
+    dialog.configure(bg="#2b2b2b")
+
+    f_low_var = tk.StringVar(value=f"{zoom_settings['f_low']:g}")
+    f_high_var = tk.StringVar(value=f"{zoom_settings['f_high']:g}")
+    resolution_var = tk.StringVar(value=f"{zoom_settings['resolution']:g}")
+    plot_vars = {name: tk.BooleanVar(value=zoom_plots[name]) for name in zoom_plots}
+
+    for label, var in (("Lower Frequency (Hz):", f_low_var), ("Upper Frequency (Hz):", f_high_var)):
+        tk.Label(dialog, text=label, fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+        tk.Entry(dialog, textvariable=var, bg="#3a3a3a", fg="white", insertbackground="white").pack(pady=(0, 5))
+    tk.Label(dialog, text="Resolution (Hz):", fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+    resolution_dropdown = tk.OptionMenu(dialog, resolution_var, "0.05", "0.1", "0.25", "0.5", "1", "2")
+    resolution_dropdown.config(bg="#3a3a3a", fg="white", highlightthickness=0)
+    resolution_dropdown.pack(pady=(0, 5))
+
+    tk.Label(dialog, text="Zoomed Plots:", fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+    for name, label in (("background", "Background"), ("operation", "Operation"),
+                        ("isolated", "Noise-Isolated"), ("live", "Live (over Operation)")):
+        tk.Checkbutton(dialog, text=label, variable=plot_vars[name], fg="white", bg="#2b2b2b",
+                       selectcolor="#3a3a3a", activebackground="#2b2b2b").pack(anchor="w", padx=20)
+
+    def apply():
+        try:
+            f_low, f_high = float(f_low_var.get()), float(f_high_var.get())
+            resolution = float(resolution_var.get())
+            ZoomFFT(capture_settings.sample_rate, f_low, f_high, resolution)
+        except ValueError as e:
+            messagebox.showerror("Input Error", str(e))
+            return
+        zoom_settings.update(f_low=f_low, f_high=f_high, resolution=resolution)
+        zoom_plots.update({name: var.get() for name, var in plot_vars.items()})
+        apply_zoom_views()
+        restart_live_zoom()
+        update_zoom_plots()
+        dialog.destroy()
+
+    tk.Button(dialog, text="Apply", command=apply, bg="#3a3a3a", fg="white").pack(pady=(5, 10))
+
+# ------------------------------
+# Replay of Recorded Takes
+# ------------------------------
+def reopen_streams():
+    """Reopens the always-on capture, sound level meter and live zoom streams on the current audio source."""
+    if triggered_capture is not None:
+        toggle_always_on_capture()
+    if slm_stream is not None:
+        slm_stream.close()
+        toggle_sound_level_meter()
+    if live_zoom_stream is not None:
+        restart_live_zoom()
+
+def start_replay(filename, telemetry_path=None, speed=1.0, loop=False):
+    """
+    Replaces the microphone and the serial port with a recorded take and its telemetry.
+
+    Recording, always-on capture, the sound level meter and the telemetry plots then run on
+    the replayed data until stop_replay().
+    """
+    global replay_source, com_handler
+    if acquisition_client is not None:
+        messagebox.showerror("Error", "Turn off the Acquisition Process before replaying a take.")
+        return
+    if recording_fan_speed:
+        messagebox.showerror("Error", "Stop the fan speed recording before replaying a take.")
+        return
+    try:
+        source = open_replay(filename, telemetry_path or None, speed, loop)
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error", f"Could not open the take:\n{e}")
+        return
+    if source.sample_rate != capture_settings.sample_rate:
+        messagebox.showerror("Error", f"The take was recorded at {source.sample_rate} Hz.\n"
+                                      f"Set the microphone sample rate to {source.sample_rate} Hz first.")
+        return
+    if replay_source is not None:
+        replay_source.close()  # Switching takes: the serial port stays closed
+    port = com_handler.port
+    com_handler.close()
+    timeline.reset()  # Telemetry only; audio stream stamps carry on
+    com_handler = ReplayComPort(source, callback=handle_serial_data, port=port)
+    com_handler.open()
+    source.on_finished = lambda: root.after(0, lambda: replay_status_label.config(text="Replay: finished"))
+    set_audio_source(source)
+    source.start()
+    replay_source = source
+    speed_text = "max speed" if speed is None else f"{speed:g}x"
+    replay_status_label.config(text=f"Replay: {os.path.basename(filename)} ({speed_text})")
+    reopen_streams()
+
+def stop_replay():
+    """Returns to the microphone and the serial port."""
+    global replay_source, com_handler
+    if replay_source is None:
+        return
+    if recording_fan_speed:
+        messagebox.showerror("Error", "Stop the fan speed recording before stopping the replay.")
+        return
+    replay_source.close()
+    replay_source = None
+    set_audio_source(None)
+    port = com_handler.port
+    com_handler.close()
+    timeline.reset()
+    com_handler = ComPortHandler(port=port, baudrate=115200, timeout=1, callback=handle_serial_data)
+    com_handler.open()
+    replay_status_label.config(text="")
+    reopen_streams()
+
+def open_replay_dialog():
+    """Dialog for replaying a take (and optional telemetry file) through the live path."""
+    dialog = tk.Toplevel(root)
+    dialog.title("Replay Take")
+    dialog.configure(bg="#2b2b2b")
+
+    take_var = tk.StringVar()
+    telemetry_var = tk.StringVar()
+    speed_var = tk.StringVar(value="1x")
+    loop_var = tk.BooleanVar(value=False)
+
+    def browse(var, title, filetypes):
+        filename = filedialog.askopenfilename(
+            title=title, filetypes=filetypes,
+            initialdir=os.path.join(output_folder, "takes") if output_folder else None
+        )
+        if filename:
+            var.set(filename)
+
+    for label, var, title, filetypes in (
+        ("Take:", take_var, "Select Take", [("Takes", "*.npy *.wtz"), ("All files", "*.*")]),
+        ("Telemetry CSV (optional):", telemetry_var, "Select Telemetry File", [("CSV files", "*.csv"), ("All files", "*.*")]),
+    ):
+        tk.Label(dialog, text=label, fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+        row = tk.Frame(dialog, bg="#2b2b2b")
+        row.pack(padx=10, pady=(0, 5))
+        tk.Entry(row, textvariable=var, width=40, bg="#3a3a3a", fg="white", insertbackground="white").pack(side=tk.LEFT)
+        tk.Button(row, text="Browse...", bg="#3a3a3a", fg="white",
+                  command=lambda v=var, t=title, f=filetypes: browse(v, t, f)).pack(side=tk.LEFT, padx=(5, 0))
+
+    tk.Label(dialog, text="Speed:", fg="white", bg="#2b2b2b").pack(pady=(10, 0))
+    speed_dropdown = tk.OptionMenu(dialog, speed_var, "1x", "2x", "5x", "10x", "Max")
+    speed_dropdown.config(bg="#3a3a3a", fg="white", highlightthickness=0)
+    speed_dropdown.pack(pady=(0, 5))
+    tk.Checkbutton(dialog, text="Loop", variable=loop_var, fg="white", bg="#2b2b2b",
+                   selectcolor="#3a3a3a", activebackground="#2b2b2b").pack(pady=5)
+
+    def start():
+        if not take_var.get():
+            messagebox.showerror("Input Error", "Please select a take to replay.")
+            return
+        speed = None if speed_var.get() == "Max" else float(speed_var.get().rstrip("x"))
+        start_replay(take_var.get(), telemetry_var.get(), speed, loop_var.get())
+        if replay_source is not None:
+            dialog.destroy()
+
+    tk.Button(dialog, text="Start Replay", command=start, bg="#3a3a3a", fg="white").pack(pady=(5, 10))
+
 com_handler = ComPortHandler(port="COM3", baudrate=115200, timeout=1, callback=handle_serial_data)
 com_handler.open()
 
@@ -549,6 +1681,11 @@ def open_serial_debug():
     global debug_window
     debug_window = show_serial_debug_window(debug_window)
 
+def toggle_single_precision():
+    import live_spectrogram
+    live_spectrogram.PRECISION = "float32" if single_precision_var.get() else "float64"
+    print(f"DSP precision set to {live_spectrogram.PRECISION}")
+
 def set_manual_calibration():
     global use_mic_calibration
     use_mic_calibration = False
@@ -557,7 +1694,7 @@ def set_manual_calibration():
 from tkinter import filedialog
 
 def set_mic_calibration():
-    global use_mic_calibration, mic_calibration_data
+    global use_mic_calibration, mic_calibration_data, mic_calibration_file
 
     file_path = filedialog.askopenfilename(
         title="Select Microphone Calibration File",
@@ -580,6 +1717,7 @@ def set_mic_calibration():
                         mic_calibration_data[freq] = db
 
         use_mic_calibration = True
+        mic_calibration_file = os.path.basename(file_path)
         messagebox.showinfo("Calibration Mode", f"Loaded microphone calibration file:\n{os.path.basename(file_path)}")
 
     except Exception as e:
@@ -595,6 +1733,43 @@ menubar.add_cascade(label="File", menu=file_menu)
 tools_menu = tk.Menu(menubar, tearoff=0)
 tools_menu.add_command(label="Serial Debugging", command=open_serial_debug)
 tools_menu.add_command(label="Microphone Settings", command=set_microphone_settings)
+tools_menu.add_command(label="Record Two-Mic Isolation", command=record_two_mic_isolation)
+tools_menu.add_command(label="Re-analyse Last Capture", command=open_reanalysis_dialog)
+tools_menu.add_command(label="Re-analyse Take Files...", command=reanalyse_take_files)
+tools_menu.add_command(label="Zoom FFT...", command=open_zoom_dialog)
+keep_raw_takes_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label="Keep Raw Takes", variable=keep_raw_takes_var)
+auto_record_var = tk.StringVar(value="off")
+auto_record_menu = tk.Menu(tools_menu, tearoff=0)
+for label, mode in (("Off", "off"), ("Record Background", "background"), ("Record Operation", "operation")):
+    auto_record_menu.add_radiobutton(label=label, variable=auto_record_var, value=mode)
+tools_menu.add_cascade(label="Auto-Record on Settle", menu=auto_record_menu)
+tools_menu.add_command(label="Show Settle Times", command=show_settle_metrics)
+always_on_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label="Always-On Capture", variable=always_on_var, command=toggle_always_on_capture)
+tools_menu.add_command(label="Trigger Capture Now", command=trigger_capture_now)
+tools_menu.add_command(label="Capture Triggers...", command=open_trigger_settings)
+acquisition_process_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label="Acquisition Process", variable=acquisition_process_var, command=toggle_acquisition_process)
+tools_menu.add_command(label="Replay Take...", command=open_replay_dialog)
+tools_menu.add_command(label="Stop Replay", command=stop_replay)
+slm_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label="Sound Level Meter", variable=slm_var, command=toggle_sound_level_meter)
+slm_weighting_var = tk.StringVar(value="A")
+slm_weighting_menu = tk.Menu(tools_menu, tearoff=0)
+for weighting in ("A", "C", "Z"):
+    slm_weighting_menu.add_radiobutton(label=f"{weighting}-weighting", variable=slm_weighting_var, value=weighting, command=set_slm_weighting)
+tools_menu.add_cascade(label="Sound Level Meter Weighting", menu=slm_weighting_menu)
+monitor_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label="Monitoring Server", variable=monitor_var, command=toggle_monitor_server)
+tools_menu.add_command(label="Import Experiments into Catalog", command=import_experiments_to_catalog)
+tools_menu.add_command(label="Noise Map", command=open_noise_map_window)
+tools_menu.add_command(label="Compare Runs...", command=open_compare_window)
+export_csv_var = tk.BooleanVar(value=True)
+tools_menu.add_checkbutton(label="Export CSV Files", variable=export_csv_var)
+tools_menu.add_command(label="Export Results to CSV", command=export_results_to_csv)
+single_precision_var = tk.BooleanVar(value=False)
+tools_menu.add_checkbutton(label="Single-Precision DSP", variable=single_precision_var, command=toggle_single_precision)
 menubar.add_cascade(label="Tools", menu=tools_menu)
 
 help_menu = tk.Menu(menubar, tearoff=0)
@@ -669,7 +1844,7 @@ toolbar.update()
 toolbar.pack(side=tk.TOP, fill=tk.X)
 
 # Create plot lines
-freqs = np.fft.rfftfreq(4096, 1 / 96000)
+freqs = capture_settings.freqs(analysis_settings["n_window"])
 background_spl = np.full_like(freqs, -50)
 operation_spl = np.full_like(freqs, -50)
 noise_isolated_spl = np.full_like(freqs, -50)
@@ -677,6 +1852,13 @@ noise_isolated_spl = np.full_like(freqs, -50)
 background_plot, = axs[0, 0].plot(freqs, background_spl, color='violet', lw=1)
 operation_plot, = axs[0, 1].plot(freqs, operation_spl, color='aquamarine', lw=1)
 noise_isolated_plot, = axs[1, 0].plot(freqs, noise_isolated_spl, color='gold', lw=1)
+live_plot, = axs[0, 1].plot([], [], color='white', lw=0.5, alpha=0.6)  # Live spectrum (acquisition process mode)
+# Zoom-FFT spectra, shown when a plot is switched to its zoom band
+zoom_lines = {
+    "background": axs[0, 0].plot([], [], color='white', lw=0.8)[0],
+    "operation": axs[0, 1].plot([], [], color='white', lw=0.8)[0],
+    "isolated": axs[1, 0].plot([], [], color='white', lw=0.8)[0],
+}
 
 for freq_ax in [axs[0,0], axs[0,1], axs[1,0]]:
     freq_ax.axvspan(1, 1905, facecolor='gray', alpha=0.3)
@@ -842,6 +2024,35 @@ btn_iso = tk.Button(
 btn_iso.image = comp_noise_img_tk
 btn_iso.pack(pady=5)
 
+# Repeated-take ensemble status
+ensemble_status_label = tk.Label(
+    left_frame, text="Takes  Bkg: 0  Op: 0", font=("Arial", 10, "italic"),
+    fg="white", bg="#2b2b2b"
+)
+ensemble_status_label.pack(pady=5)
+
+# Live sound level meter readout
+slm_status_label = tk.Label(
+    left_frame, text="Sound Level: off", font=("Arial", 10),
+    fg="white", bg="#2b2b2b", justify=tk.LEFT
+)
+slm_status_label.pack(pady=5)
+
+# Background export progress
+export_status_label = tk.Label(
+    left_frame, text="", font=("Arial", 10),
+    fg="white", bg="#2b2b2b", wraplength=220
+)
+export_status_label.pack(pady=5)
+export_worker = ExportWorker(on_status=show_export_status)
+
+# Replay status (empty while the microphone is live)
+replay_status_label = tk.Label(
+    left_frame, text="", font=("Arial", 10),
+    fg="white", bg="#2b2b2b", wraplength=220
+)
+replay_status_label.pack(pady=5)
+
 # Fan Controls label
 fan_controls_label = tk.Label(
     left_frame, text="Fan Controls", font=("Arial", 14, "bold"),
@@ -996,6 +2207,41 @@ def on_close():
     global recording_fan_speed
     recording_fan_speed = False
 
+    try:
+        if slm_stream is not None:
+            slm_stream.close()
+    except:
+        pass
+
+    try:
+        if triggered_capture is not None:
+            triggered_capture.stop()
+    except:
+        pass
+
+    try:
+        if acquisition_client is not None:
+            acquisition_client.stop()
+    except:
+        pass
+
+    try:
+        if live_zoom_stream is not None:
+            live_zoom_stream.close()
+    except:
+        pass
+
+    try:
+        if replay_source is not None:
+            replay_source.close()
+    except:
+        pass
+
+    try:
+        run_cache.close()
+    except:
+        pass
+
     try:
         if com_handler:
             com_handler.close()
@@ -1007,6 +2253,10 @@ def on_close():
     except:
         pass
 
+    # Let queued exports finish writing before exiting
+    if export_worker.pending:
+        export_worker.wait(timeout=30)
+
     try:
         root.destroy()
     except:
@@ -0,0 +1,146 @@
+"""
+Block-processing sound level meter for the live audio stream.
+
+Each audio block is frequency-weighted (A, C or Z) by applying the IEC 61672 weighting
+magnitude to its spectrum and summing the weighted power (Parseval), which gives the
+block's weighted mean-square pressure from one batched rfft. Hann frames with 50%
+overlap across block boundaries keep leakage from lifting low-frequency tones; with
+4096-sample blocks at 96 kHz weighted tone levels are accurate to a few tenths of a dB
+from ~100 Hz up (below that the 23 Hz bin width limits it). Fast/slow exponential time
+weighting carries its state from block to block. Leq, Lmax, Lmin and the L10/L50/L90
+percentile levels are tracked with a fixed-size level histogram, so memory does not
+grow with time.
+"""
+import numpy as np
+
+from level_stats import LevelHistogram
+from live_spectrogram import ADC_PEAK_VOLTAGE, MIC_SENSITIVITY_V_PER_PA, P_REF, CALIBRATION_OFFSET
+
+TIME_CONSTANTS = {"F": 0.125, "S": 1.0}  # Fast / Slow time weighting (s)
+
+
+def weighting_db(freqs, weighting="A"):
+    """
+    IEC 61672 frequency weighting in dB at the given frequencies.
+
+    :param weighting: "A", "C" or "Z"
+    """
+    f2 = np.asarray(freqs, dtype=np.float64) ** 2
+    if weighting == "Z":
+        return np.zeros_like(f2)
+    with np.errstate(divide="ignore"):
+        if weighting == "A":
+            r = (12194.0**2 * f2**2) / (
+                (f2 + 20.6**2) * np.sqrt((f2 + 107.7**2) * (f2 + 737.9**2)) * (f2 + 12194.0**2))
+            return 20 * np.log10(r) + 2.00
+        if weighting == "C":
+            r = (12194.0**2 * f2) / ((f2 + 20.6**2) * (f2 + 12194.0**2))
+            return 20 * np.log10(r) + 0.06
+    raise ValueError(f"Unknown frequency weighting: {weighting}")
+
+
+class SoundLevelMeter:
+    def __init__(self, fs, block_size=4096, weighting="A", time_weighting="F"):
+        """
+        :param fs: Sample rate (Hz)
+        :param block_size: Expected block length (other lengths are handled, with a one-off weight rebuild)
+        :param weighting: Frequency weighting, "A", "C" or "Z"
+        :param time_weighting: "F" (fast, 125 ms) or "S" (slow, 1 s)
+        """
+        self.fs = fs
+        self.weighting = weighting
+        self.time_weighting = time_weighting
+        self._weights = {}
+        self._weights_for(block_size)
+        self.reset()
+
+    def reset(self):
+        self.level_ms = None  # Time-weighted mean-square pressure (Pa^2)
+        self._tail = None     # Second half of the previous block, for the overlapping frame
+        self.energy = 0.0     # Sum of weighted p^2 * dt, for Leq
+        self.duration = 0.0
+        self.lmax = -np.inf
+        self.lmin = np.inf
+        self.histogram = LevelHistogram()
+
+    def set_weighting(self, weighting):
+        """Switches the frequency weighting and restarts the statistics."""
+        self.weighting = weighting
+        self._weights.clear()
+        self.reset()
+
+    def _weights_for(self, n):
+        """Per-bin weights mapping |rfft|^2 to weighted mean-square pressure (cached per block length)."""
+        weights = self._weights.get(n)
+        if weights is None:
+            freqs = np.fft.rfftfreq(n, 1 / self.fs)
+            window = np.hanning(n)
+            # Parseval with the window power normalised out: mean(x^2) = sum|X|^2 / (n * sum(w^2))
+            weights = 10 ** (weighting_db(freqs, self.weighting) / 10) * 2.0 / (n * np.sum(window**2))
+            weights[0] /= 2
+            if n % 2 == 0:
+                weights[-1] /= 2
+            weights *= (ADC_PEAK_VOLTAGE / MIC_SENSITIVITY_V_PER_PA) ** 2
+            weights = (weights.astype(np.float32), window.astype(np.float32))
+            self._weights[n] = weights
+        return weights
+
+    def _to_db(self, ms):
+        return 10 * np.log10(max(ms, 1e-30) / P_REF**2) + CALIBRATION_OFFSET
+
+    def process(self, block):
+        """
+        Adds one block of samples (float, full scale = 1) from the audio stream.
+
+        :return: Current time-weighted level (dB)
+        """
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        n = len(block)
+        if n == 0:
+            return self.level
+        weights, window = self._weights_for(n)
+        half = n // 2
+        if self._tail is not None and len(self._tail) == half and n % 2 == 0:
+            frames = np.stack((np.concatenate((self._tail, block[:half])), block))
+        else:
+            frames = block[None, :]
+        self._tail = block[n - half:]
+
+        spec = np.fft.rfft(frames * window, axis=-1)
+        ms = float(np.mean((spec.real**2 + spec.imag**2) @ weights))
+
+        dt = n / self.fs
+        self.energy += ms * dt
+        self.duration += dt
+
+        # Exponential time weighting, treating the block's mean square as constant over the block
+        decay = np.exp(-dt / TIME_CONSTANTS[self.time_weighting])
+        self.level_ms = ms if self.level_ms is None else decay * self.level_ms + (1 - decay) * ms
+
+        level = self._to_db(self.level_ms)
+        self.lmax = max(self.lmax, level)
+        self.lmin = min(self.lmin, level)
+        self.histogram.add(level)
+        return level
+
+    @property
+    def level(self):
+        return None if self.level_ms is None else self._to_db(self.level_ms)
+
+    @property
+    def leq(self):
+        return None if self.duration == 0 else self._to_db(self.energy / self.duration)
+
+    def percentiles(self, percents=(10, 50, 90)):
+        """L10/L50/L90 (levels exceeded 10/50/90 % of the time)."""
+        return self.histogram.exceeded(np.asarray(percents, dtype=np.float64))
+
+    def summary(self):
+        """Short multi-line readout for the GUI."""
+        if self.level_ms is None:
+            return f"L{self.weighting}{self.time_weighting}: --"
+        l10, l50, l90 = self.percentiles()
+        w = self.weighting
+        return (f"L{w}{self.time_weighting} {self.level:.1f}  L{w}eq {self.leq:.1f} dB\n"
+                f"Max {self.lmax:.1f}  Min {self.lmin:.1f}\n"
+                f"L10 {l10:.1f}  L50 {l50:.1f}  L90 {l90:.1f}")
@@ -0,0 +1,189 @@
+"""
+Statistical steady-state detection on the air-speed telemetry.
+
+Every AD sample updates running sums over a sliding time window (count, sum of t, v,
+t^2, t*v, v^2), so the windowed mean, standard deviation and least-squares slope cost
+O(1) per sample. The flow counts as steady once the window spans window_s, the
+standard deviation and the slope are within tolerance and, when a set speed is known,
+the mean is within target_tolerance of it. Once steady, the tolerances widen by
+HYSTERESIS so noise at the edge of a tolerance does not toggle the state.
+
+Each settle after a set-point change is logged together with the time the old rule
+("no 0.1 m/s change for 3 s") would have declared it, so the waiting saved can be
+measured.
+"""
+from collections import deque
+import numpy as np
+
+DEFAULT_WINDOW_S = 2.0
+DEFAULT_STD_TOLERANCE = 0.05      # m/s
+DEFAULT_SLOPE_TOLERANCE = 0.03    # m/s per s
+DEFAULT_TARGET_TOLERANCE = 0.15   # m/s
+HYSTERESIS = 1.5                  # Once steady, tolerances widen by this factor before it is lost
+LEGACY_CHANGE = 0.1               # m/s, the old "Stable" rule
+LEGACY_HOLD_S = 3.0
+REBASE_S = 600.0                  # Re-origin the time sums this often to keep them well conditioned
+
+
+class SteadyStateDetector:
+    def __init__(self, window_s=DEFAULT_WINDOW_S, std_tolerance=DEFAULT_STD_TOLERANCE,
+                 slope_tolerance=DEFAULT_SLOPE_TOLERANCE, target_tolerance=DEFAULT_TARGET_TOLERANCE):
+        """
+        :param window_s: Length of the statistics window (s)
+        :param std_tolerance: Maximum standard deviation within the window (m/s)
+        :param slope_tolerance: Maximum absolute trend within the window (m/s per s)
+        :param target_tolerance: Maximum distance of the window mean from the set speed (m/s)
+        """
+        self.window_s = window_s
+        self.std_tolerance = std_tolerance
+        self.slope_tolerance = slope_tolerance
+        self.target_tolerance = target_tolerance
+        self.settle_log = []  # dicts: step_time, settle_s, legacy_settle_s, mean, commanded
+        self.on_settle = None  # Called with the log entry when the flow settles
+        self.target = None
+        self.reset()
+
+    def reset(self):
+        """Clears the window (the settle log is kept)."""
+        self.samples = deque()
+        self.origin = None
+        self.n = 0
+        self.st = self.sv = self.stt = self.stv = self.svv = 0.0
+        self.steady = False
+        self.step_time = None
+        self.step_commanded = False
+        self.legacy_reference = None
+        self.legacy_change_time = None
+        self.legacy_settle_time = None
+
+    def mark_step(self, t, target=None):
+        """Records a set-point change at time t (target = new set speed in m/s, if known)."""
+        self.target = target
+        self.step_time = t
+        self.step_commanded = True
+        self.steady = False
+        self.legacy_settle_time = None
+
+    # ------------------------------
+    # Running sums
+    # ------------------------------
+    def _add(self, t, v, sign=1.0):
+        t -= self.origin
+        self.n += int(sign)
+        self.st += sign * t
+        self.sv += sign * v
+        self.stt += sign * t * t
+        self.stv += sign * t * v
+        self.svv += sign * v * v
+
+    def _rebase(self, t):
+        """Moves the time origin to t and rebuilds the sums (also clears accumulated rounding)."""
+        self.origin = t
+        self.n = 0
+        self.st = self.sv = self.stt = self.stv = self.svv = 0.0
+        for ts, vs in self.samples:
+            self._add(ts, vs)
+
+    def update(self, t, value):
+        """
+        Adds one air-speed sample.
+
+        :param t: Sample time (s, monotonic clock)
+        :param value: Air speed (m/s)
+        :return: True while the flow is steady
+        """
+        if self.origin is None or t - self.origin > REBASE_S:
+            self._rebase(t)
+        self.samples.append((t, value))
+        self._add(t, value)
+        while self.samples and t - self.samples[0][0] > self.window_s:
+            old_t, old_v = self.samples.popleft()
+            self._add(old_t, old_v, -1.0)
+
+        self._update_legacy(t, value)
+        self._fill_legacy()
+
+        was_steady = self.steady
+        self.steady = self._is_steady()
+        if self.steady and not was_steady:
+            self._log_settle(t)
+        elif was_steady and not self.steady and self.step_time is None:
+            # Lost steadiness without a commanded change (e.g. a disturbance)
+            self.step_time = t
+            self.step_commanded = False
+        return self.steady
+
+    def _update_legacy(self, t, value):
+        if self.legacy_reference is None or abs(value - self.legacy_reference) > LEGACY_CHANGE:
+            self.legacy_reference = value
+            self.legacy_change_time = t
+            self.legacy_settle_time = None
+        elif self.legacy_settle_time is None and t - self.legacy_change_time >= LEGACY_HOLD_S:
+            self.legacy_settle_time = t
+
+    # ------------------------------
+    # Window statistics
+    # ------------------------------
+    @property
+    def mean(self):
+        return self.sv / self.n if self.n else np.nan
+
+    @property
+    def std(self):
+        if self.n < 2:
+            return np.nan
+        return np.sqrt(max(self.svv - self.sv * self.sv / self.n, 0.0) / (self.n - 1))
+
+    @property
+    def slope(self):
+        """Least-squares trend over the window (m/s per s)."""
+        denom = self.n * self.stt - self.st * self.st
+        if self.n < 3 or denom <= 0:
+            return np.nan
+        return (self.n * self.stv - self.st * self.sv) / denom
+
+    def _is_steady(self):
+        if self.n < 3 or self.samples[-1][0] - self.samples[0][0] < 0.9 * self.window_s:
+            return False
+        scale = HYSTERESIS if self.steady else 1.0
+        if not (self.std <= scale * self.std_tolerance and abs(self.slope) <= scale * self.slope_tolerance):
+            return False
+        return self.target is None or abs(self.mean - self.target) <= scale * self.target_tolerance
+
+    # ------------------------------
+    # Settle metrics
+    # ------------------------------
+    def _log_settle(self, t):
+        if self.step_time is None:
+            return
+        entry = {
+            "step_time": self.step_time,
+            "settle_s": t - self.step_time,
+            "legacy_settle_s": None,
+            "mean": self.mean,
+            "commanded": self.step_commanded,
+        }
+        self.settle_log.append(entry)
+        self.step_time = None
+        self._fill_legacy()
+        if self.on_settle is not None:
+            self.on_settle(entry)
+
+    def _fill_legacy(self):
+        """Adds the old rule's settle time to the last settle once that rule has declared it."""
+        if self.settle_log and self.settle_log[-1]["legacy_settle_s"] is None and self.legacy_settle_time is not None:
+            entry = self.settle_log[-1]
+            entry["legacy_settle_s"] = max(self.legacy_settle_time - entry["step_time"], 0.0)
+
+    def summary(self):
+        """Mean time to settle and the mean saving against the old rule."""
+        if not self.settle_log:
+            return "No settles recorded yet."
+        settle = np.array([e["settle_s"] for e in self.settle_log])
+        paired = [(e["settle_s"], e["legacy_settle_s"]) for e in self.settle_log if e["legacy_settle_s"] is not None]
+        text = (f"{len(settle)} settles: mean {settle.mean():.1f} s, "
+                f"median {np.median(settle):.1f} s, max {settle.max():.1f} s")
+        if paired:
+            saved = np.array([legacy - new for new, legacy in paired])
+            text += f"\nOld 3 s rule: {saved.mean():+.1f} s later on average ({len(paired)} compared)"
+        return text
@@ -0,0 +1,242 @@
+"""
+Local WebSocket server for remote monitoring of spectra and telemetry.
+
+The server runs its own asyncio loop on a background thread. Acquisition code only
+stores the latest values (publish_* calls are O(1) and never block); each connected
+client has its own sender task that wakes at most max_fps times a second and sends
+whatever changed since its last frame, so slow observers never slow acquisition.
+
+Binary frames (little-endian):
+    spectrum key frame   B type=1, B name_len, H n, I seq, name, float32 freqs[n], int16 levels[n] (0.1 dB)
+    spectrum delta frame B type=2, B name_len, H n, I seq, name, int8 level deltas[n] (0.1 dB)
+    telemetry frame      B type=3, d time, f air speed, f pwm, f sound level (nan when unknown)
+
+Spectra are reduced to DISPLAY_POINTS log-spaced max bins before quantising. A delta
+frame is sent when every bin moved less than 12.7 dB since the client's last frame.
+
+Open http://localhost:8765/ in a browser for the bundled client (assets/monitor.html).
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+from display_reducer import LogDisplayReducer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_FPS = 10
+DISPLAY_POINTS = 512
+QUANT_DB = 0.1
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+CLIENT_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "monitor.html")
+
+FRAME_KEY = 1
+FRAME_DELTA = 2
+FRAME_TELEMETRY = 3
+
+
+def _ws_frame(payload, opcode=0x2):
+    """Encodes an unmasked server-to-client WebSocket frame."""
+    n = len(payload)
+    if n < 126:
+        header = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return header + payload
+
+
+async def _read_ws_frame(reader):
+    """Reads one (masked) client frame; returns (opcode, payload)."""
+    b0, b1 = await reader.readexactly(2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif n == 127:
+        n = struct.unpack("!Q", await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if b1 & 0x80 else b"\0\0\0\0"
+    data = np.frombuffer(await reader.readexactly(n), dtype=np.uint8)
+    payload = (data ^ np.resize(np.frombuffer(mask, dtype=np.uint8), n)).tobytes()
+    return b0 & 0x0F, payload
+
+
+class SpectrumServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_fps=DEFAULT_MAX_FPS):
+        """
+        :param host: Interface to bind (localhost by default)
+        :param port: TCP port for both the client page and the WebSocket
+        :param max_fps: Maximum frames per second sent to each client
+        """
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.clients = 0
+
+        self._lock = threading.Lock()
+        self._spectra = {}     # name -> (seq, freqs, quantised levels)
+        self._telemetry = None  # (seq, packed frame)
+        self._seq = 0
+        self._reducer = LogDisplayReducer()
+
+    # ------------------------------
+    # Publishing (called from acquisition / GUI threads)
+    # ------------------------------
+    def publish_spectrum(self, name, freqs, spl):
+        """Stores the latest spectrum under a name (e.g. "operation")."""
+        freqs = np.asarray(freqs)
+        x, y = self._reducer.reduce(freqs, np.asarray(spl, dtype=np.float64), DISPLAY_POINTS, max(freqs[1], 1.0), freqs[-1])
+        # Keep the max of each max/min pair
+        x, y = x[::2], y[::2]
+        q = np.clip(np.round(np.nan_to_num(y, neginf=-3276.7) / QUANT_DB), -32767, 32767).astype(np.int16)
+        with self._lock:
+            self._seq += 1
+            self._spectra[name] = (self._seq, x.astype(np.float32), q)
+
+    def publish_telemetry(self, air_speed=None, pwm=None, sound_level=None):
+        as_float = lambda v: float(v) if isinstance(v, (int, float)) else float("nan")
+        frame = struct.pack("<Bdfff", FRAME_TELEMETRY, time.time(),
+                            as_float(air_speed), as_float(pwm), as_float(sound_level))
+        with self._lock:
+            self._seq += 1
+            self._telemetry = (self._seq, frame)
+
+    # ------------------------------
+    # Server lifecycle
+    # ------------------------------
+    def start(self):
+        """Starts the server on a background thread; returns once it is listening."""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self._handle_connection, self.host, self.port))
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                return
+            started.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+        print(f"Monitoring server at http://{self.host}:{self.port}/")
+
+    def stop(self):
+        if self.loop is None:
+            return
+
+        async def shutdown():
+            self.server.close()
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=2)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        self.loop = None
+
+    # ------------------------------
+    # Connection handling (event loop thread)
+    # ------------------------------
+    async def _handle_connection(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            path = lines[0].split(" ")[1] if len(lines[0].split(" ")) > 1 else "/"
+            headers = {k.strip().lower(): v.strip() for k, _, v in (l.partition(":") for l in lines[1:] if l)}
+
+            if headers.get("upgrade", "").lower() == "websocket":
+                await self._serve_websocket(reader, writer, headers)
+            else:
+                await self._serve_page(writer, path)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_page(self, writer, path):
+        if path not in ("/", "/index.html"):
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+        else:
+            with open(CLIENT_PAGE, "rb") as f:
+                body = f.read()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _serve_websocket(self, reader, writer, headers):
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        await writer.drain()
+
+        self.clients += 1
+        sender = asyncio.ensure_future(self._send_loop(writer))
+        try:
+            while True:
+                opcode, payload = await _read_ws_frame(reader)
+                if opcode == 0x8:  # close
+                    writer.write(_ws_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:  # ping
+                    writer.write(_ws_frame(payload, 0xA))
+        finally:
+            sender.cancel()
+            self.clients -= 1
+
+    async def _send_loop(self, writer):
+        """Sends changed spectra and telemetry to one client, at most max_fps times a second."""
+        sent_seq = {}  # name -> seq last sent
+        sent = {}      # name -> (freqs, quantised levels) last sent
+        period = 1.0 / self.max_fps
+        while True:
+            with self._lock:
+                spectra = dict(self._spectra)
+                telemetry = self._telemetry
+
+            frames = []
+            for name, (seq, freqs, q) in spectra.items():
+                if sent_seq.get(name) == seq:
+                    continue
+                frames.append(self._encode_spectrum(name, seq, freqs, q, sent.get(name)))
+                sent_seq[name] = seq
+                sent[name] = (freqs, q)
+            if telemetry is not None and sent_seq.get(None) != telemetry[0]:
+                frames.append(telemetry[1])
+                sent_seq[None] = telemetry[0]
+
+            for frame in frames:
+                writer.write(_ws_frame(frame))
+            if frames:
+                await writer.drain()
+            await asyncio.sleep(period)
+
+    @staticmethod
+    def _encode_spectrum(name, seq, freqs, q, previous):
+        name_bytes = name.encode("utf-8")[:255]
+        if previous is not None and np.array_equal(previous[0], freqs):
+            delta = q.astype(np.int32) - previous[1]
+            if np.all(np.abs(delta) <= 127):
+                return (struct.pack("<BBHI", FRAME_DELTA, len(name_bytes), len(q), seq & 0xFFFFFFFF)
+                        + name_bytes + delta.astype(np.int8).tobytes())
+        return (struct.pack("<BBHI", FRAME_KEY, len(name_bytes), len(q), seq & 0xFFFFFFFF)
+                + name_bytes + freqs.astype("<f4").tobytes() + q.astype("<i2").tobytes())
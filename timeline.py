@@ -0,0 +1,182 @@
+"""
+Common monotonic clock for audio blocks and serial telemetry.
+
+Every audio block is stamped with the ADC time of its first sample. PortAudio gives
+inputBufferAdcTime on the stream's own clock, so it is moved onto time.monotonic()
+through the callback's currentTime. Every serial line is stamped when it is read.
+Stamps and values are appended to growable arrays per channel, so a whole session
+can be sliced and resampled with numpy:
+
+    offsets = frame_times_s * fs                       # STFT frame centres in samples
+    t = timeline.sample_times("take", offsets)         # -> monotonic seconds
+    flow = timeline.join(t, ("air_speed", "pwm"))      # -> arrays aligned with the frames
+    r = np.corrcoef(frame_spl, flow["air_speed"])[0, 1]
+
+Audio streams are stored as (time of first sample, sample offset) per block. Sample
+times are interpolated between blocks, which also follows any drift between the
+audio clock and the system clock. A replay (see replay.py) swaps in its own virtual
+clock through use_clock, so replayed blocks and lines keep their recorded spacing
+whatever the replay speed.
+"""
+import threading
+import time
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+_clock = time.monotonic
+
+
+def now():
+    """Time on the common clock (s)."""
+    return _clock()
+
+
+def use_clock(clock=None):
+    """Replaces the common clock with a callable returning seconds (None restores time.monotonic)."""
+    global _clock
+    _clock = clock or time.monotonic
+
+
+def adc_time(time_info, frames, fs):
+    """
+    ADC time of a block's first sample on the common clock.
+
+    :param time_info: The time argument of a sounddevice callback
+    :return: Monotonic time (s); now() - frames / fs if the host API gives no ADC time
+    """
+    t = now()
+    adc = getattr(time_info, "inputBufferAdcTime", 0.0)
+    current = getattr(time_info, "currentTime", 0.0)
+    if adc and current:
+        return t - (current - adc)
+    return t - frames / fs
+
+
+class _Series:
+    """Append-only (t, value) arrays with amortised doubling."""
+    def __init__(self):
+        self.t = np.empty(INITIAL_CAPACITY)
+        self.v = np.empty(INITIAL_CAPACITY)
+        self.n = 0
+
+    def append(self, t, v):
+        if self.n == len(self.t):
+            self.t = np.concatenate((self.t, np.empty(len(self.t))))
+            self.v = np.concatenate((self.v, np.empty(len(self.v))))
+        self.t[self.n] = t
+        self.v[self.n] = v
+        self.n += 1
+
+
+class Timeline:
+    def __init__(self):
+        self.channels = {}  # name -> _Series (telemetry: value; audio streams: sample offset)
+        self.rates = {}     # audio stream -> sample rate
+        self._offsets = {}  # audio stream -> sample offset of the next block
+        self._lock = threading.Lock()
+
+    def add(self, channel, value, t=None):
+        """Stores a telemetry sample (t defaults to now())."""
+        t = now() if t is None else t
+        with self._lock:
+            series = self.channels.get(channel)
+            if series is None:
+                series = self.channels[channel] = _Series()
+            series.append(t, value)
+
+    def start_stream(self, stream, fs):
+        """Starts (or restarts) the block stamps of an audio stream."""
+        with self._lock:
+            self.channels[stream] = _Series()
+            self.rates[stream] = fs
+            self._offsets[stream] = 0
+
+    def add_audio_block(self, stream, t, frames):
+        """Stamps a block: t is the ADC time of its first sample (see adc_time)."""
+        with self._lock:
+            offset = self._offsets[stream]
+            self.channels[stream].append(t, offset)
+            self._offsets[stream] = offset + frames
+
+    def reset(self, channel=None):
+        """
+        Clears one channel, or every telemetry channel.
+
+        Audio streams keep their rate and sample offset (blocks may still be arriving);
+        naming one restarts its stamps instead.
+        """
+        with self._lock:
+            if channel is None:
+                for name in [name for name in self.channels if name not in self.rates]:
+                    del self.channels[name]
+            elif channel in self.rates:
+                self.channels[channel] = _Series()
+            else:
+                self.channels.pop(channel, None)
+
+    def series(self, channel):
+        """(times, values) of a channel (views; empty arrays if it has no samples)."""
+        with self._lock:
+            series = self.channels.get(channel)
+            if series is None:
+                return np.empty(0), np.empty(0)
+            return series.t[:series.n], series.v[:series.n]
+
+    # ------------------------------
+    # Vectorized resampling
+    # ------------------------------
+    def sample_times(self, stream, offsets):
+        """
+        Common-clock times of sample offsets within an audio stream.
+
+        Offsets beyond the last stamped block are extrapolated at the nominal rate.
+        """
+        t, block_offsets = self.series(stream)
+        offsets = np.asarray(offsets, dtype=np.float64)
+        if len(t) == 0:
+            raise ValueError(f"No blocks stamped for stream {stream!r}")
+        fs = self.rates[stream]
+        times = np.interp(offsets, block_offsets, t)
+        before = offsets < block_offsets[0]
+        after = offsets > block_offsets[-1]
+        times[before] = t[0] + (offsets[before] - block_offsets[0]) / fs
+        times[after] = t[-1] + (offsets[after] - block_offsets[-1]) / fs
+        return times
+
+    def resample(self, channel, times, method="linear", max_gap=None):
+        """
+        Values of a telemetry channel at the given times.
+
+        :param method: "linear" interpolation or "previous" (last value held)
+        :param max_gap: Times further than this from a sample (s) get nan (e.g. sensor dropouts)
+        :return: Array like times; nan outside the recorded span
+        """
+        t, v = self.series(channel)
+        times = np.asarray(times, dtype=np.float64)
+        out = np.full(times.shape, np.nan)
+        if len(t) == 0:
+            return out
+        inside = (times >= t[0]) & (times <= t[-1])
+        if method == "linear":
+            out[inside] = np.interp(times[inside], t, v)
+        elif method == "previous":
+            idx = np.searchsorted(t, times[inside], side="right") - 1
+            out[inside] = v[idx]
+        else:
+            raise ValueError(f"Unknown resampling method: {method}")
+        if max_gap is not None and len(t) > 1:
+            idx = np.clip(np.searchsorted(t, times), 1, len(t) - 1)
+            nearest = np.minimum(np.abs(times - t[idx - 1]), np.abs(t[idx] - times))
+            out[nearest > max_gap] = np.nan
+        return out
+
+    def join(self, times, channels, method="linear", max_gap=None):
+        """Resamples several channels onto the same times: dict of name -> array, plus "time"."""
+        joined = {"time": np.asarray(times, dtype=np.float64)}
+        for channel in channels:
+            joined[channel] = self.resample(channel, times, method, max_gap)
+        return joined
+
+
+timeline = Timeline()
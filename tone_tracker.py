@@ -0,0 +1,193 @@
+"""
+Blade-passing frequency (BPF) tone detection and tracking.
+
+Peaks are picked on every spectrum frame at once (vectorized over frames and bins),
+refined with parabolic interpolation on the dB values, and then matched frame by frame
+to the expected BPF harmonics predicted from the fan PWM (or air speed).
+"""
+import numpy as np
+
+# Fan model used for the expected-frequency prior (set these for the installed fan)
+BLADE_COUNT = 7        # Number of fan blades
+MAX_FAN_RPM = 3000     # Fan speed at PWM 255
+MAX_PWM = 255
+RPM_PER_MPS = 300      # Fan speed per m/s of air speed, used when PWM is unknown
+
+TONE_DTYPE = np.dtype([
+    ("time", np.float32),
+    ("harmonic", np.int16),
+    ("frequency", np.float32),
+    ("level", np.float32),
+    ("prominence", np.float32),
+])
+
+
+def expected_bpf(pwm=None, air_speed=None, blade_count=BLADE_COUNT, max_rpm=MAX_FAN_RPM,
+                 max_pwm=MAX_PWM, rpm_per_mps=RPM_PER_MPS):
+    """
+    Predicts the blade-passing frequency (Hz) from the fan PWM, or from the air speed if PWM is unknown.
+
+    :return: BPF in Hz, or None if neither input is usable
+    """
+    if isinstance(pwm, (int, float)) and pwm > 0:
+        rpm = max_rpm * pwm / max_pwm
+    elif isinstance(air_speed, (int, float)) and air_speed > 0:
+        rpm = rpm_per_mps * air_speed
+    else:
+        return None
+    return blade_count * rpm / 60.0
+
+
+def find_peaks(freqs, spl_frames, min_prominence_db=10.0, neighbourhood=16, guard=2):
+    """
+    Picks spectral peaks on every frame at once.
+
+    A bin is a peak if it is a local maximum and stands at least min_prominence_db above
+    the higher of the mean levels of the `neighbourhood` bins on either side (skipping
+    `guard` bins next to the peak, which belong to the window main lobe). Peak frequency
+    and level are refined with a parabola through the peak bin and its two neighbours.
+
+    :param freqs: Frequency bins (uniformly spaced)
+    :param spl_frames: dB SPL spectra, (bins,) or (frames, bins)
+    :return: frame index, frequency (Hz), level (dB) and prominence (dB) arrays, one entry per peak
+    """
+    spl_frames = np.atleast_2d(spl_frames)
+    n_frames, n_bins = spl_frames.shape
+
+    # Mean level left/right of every bin from one cumulative sum
+    csum = np.zeros((n_frames, n_bins + 1))
+    np.cumsum(spl_frames, axis=1, out=csum[:, 1:])
+    idx = np.arange(n_bins)
+    left_a = np.clip(idx - guard - neighbourhood, 0, n_bins)
+    left_b = np.clip(idx - guard, 0, n_bins)
+    right_a = np.clip(idx + guard + 1, 0, n_bins)
+    right_b = np.clip(idx + guard + 1 + neighbourhood, 0, n_bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        left_mean = (csum[:, left_b] - csum[:, left_a]) / (left_b - left_a)
+        right_mean = (csum[:, right_b] - csum[:, right_a]) / (right_b - right_a)
+    # At the spectrum edges only one side exists
+    floor = np.fmax(left_mean, right_mean)
+
+    centre = spl_frames[:, 1:-1]
+    is_max = (centre > spl_frames[:, :-2]) & (centre >= spl_frames[:, 2:])
+    prominence = centre - floor[:, 1:-1]
+    frame_idx, bin_idx = np.nonzero(is_max & (prominence >= min_prominence_db))
+    bin_idx = bin_idx + 1
+
+    # Parabolic interpolation around each peak bin
+    a = spl_frames[frame_idx, bin_idx - 1]
+    b = spl_frames[frame_idx, bin_idx]
+    c = spl_frames[frame_idx, bin_idx + 1]
+    denom = a - 2 * b + c
+    delta = np.where(denom != 0, 0.5 * (a - c) / np.where(denom != 0, denom, 1), 0.0)
+    df = freqs[1] - freqs[0]
+
+    peak_freqs = freqs[bin_idx] + delta * df
+    peak_levels = b - 0.25 * (a - c) * delta
+    return frame_idx, peak_freqs, peak_levels, prominence[frame_idx, bin_idx - 1]
+
+
+class ToneTracker:
+    def __init__(self, n_harmonics=5, tolerance=0.08, min_prominence_db=10.0, smoothing=0.7,
+                 blade_count=BLADE_COUNT, max_rpm=MAX_FAN_RPM):
+        """
+        Tracks the BPF and its harmonics from frame to frame.
+
+        :param n_harmonics: Number of BPF harmonics to follow
+        :param tolerance: Search half-width around each expected harmonic, as a fraction of its frequency
+        :param min_prominence_db: Peak prominence threshold (dB)
+        :param smoothing: Weight of the previous frame's BPF estimate against the PWM prior (0..1)
+        """
+        self.n_harmonics = n_harmonics
+        self.tolerance = tolerance
+        self.min_prominence_db = min_prominence_db
+        self.smoothing = smoothing
+        self.blade_count = blade_count
+        self.max_rpm = max_rpm
+        self.bpf = None  # Current tracked fundamental (Hz)
+        self.rows = []
+
+    def reset(self):
+        self.bpf = None
+        self.rows = []
+
+    def update(self, freqs, spl_frames, times, pwm=None, air_speed=None):
+        """
+        Detects and tracks the BPF harmonics in one or more spectrum frames.
+
+        :param freqs: Frequency bins
+        :param spl_frames: dB SPL spectra, (bins,) or (frames, bins)
+        :param times: Time stamp of each frame (s)
+        :param pwm: Current fan PWM, used for the expected-frequency prior
+        :param air_speed: Current air speed, used for the prior when PWM is unknown
+        :return: Tone table rows (TONE_DTYPE) for these frames
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=np.float32))
+        prior = expected_bpf(pwm, air_speed, self.blade_count, self.max_rpm)
+        frame_idx, peak_freqs, peak_levels, peak_prom = find_peaks(
+            freqs, spl_frames, self.min_prominence_db)
+
+        # Peaks are returned ordered by frame, so each frame is a contiguous slice
+        bounds = np.searchsorted(frame_idx, np.arange(len(times) + 1))
+        harmonics = np.arange(1, self.n_harmonics + 1)
+        out = []
+
+        for i, t in enumerate(times):
+            centre = self._search_centre(prior)
+            lo, hi = bounds[i], bounds[i + 1]
+            if centre is None or lo == hi:
+                continue
+
+            pf, pl, pp = peak_freqs[lo:hi], peak_levels[lo:hi], peak_prom[lo:hi]
+            targets = harmonics * centre
+            in_range = np.abs(pf[None, :] - targets[:, None]) <= self.tolerance * targets[:, None]
+            found = in_range.any(axis=1)
+            if not found.any():
+                continue
+
+            # Strongest peak inside each harmonic's search window
+            best = np.argmax(np.where(in_range, pl[None, :], -np.inf), axis=1)[found]
+            k = harmonics[found]
+            rows = np.empty(len(k), dtype=TONE_DTYPE)
+            rows["time"] = t
+            rows["harmonic"] = k
+            rows["frequency"] = pf[best]
+            rows["level"] = pl[best]
+            rows["prominence"] = pp[best]
+            out.append(rows)
+
+            # Level-weighted fundamental estimate from all matched harmonics
+            weights = 10 ** (pl[best] / 20)
+            self.bpf = float(np.sum(weights * pf[best] / k) / np.sum(weights))
+
+        table = np.concatenate(out) if out else np.empty(0, dtype=TONE_DTYPE)
+        self.rows.append(table)
+        return table
+
+    def _search_centre(self, prior):
+        if self.bpf is None:
+            return prior
+        if prior is None:
+            return self.bpf
+        return self.smoothing * self.bpf + (1 - self.smoothing) * prior
+
+    def table(self):
+        """All tracked tones so far as one TONE_DTYPE array."""
+        if not self.rows:
+            return np.empty(0, dtype=TONE_DTYPE)
+        return np.concatenate(self.rows)
+
+
+def save_tone_table(filename, table):
+    """
+    Saves a tone table to a CSV file.
+    Columns: Time (s), Harmonic, Frequency (Hz), SPL (dB), Prominence (dB)
+    """
+    np.savetxt(
+        filename,
+        np.column_stack([table[name] for name in TONE_DTYPE.names]),
+        delimiter=",",
+        header="Time (s),Harmonic,Frequency (Hz),SPL (dB),Prominence (dB)",
+        comments="",
+        fmt=["%.3f", "%d", "%.3f", "%.3f", "%.3f"]
+    )
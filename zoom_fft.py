@@ -0,0 +1,201 @@
+"""
+Zoom-FFT: high-resolution spectrum of one frequency band.
+
+A bin width of fs / n_window (23 Hz at 4096 points and 96 kHz) cannot separate the low
+fan tones, and a brute-force n_window makes every transform and plot pay for the full
+band. The zoom-FFT instead:
+
+    1. mixes the band down to 0 Hz:     z[n] = x[n] * exp(-2j*pi*f_center*n / fs)
+    2. low-pass filters and decimates by D in one polyphase step: only every D-th
+       output is computed, so the filter costs L / D multiplies per input sample
+       for L taps
+    3. takes short complex FFTs of the decimated samples (rate fs / D)
+
+The bin width becomes fs / (D * n_fft), i.e. the resolution of a D * n_fft point FFT at
+the cost of filtering plus an n_fft point transform. Levels use the same window, Pascal
+and calibration scaling as compute_fft, so a zoomed spectrum lines up with the full
+one (tones match; broadband levels are lower by the ratio of bin widths).
+
+ZoomFFT is streaming: process() takes blocks of any length (a stored take at once, or
+live stream blocks) and keeps the mixer phase and filter history between calls.
+"""
+import threading
+import numpy as np
+
+from live_spectrogram import PRECISION, _fft_scaling, full_scale
+
+PASSBAND = 0.8            # Band span / decimated sample rate
+STOPBAND_DB = 80          # Alias rejection of the decimation filter
+DEFAULT_RESOLUTION = 0.5  # Hz
+MAX_N_FFT = 65536
+MIXER_TABLE = 4096        # Mixer phasors are built as coarse x fine products of this length
+
+
+def design_decimator(decimation, transition, stopband_db=STOPBAND_DB):
+    """
+    Kaiser-windowed sinc low-pass for decimation by `decimation`.
+
+    :param transition: Transition width as a fraction of the input sample rate
+    :return: Taps with unity gain at 0 Hz
+    """
+    if decimation == 1:
+        return np.ones(1)
+    taps = int(np.ceil((stopband_db - 8) / (2.285 * 2 * np.pi * transition))) | 1
+    beta = 0.1102 * (stopband_db - 8.7)
+    cutoff = 0.5 / decimation - transition / 2  # Centre of the transition band (cycles/sample)
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(taps, beta)
+    return h / h.sum()
+
+
+class PolyphaseDecimator:
+    def __init__(self, taps, decimation, dtype=np.complex128):
+        """
+        Streaming FIR decimator that only evaluates the kept outputs.
+
+        The taps are split into D phases of K = ceil(L / D) taps. The input is viewed as
+        rows of D samples, one matrix product gives every row's dot product with every
+        phase, and each output is the sum of K of those along a diagonal.
+
+        :param taps: Low-pass taps (see design_decimator)
+        """
+        self.decimation = decimation
+        reversed_taps = np.asarray(taps)[::-1]
+        k = -(-len(reversed_taps) // decimation)
+        # Zero-padded on the oldest-sample side, so the delay is unchanged
+        padded = np.concatenate((np.zeros(k * decimation - len(reversed_taps)), reversed_taps))
+        self.phase_taps = padded.reshape(k, decimation).T.astype(dtype)  # (D, K)
+        self.length = k * decimation
+        self.history = np.zeros(self.length - 1, dtype=dtype)
+        self.phase = 0  # Input samples to skip before the next output
+
+    def process(self, x):
+        buffer = np.concatenate((self.history, x))
+        d = self.decimation
+        k = self.phase_taps.shape[1]
+        rows = (len(buffer) - self.phase) // d
+        outputs = max(rows - k + 1, 0)
+        y = np.zeros(outputs, dtype=self.phase_taps.dtype)
+        if outputs:
+            products = buffer[self.phase:self.phase + rows * d].reshape(rows, d) @ self.phase_taps
+            for j in range(k):
+                y += products[j:j + outputs, j]
+        # Next output's window starts `phase` samples into the next call's buffer
+        consumed = self.phase + outputs * d
+        self.phase = consumed - (len(buffer) - self.length + 1)
+        self.history = buffer[len(buffer) - (self.length - 1):] if self.length > 1 else buffer[:0]
+        return y
+
+
+class ZoomFFT:
+    def __init__(self, fs, f_low, f_high, resolution=DEFAULT_RESOLUTION, overlap=0.5, precision=None,
+                 sample_dtype=np.float64):
+        """
+        :param fs: Input sample rate (Hz)
+        :param f_low, f_high: Band to analyse (Hz)
+        :param resolution: Requested bin width (Hz); rounded to a power-of-two n_fft
+        :param overlap: Fractional overlap of the short FFT segments
+        :param precision: "float32" or "float64" (defaults to live_spectrogram.PRECISION)
+        :param sample_dtype: dtype of the samples fed in; integer samples are scaled by full scale
+        """
+        if not 0 <= f_low < f_high <= fs / 2:
+            raise ValueError(f"Zoom band must lie within 0-{fs / 2:g} Hz.")
+        real_dtype = np.dtype(precision or PRECISION)
+        self.complex_dtype = np.result_type(real_dtype, np.complex64)
+        self.fs = fs
+        self.f_low, self.f_high = f_low, f_high
+        self.f_center = (f_low + f_high) / 2
+        span = f_high - f_low
+        self.decimation = max(int(fs * PASSBAND / span), 1)
+        self.fs_out = fs / self.decimation
+        self.n_fft = int(min(2 ** np.ceil(np.log2(self.fs_out / resolution)), MAX_N_FFT))
+        self.step = max(int(self.n_fft * (1 - overlap)), 1)
+
+        # Passband edge at span / 2, stopband from fs_out - span / 2 (where aliases would land in the band)
+        transition = (self.fs_out - span) / fs
+        self.decimator = PolyphaseDecimator(design_decimator(self.decimation, transition), self.decimation,
+                                            self.complex_dtype)
+        self.scaled_window, self.db_offset, self.power_floor = _fft_scaling(
+            self.n_fft, real_dtype, full_scale(sample_dtype))
+
+        freqs = self.f_center + np.fft.fftshift(np.fft.fftfreq(self.n_fft, 1 / self.fs_out))
+        self.keep = (freqs >= f_low) & (freqs <= f_high)
+        self.freqs = freqs[self.keep]
+        self._fine_mixer = np.exp(-2j * np.pi * ((self.f_center / fs * np.arange(MIXER_TABLE)) % 1.0))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears the averaged spectrum and the filter state (e.g. for a new take)."""
+        with self._lock:
+            self.decimator.history[:] = 0
+            self.decimator.phase = 0
+            self.n = 0                      # Input samples mixed so far (mixer phase)
+            self.baseband = np.zeros(0, dtype=self.complex_dtype)
+            self.db_sum = np.zeros(len(self.freqs))
+            self.segments = 0
+            self.latest = None              # dB SPL of the newest segment
+
+    def _mixer(self, start, count):
+        """exp(-2j*pi*f_center*n / fs) for n = start .. start + count - 1."""
+        cycles = self.f_center / self.fs
+        rows = -(-count // MIXER_TABLE)
+        # Sample n = start + q*T + r is the product of a coarse (q) and a fine (r) phasor;
+        # phases are wrapped in float64 before the exponential, so long streams stay exact
+        coarse = np.exp(-2j * np.pi * ((cycles * (start + MIXER_TABLE * np.arange(rows))) % 1.0))
+        return (coarse[:, None] * self._fine_mixer).astype(self.complex_dtype).ravel()[:count]
+
+    @property
+    def segment_seconds(self):
+        """Input duration of one short-FFT segment (s)."""
+        return self.n_fft * self.decimation / self.fs
+
+    def process(self, block):
+        """
+        Feeds samples; returns the number of new segments.
+
+        :param block: (samples,) or (samples, channels) block; the first channel is used
+        """
+        block = np.asarray(block)
+        if block.ndim > 1:
+            block = block[:, 0]
+        mixer = self._mixer(self.n, len(block))
+        decimated = self.decimator.process(block.astype(self.scaled_window.dtype) * mixer)
+        with self._lock:
+            self.n += len(block)
+            self.baseband = np.concatenate((self.baseband, decimated))
+            count = (len(self.baseband) - self.n_fft) // self.step + 1 if len(self.baseband) >= self.n_fft else 0
+            if count <= 0:
+                return 0
+            frames = np.lib.stride_tricks.sliding_window_view(self.baseband, self.n_fft)[::self.step][:count]
+            spectra = np.fft.fftshift(np.fft.fft(frames * self.scaled_window, axis=-1), axes=-1)[:, self.keep]
+            power = spectra.real ** 2 + spectra.imag ** 2
+            frames_db = 10 * np.log10(np.maximum(power, self.power_floor)) + self.db_offset
+            self.db_sum += frames_db.sum(axis=0, dtype=np.float64)
+            self.segments += count
+            self.latest = frames_db[-1]
+            self.baseband = self.baseband[count * self.step:]
+        return count
+
+    def average(self):
+        """Mean dB SPL over all segments since reset (None before the first segment)."""
+        with self._lock:
+            if self.segments == 0:
+                return None
+            return (self.db_sum / self.segments).astype(self.scaled_window.dtype)
+
+
+def zoom_fft(audio, fs, f_low, f_high, resolution=DEFAULT_RESOLUTION, overlap=0.5, precision=None):
+    """
+    Zoomed spectrum of a stored take.
+
+    :return: freqs and averaged dB SPL over the band
+    :raises ValueError: if the take is shorter than one zoom segment
+    """
+    audio = np.asarray(audio)
+    zoom = ZoomFFT(fs, f_low, f_high, resolution, overlap, precision, audio.dtype)
+    zoom.process(audio)
+    if zoom.segments == 0:
+        raise ValueError(f"Take shorter than one zoom segment ({zoom.segment_seconds:.1f} s); "
+                         f"use a coarser resolution or a longer take.")
+    return zoom.freqs, zoom.average()